@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class AiAgentConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'ai_agent'
+
+    def ready(self):
+        # Signal hookups: SQLite tuning on every new connection, the in-memory
+        # knowledge base index kept in sync with admin edits, and deleted
+        # conversations dropped from the chat store and history caches
+        from . import signals  # noqa: F401
@@ -0,0 +1,132 @@
+"""Bulk chat processing behind ``/api/chat/batch/``.
+
+IVR and SMS gateways forward many customer texts at once. A batch answers
+each distinct question once: items are grouped by (language, normalized
+message), the knowledge base is tried first, and the remaining questions go
+to the AI service on at most ``max_concurrency`` threads. Every answered
+item is then written with one ``bulk_create``.
+
+Provider calls in a batch see no conversation history: one answer may serve
+items from several sessions, so it must not depend on any of them.
+"""
+import contextvars
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connections
+
+from .services.intent_model import get_intent_classifier
+from .services.resilience import current_provider
+from .services.retrieval import answer_from_knowledge_base
+from .services.text import normalize_text
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SETTINGS = {
+    'MAX_ITEMS': 500,
+    'MAX_CONCURRENCY': 8,     # provider calls in flight per batch
+}
+
+
+class BatchAnswer:
+    """The answer shared by every item asking the same question"""
+
+    __slots__ = ('message', 'language', 'intent', 'confidence', 'response', 'ai_provider', 'error')
+
+    def __init__(self, message, language):
+        self.message = message
+        self.language = language
+        self.intent = None
+        self.confidence = 0.0
+        self.response = None
+        self.ai_provider = None
+        self.error = None
+
+
+class ChatBatchProcessor:
+    """Answers and persists a list of validated chat items"""
+
+    def __init__(self, service, store, max_concurrency=8):
+        self.service = service
+        self.store = store
+        self.max_concurrency = max_concurrency
+
+    @classmethod
+    def from_settings(cls, service, store):
+        options = {**DEFAULT_BATCH_SETTINGS, **getattr(settings, 'CHAT_BATCH', {})}
+        return cls(service, store, max_concurrency=options['MAX_CONCURRENCY'])
+
+    @staticmethod
+    def key(message, language):
+        return language, normalize_text(message)
+
+    def group(self, items):
+        """``{key: BatchAnswer}`` for the distinct questions among ``items``"""
+        answers = {}
+        for item in items:
+            key = self.key(item['message'], item['language'])
+            if key not in answers:
+                answers[key] = BatchAnswer(item['message'], item['language'])
+        # One vectorized pass over the distinct messages
+        matches = get_intent_classifier().classify_batch([answer.message for answer in answers.values()])
+        for answer, (intent, confidence) in zip(answers.values(), matches):
+            answer.intent, answer.confidence = intent, confidence
+        return answers
+
+    def answer(self, answers, timer=None):
+        """Fill in every ``BatchAnswer``: knowledge base first, then the AI service"""
+        pending = []
+        for answer in answers:
+            answer.response = answer_from_knowledge_base(answer.message, answer.language)
+            if answer.response is not None:
+                answer.ai_provider = 'knowledge_base'
+            else:
+                pending.append(answer)
+        if timer is not None:
+            timer.lap('retrieve')
+        if not pending:
+            return
+
+        workers = min(self.max_concurrency, len(pending))
+        with ThreadPoolExecutor(workers, thread_name_prefix='chat-batch') as executor:
+            # copy_context() carries the request deadline into the workers
+            list(executor.map(lambda answer: contextvars.copy_context().run(self._generate, answer), pending))
+        if timer is not None:
+            timer.lap('generate')
+
+    def _generate(self, answer):
+        current_provider.set(None)
+        try:
+            answer.response = self.service.generate_response(answer.message, answer.language)
+            answer.ai_provider = current_provider.get() or getattr(self.service, 'name', 'unknown')
+        except Exception as e:
+            logger.error(f"💥 Batch chat item failed: {e}")
+            answer.error = str(e)
+        finally:
+            # Degraded answers may have read the knowledge base from this thread
+            connections.close_all()
+
+    def process(self, items, timer=None):
+        """Answer ``items`` (validated ``{message, session_id, language}`` dicts).
+
+        Returns ``(answers, saved)``: the ``BatchAnswer`` of each item, in
+        order, and ``{item index: (user_msg, ai_msg)}`` for the items that got
+        an answer and were written.
+        """
+        grouped = self.group(items)
+        self.answer(grouped.values(), timer)
+        per_item = [grouped[self.key(item['message'], item['language'])] for item in items]
+
+        turns, indexes = [], []
+        for index, (item, answer) in enumerate(zip(items, per_item)):
+            if answer.error is None:
+                indexes.append(index)
+                turns.append((
+                    item['session_id'], item['language'], item['message'], answer.response,
+                    {'intent': answer.intent, 'confidence': answer.confidence},
+                ))
+        saved = dict(zip(indexes, self.store.save_turns(turns))) if turns else {}
+        if timer is not None:
+            timer.lap('persist')
+        return per_item, saved
@@ -0,0 +1,187 @@
+"""Conversation context for the LLM providers.
+
+``ConversationHistory`` keeps the last ``max_turns`` exchanges of each active
+session in an in-memory ring buffer. The chat store appends every saved turn,
+so a hot session never goes back to the database; a cold session is loaded
+with one query on first use. ``messages()`` returns the window as chat
+messages, oldest first, cut to a token budget estimated from the UTF-8 size.
+
+Turns pushed out of the window (or over the budget) can optionally be folded
+into a short extractive summary of what the customer asked earlier.
+"""
+import contextlib
+import contextvars
+import threading
+from collections import OrderedDict, deque
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from .models import Message
+
+DEFAULT_CONTEXT_SETTINGS = {
+    'ENABLED': True,
+    'MAX_TURNS': 6,           # user/assistant exchanges kept per session
+    'TOKEN_BUDGET': 1500,     # for the history, on top of the system prompt and the new message
+    'MAX_SESSIONS': 10000,
+    'SUMMARIZE': False,
+    'SUMMARY_TOKENS': 120,
+}
+
+
+def estimate_tokens(text):
+    """Rough BPE token count: ~4 UTF-8 bytes per token.
+
+    Within ~20% of real tokenizers for English, and Dari/Pashto letters take
+    two bytes each, matching the ~2 characters per token they tokenize to.
+    """
+    return len(text.encode('utf-8')) // 4 + 1
+
+
+def _truncate_tokens(text, tokens):
+    if estimate_tokens(text) <= tokens:
+        return text
+    # Work in bytes so the cut is right for any script
+    return text.encode('utf-8')[:tokens * 4].decode('utf-8', 'ignore').rstrip() + '…'
+
+
+class _Session:
+    __slots__ = ('messages', 'summary')
+
+    def __init__(self, max_messages):
+        self.messages = deque(maxlen=max_messages)   # (is_user, content)
+        self.summary = ''
+
+
+class ConversationHistory:
+    """Per-session ring buffers of recent messages, LRU-bounded to ``max_sessions``"""
+
+    def __init__(self, max_turns=6, token_budget=1500, max_sessions=10000, summarize=False, summary_tokens=120):
+        self.max_turns = max_turns
+        self.token_budget = token_budget
+        self.max_sessions = max_sessions
+        self.summarize = summarize
+        self.summary_tokens = summary_tokens
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls):
+        options = {**DEFAULT_CONTEXT_SETTINGS, **getattr(settings, 'CHAT_CONTEXT', {})}
+        if not options['ENABLED']:
+            return None
+        return cls(
+            max_turns=options['MAX_TURNS'],
+            token_budget=options['TOKEN_BUDGET'],
+            max_sessions=options['MAX_SESSIONS'],
+            summarize=options['SUMMARIZE'],
+            summary_tokens=options['SUMMARY_TOKENS'],
+        )
+
+    def __contains__(self, session_id):
+        return session_id in self._sessions
+
+    def _store(self, session_id, session):
+        with self._lock:
+            self._sessions[session_id] = session
+            self._sessions.move_to_end(session_id)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+
+    def _get(self, session_id):
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is not None:
+                self._sessions.move_to_end(session_id)
+            return session
+
+    def load(self, session_id):
+        """Buffer the session's latest messages from the database (one query)"""
+        session = self._get(session_id)
+        if session is not None:
+            return session
+        session = _Session(self.max_turns * 2)
+        rows = Message.objects.filter(conversation__session_id=session_id).order_by(
+            '-created_at', '-id'
+        ).values_list('is_user', 'content')[:self.max_turns * 2]
+        session.messages.extend(reversed(rows))
+        self._store(session_id, session)
+        return session
+
+    async def aload(self, session_id):
+        if session_id not in self:
+            await sync_to_async(self.load)(session_id)
+
+    def append(self, session_id, user_content, ai_content):
+        """Record a saved turn. Sessions not buffered yet are left to ``load``."""
+        session = self._get(session_id)
+        if session is None:
+            return
+        with self._lock:
+            for message in ((True, user_content), (False, ai_content)):
+                if self.summarize and len(session.messages) == session.messages.maxlen:
+                    session.summary = self._fold(session.summary, [session.messages[0]])
+                session.messages.append(message)
+
+    def discard(self, session_id):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._sessions.clear()
+
+    def _fold(self, summary, messages):
+        asked = '; '.join(_truncate_tokens(content, 20) for is_user, content in messages if is_user)
+        if not asked:
+            return summary
+        return _truncate_tokens(f'{summary}; {asked}' if summary else asked, self.summary_tokens)
+
+    def messages(self, session_id):
+        """The session's recent turns as chat messages within the token budget, oldest first"""
+        session = self.load(session_id)
+        with self._lock:
+            history = list(session.messages)
+            summary = session.summary
+
+        kept, used = [], 0
+        for index in range(len(history) - 1, -1, -1):
+            tokens = estimate_tokens(history[index][1])
+            if used + tokens > self.token_budget:
+                break
+            kept.append(history[index])
+            used += tokens
+        kept.reverse()
+        # Start on a user turn so the window never opens with a dangling reply
+        while kept and not kept[0][0]:
+            kept.pop(0)
+
+        chat = [{'role': 'user' if is_user else 'assistant', 'content': content} for is_user, content in kept]
+        if self.summarize:
+            summary = self._fold(summary, history[:len(history) - len(kept)])
+            if summary:
+                chat.insert(0, {'role': 'system', 'content': f'Earlier in this conversation the customer asked: {summary}'})
+        return chat
+
+
+conversation_history = ConversationHistory.from_settings()
+
+_current_session = contextvars.ContextVar('chat_session', default=None)
+
+
+@contextlib.contextmanager
+def history_scope(session_id):
+    """Make ``session_id``'s history available to provider calls inside the block"""
+    token = _current_session.set(session_id)
+    try:
+        yield
+    finally:
+        _current_session.reset(token)
+
+
+def history_messages():
+    """Prior turns of the session in scope as chat messages; empty outside a scope"""
+    session_id = _current_session.get()
+    if session_id is None or conversation_history is None:
+        return []
+    return conversation_history.messages(session_id)
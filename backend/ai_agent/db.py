@@ -0,0 +1,11 @@
+from django.conf import settings
+
+
+def configure_sqlite(sender, connection, **kwargs):
+    """``connection_created`` hook applying ``settings.SQLITE_PRAGMAS``"""
+    pragmas = getattr(settings, 'SQLITE_PRAGMAS', {})
+    if connection.vendor != 'sqlite' or not pragmas:
+        return
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
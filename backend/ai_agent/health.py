@@ -0,0 +1,107 @@
+import logging
+import threading
+import time
+from collections import namedtuple
+
+from django.conf import settings
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HEALTH_SETTINGS = {
+    'PROBE_INTERVAL': 30,     # seconds between provider checks
+    'STALE_AFTER': 90,        # a result older than this means the prober is stuck
+}
+
+ProviderHealth = namedtuple('ProviderHealth', ['status', 'checked_at', 'latency_ms', 'error'])
+
+UNKNOWN = ProviderHealth('unknown', None, None, None)
+
+
+class ProviderHealthProber:
+    """Checks the AI provider from a background thread and caches the result.
+
+    Probes read ``state()`` and never wait on the provider, so their latency
+    does not depend on upstream load, and a busy probe schedule costs at
+    most one provider check per ``interval`` per process. Services may define
+    a cheap ``check_health()``; otherwise a one-word completion is requested.
+    """
+
+    def __init__(self, service, interval=30, stale_after=90):
+        self.service = service
+        self.interval = interval
+        self.stale_after = stale_after
+        self._state = UNKNOWN
+        self._thread = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    @classmethod
+    def from_settings(cls, service):
+        options = {**DEFAULT_HEALTH_SETTINGS, **getattr(settings, 'HEALTH_CHECK', {})}
+        return cls(service, interval=options['PROBE_INTERVAL'], stale_after=options['STALE_AFTER'])
+
+    def ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='provider-health-prober', daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.probe()
+            self._stop.wait(self.interval)
+
+    def probe(self):
+        """Run one provider check now and cache its result"""
+        start = time.perf_counter()
+        try:
+            check = getattr(self.service, 'check_health', None)
+            if check is not None:
+                healthy = check()
+            else:
+                healthy = bool(self.service.generate_response('Hello', 'en'))
+            status, error = ('healthy' if healthy else 'unhealthy'), None
+        except Exception as e:
+            logger.warning(f"AI provider health check failed: {e}")
+            status, error = 'unhealthy', str(e)
+        self._state = ProviderHealth(status, time.time(), round((time.perf_counter() - start) * 1000, 2), error)
+        return self._state
+
+    def state(self):
+        state = self._state
+        if state.checked_at is not None and time.time() - state.checked_at > self.stale_after:
+            return state._replace(status='stale')
+        return state
+
+
+def database_status():
+    """'ok', or the error message when the default database cannot answer"""
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+            cursor.fetchone()
+        return 'ok'
+    except Exception as e:
+        return str(e)
+
+
+def circuit_breaker_states(service):
+    """State of every circuit breaker the service, the services it wraps or routes to expose"""
+    states = {}
+    pending = [service]
+    while pending:
+        attributes = vars(pending.pop())
+        breaker = attributes.get('circuit_breaker')
+        if breaker is not None:
+            states[breaker.name] = breaker.state
+        if attributes.get('service') is not None:
+            pending.append(attributes['service'])
+        # Providers that failed to initialize are never called, so their breakers mean nothing
+        pending.extend(route.service for route in attributes.get('routes', ()) if route.available)
+    return states
@@ -0,0 +1,208 @@
+"""Non-blocking logging for the request path.
+
+``AsyncQueueHandler`` only puts the raw LogRecord on an in-process queue; a
+listener thread wakes at most every ``flush_interval`` seconds, formats the
+pending records as one JSON object per line and writes them to a
+size-rotated file with a single flush. Request threads never touch the disk
+and never render the message, and long bodies (full user messages, model
+answers) are cut to ``max_chars``.
+
+Only the standard library is imported here because ``settings.LOGGING`` is
+applied before the apps are loaded.
+"""
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import time
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+# LogRecord attributes copied into the JSON line when a caller passes them via ``extra``
+CONTEXT_FIELDS = ('session_id', 'language', 'ai_provider', 'intent', 'latency_ms', 'status_code')
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record with truncated message and request context"""
+
+    def __init__(self, max_chars=200):
+        super().__init__()
+        self.max_chars = max_chars
+        # json.dumps() builds a new encoder per call when given options
+        self._encode = json.JSONEncoder(ensure_ascii=False, default=str).encode
+        self._second = None
+        self._second_prefix = ''
+
+    def timestamp(self, created):
+        """ISO-8601 UTC with milliseconds; the date/time prefix is reused within a second"""
+        second = int(created)
+        if second != self._second:
+            self._second = second
+            self._second_prefix = time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(second))
+        return f"{self._second_prefix}.{int((created - second) * 1000):03d}Z"
+
+    def format(self, record):
+        message = record.getMessage()
+        if self.max_chars and len(message) > self.max_chars:
+            message = message[:self.max_chars] + '…'
+        entry = {
+            'ts': self.timestamp(record.created),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': message,
+        }
+        for field in CONTEXT_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        return self._encode(entry)
+
+
+class BatchedRotatingFileHandler(RotatingFileHandler):
+    """RotatingFileHandler that leaves flushing to ``flush_batch``"""
+
+    def flush(self):
+        pass
+
+    def flush_batch(self):
+        super().flush()
+
+
+class BatchingQueueListener(QueueListener):
+    """QueueListener that drains the queue in batches.
+
+    After the first record arrives it waits ``flush_interval`` seconds so a
+    burst is written together: one wake-up and one flush per batch instead
+    of one per record.
+    """
+
+    def __init__(self, queue, *handlers, flush_interval=0.2, respect_handler_level=True):
+        super().__init__(queue, *handlers, respect_handler_level=respect_handler_level)
+        self.flush_interval = flush_interval
+
+    def _monitor(self):
+        while True:
+            batch = [self.queue.get()]
+            time.sleep(self.flush_interval)
+            while True:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            stop = False
+            for record in batch:
+                if record is self._sentinel:
+                    stop = True
+                else:
+                    self.handle(record)
+            for handler in self.handlers:
+                getattr(handler, 'flush_batch', handler.flush)()
+            if stop:
+                return
+
+
+class AsyncQueueHandler(QueueHandler):
+    """QueueHandler with its own listener thread and rotating JSON file sink.
+
+    Usable straight from ``LOGGING`` via ``'()': 'ai_agent.log.AsyncQueueHandler'``.
+    Records below WARNING are kept with probability ``sample_rate``. When the
+    bounded queue is full records are dropped and counted rather than
+    blocking the request.
+
+    A process forked from the one that built the handler (a gunicorn worker
+    of a preloaded master) writes to ``<name>.<pid><ext>`` next to
+    ``filename``, so no two processes rotate the same file.
+
+    ``lean_records`` stops the logging module from collecting caller, thread
+    and process details on every record. That is process-wide: only turn it
+    on when no other handler or formatter uses funcName, lineno, thread or
+    process.
+    """
+
+    def __init__(self, filename, max_bytes=10 * 1024 * 1024, backup_count=5, max_chars=200,
+                 sample_rate=1.0, queue_size=10000, flush_interval=0.2, lean_records=False):
+        super().__init__(queue.Queue(maxsize=queue_size))
+        self.filename = filename
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.max_chars = max_chars
+        self.sample_rate = sample_rate
+        self.dropped = 0
+        self.listener = BatchingQueueListener(self.queue, self._sink(filename), flush_interval=flush_interval)
+        self.listener.start()
+        atexit.register(self.close)
+        # A worker forked from a preloaded gunicorn master has the queue but not the thread
+        os.register_at_fork(
+            before=self._before_fork, after_in_parent=self._after_fork_in_parent,
+            after_in_child=self._restart_in_child,
+        )
+        if lean_records:
+            # The JSON lines carry no caller, thread or process fields, so skip
+            # collecting them on every record (the stack walk in findCaller is
+            # the single most expensive part of a logging call)
+            logging._srcfile = None
+            logging.logThreads = False
+            logging.logProcesses = False
+            logging.logMultiprocessing = False
+
+    def emit(self, record):
+        if record.levelno < logging.WARNING and self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            return
+        try:
+            self.queue.put_nowait(self.prepare(record))
+        except queue.Full:
+            self.dropped += 1
+        except Exception:
+            self.handleError(record)
+
+    def _sink(self, filename):
+        sink = BatchedRotatingFileHandler(
+            filename, maxBytes=self.max_bytes, backupCount=self.backup_count, encoding='utf-8', delay=True
+        )
+        sink.setFormatter(JsonFormatter(self.max_chars))
+        return sink
+
+    def _before_fork(self):
+        # Hold the sinks with nothing buffered, so the child can close its copies
+        # without writing the parent's pending lines a second time
+        for sink in self.listener.handlers:
+            sink.acquire()
+            sink.flush_batch()
+
+    def _after_fork_in_parent(self):
+        for sink in self.listener.handlers:
+            sink.release()
+
+    def _restart_in_child(self):
+        # The parent's queue may have been mid-operation at the fork; start clean
+        self.queue = self.listener.queue = queue.Queue(maxsize=self.queue.maxsize)
+        if self.listener._thread is None:
+            return    # closed before the fork
+        # Sibling workers rotating one shared file would lose and overwrite lines
+        for sink in self.listener.handlers:
+            sink.close()
+        root, ext = os.path.splitext(self.filename)
+        self.listener.handlers = (self._sink(f'{root}.{os.getpid()}{ext}'),)
+        self.listener._thread = None
+        self.listener.start()
+
+    def prepare(self, record):
+        # The stock implementation renders the message on the calling thread
+        # so the record can be pickled; this queue never leaves the process,
+        # so rendering is left to the listener
+        return record
+
+    def close(self):
+        listener = self.listener
+        if listener._thread is not None:
+            # Blocking put: QueueListener.stop() would raise if the queue is full
+            self.queue.put(listener._sentinel)
+            listener._thread.join()
+            listener._thread = None
+            for handler in listener.handlers:
+                handler.close()
+        super().close()
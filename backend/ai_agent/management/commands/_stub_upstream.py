@@ -0,0 +1,93 @@
+import asyncio
+import json
+import threading
+
+
+class DelayedUpstream:
+    """Asyncio HTTP/1.1 stand-in for the DeepSeek chat completions API.
+
+    Every request waits ``delay`` seconds before answering, which simulates a
+    slow LLM without consuming a thread per in-flight call. The server runs on
+    its own loop in a background thread so it can be used from sync and async
+    callers alike.
+    """
+
+    def __init__(self, delay=0.2, content='Stub answer', host='127.0.0.1'):
+        self.delay = delay
+        self.content = content
+        self.host = host
+        self.port = None
+        self.requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._loop = None
+        self._server = None
+        self._ready = threading.Event()
+        self._thread = None
+
+    @property
+    def url(self):
+        return f'http://{self.host}:{self.port}/v1/chat/completions'
+
+    async def _handle(self, reader, writer):
+        try:
+            while True:
+                head = await reader.readuntil(b'\r\n\r\n')
+                length = 0
+                for line in head.split(b'\r\n'):
+                    if line.lower().startswith(b'content-length:'):
+                        length = int(line.split(b':', 1)[1])
+                if length:
+                    await reader.readexactly(length)
+
+                self.requests += 1
+                self.in_flight += 1
+                self.max_in_flight = max(self.max_in_flight, self.in_flight)
+                try:
+                    await asyncio.sleep(self.delay)
+                finally:
+                    self.in_flight -= 1
+
+                body = json.dumps({'choices': [{'message': {'content': self.content}}]}).encode()
+                writer.write(
+                    b'HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n'
+                    b'Content-Length: ' + str(len(body)).encode() + b'\r\n\r\n' + body
+                )
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError, asyncio.CancelledError):
+            # Client hung up, or the stub is shutting down with keep-alive connections open
+            pass
+        finally:
+            writer.close()
+
+    def _run(self):
+        self._loop = asyncio.new_event_loop()
+        self._server = self._loop.run_until_complete(
+            asyncio.start_server(self._handle, self.host, 0, backlog=4096)
+        )
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._ready.set()
+        self._loop.run_forever()
+        self._server.close()
+        pending = asyncio.all_tasks(self._loop)
+        for task in pending:
+            task.cancel()
+        if pending:
+            self._loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+        self._loop.close()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        self._ready.wait()
+        return self
+
+    def stop(self):
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -0,0 +1,75 @@
+import contextlib
+import itertools
+import logging
+import math
+from unittest import mock
+
+from django.db import connection
+from django.db.backends.utils import CursorWrapper
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+
+@contextlib.contextmanager
+def throwaway_database(quiet_logging=True):
+    """Run a benchmark against a freshly migrated test database, never db.sqlite3.
+
+    Per-request INFO logging is muted by default since it would dominate the
+    measurements.
+    """
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0)
+    if quiet_logging:
+        logging.disable(logging.INFO)
+    try:
+        yield
+    finally:
+        logging.disable(logging.NOTSET)
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+
+
+def percentile(sorted_samples, q):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_samples:
+        return None
+    return sorted_samples[min(max(math.ceil(q * len(sorted_samples)) - 1, 0), len(sorted_samples) - 1)]
+
+
+def latency_summary(samples_ms):
+    """p50/p95/p99/max/mean of millisecond samples, rounded for JSON reports"""
+    samples = sorted(samples_ms)
+    if not samples:
+        return {'p50_ms': None, 'p95_ms': None, 'p99_ms': None, 'max_ms': None, 'mean_ms': None}
+    return {
+        'p50_ms': round(percentile(samples, 0.50), 4),
+        'p95_ms': round(percentile(samples, 0.95), 4),
+        'p99_ms': round(percentile(samples, 0.99), 4),
+        'max_ms': round(samples[-1], 4),
+        'mean_ms': round(sum(samples) / len(samples), 4),
+    }
+
+
+@contextlib.contextmanager
+def count_queries():
+    """Count SQL statements run on any thread's connection while the block runs.
+
+    ``CaptureQueriesContext`` only sees the calling thread's connection, which
+    misses the sync views ASGI runs on its own thread.
+    """
+    counter = itertools.count()
+    execute, executemany = CursorWrapper.execute, CursorWrapper.executemany
+
+    def counted_execute(cursor, *args, **kwargs):
+        next(counter)
+        return execute(cursor, *args, **kwargs)
+
+    def counted_executemany(cursor, *args, **kwargs):
+        next(counter)
+        return executemany(cursor, *args, **kwargs)
+
+    result = [0]
+    with mock.patch.object(CursorWrapper, 'execute', counted_execute), \
+            mock.patch.object(CursorWrapper, 'executemany', counted_executemany):
+        yield result
+        # next() is atomic under the GIL; the value read is the number of calls so far
+        result[0] = next(counter)
@@ -0,0 +1,84 @@
+import time
+from unittest import mock
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from ai_agent import views
+from ai_agent.services.deepseek_service import DeepSeekAIService
+from ai_agent.services.http_client import close_sessions
+
+from ._stub_upstream import DelayedUpstream
+from ._utils import throwaway_database
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare N single /api/chat/ calls with the same messages sent through /api/chat/batch/, '
+        'against a delayed local DeepSeek stub'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--messages', type=int, default=200)
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--distinct', type=int, default=50,
+                            help='Distinct questions among the messages (gateways forward many duplicates)')
+        parser.add_argument('--sessions', type=int, default=20)
+        parser.add_argument('--delay', type=float, default=0.05, help='Upstream latency in seconds')
+        parser.add_argument('--concurrency', type=int, default=8)
+
+    def handle(self, *args, **options):
+        items = [
+            {
+                'message': f"What does internet package {index % options['distinct']} cost?",
+                'session_id': f"bench-batch-{index % options['sessions']}",
+            }
+            for index in range(options['messages'])
+        ]
+
+        with throwaway_database(), DelayedUpstream(delay=options['delay']) as upstream, override_settings(
+            DEEPSEEK_API_KEY='bench',
+            DEEPSEEK_BASE_URL=upstream.url,
+            DEEPSEEK_POOL_SIZE=options['concurrency'],
+            CHAT_BATCH={'MAX_ITEMS': options['batch_size'], 'MAX_CONCURRENCY': options['concurrency']},
+        ), mock.patch.object(views, 'ai_service', DeepSeekAIService()):
+            self.stdout.write(
+                f"{options['messages']} messages, {options['distinct']} distinct, "
+                f"upstream delay {options['delay'] * 1000:.0f} ms"
+            )
+            self.stdout.write(f"{'mode':<10}{'elapsed':>10}{'msg/s':>10}{'upstream calls':>16}{'queries':>10}")
+            self.report('single', lambda client: self.singles(client, items), upstream)
+            self.report('batch', lambda client: self.batches(client, items, options['batch_size']), upstream)
+            close_sessions()
+
+    def report(self, mode, run, upstream):
+        client = Client()
+        calls = upstream.requests
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            count, failures = run(client)
+            elapsed = time.perf_counter() - start
+        self.stdout.write(
+            f"{mode:<10}{elapsed:>9.2f}s{count / elapsed:>10.0f}{upstream.requests - calls:>16}{len(queries):>10}"
+            + (f"  ({failures} failed)" if failures else "")
+        )
+
+    def singles(self, client, items):
+        failures = 0
+        for item in items:
+            failures += client.post('/api/chat/', item).status_code != 200
+        return len(items), failures
+
+    def batches(self, client, items, batch_size):
+        failures = 0
+        for start in range(0, len(items), batch_size):
+            response = client.post(
+                '/api/chat/batch/', {'items': items[start:start + batch_size]}, content_type='application/json'
+            )
+            if response.status_code != 200:
+                failures += len(items[start:start + batch_size])
+                continue
+            failures += sum(result['status'] != 'success' for result in response.json()['results'])
+        return len(items), failures
@@ -0,0 +1,114 @@
+import json
+import logging
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connection
+
+from ai_agent.models import Message
+from ai_agent.persistence import ChatTurnStore
+
+
+class Command(BaseCommand):
+    help = ('Hammer a scratch SQLite file with concurrent chat writers and history readers '
+            'under the dev and prod settings profiles')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=64)
+        parser.add_argument('--operations', type=int, default=100, help='Operations per thread')
+        parser.add_argument('--sessions', type=int, default=500)
+        parser.add_argument('--read-ratio', type=float, default=0.3)
+        parser.add_argument('--profiles', nargs='+', default=['dev', 'prod'])
+        parser.add_argument('--worker', action='store_true',
+                            help='Internal: run one profile against the database in SQLITE_PATH')
+
+    def handle(self, *args, **options):
+        if options['worker']:
+            self.stdout.write(json.dumps(self.run_worker(options)))
+            return
+
+        self.stdout.write(f"{'profile':>8}{'ops/s':>10}{'p50 ms':>9}{'p99 ms':>9}{'locked':>8}{'rows':>8}")
+        for profile in options['profiles']:
+            result = self.run_profile(profile, options)
+            self.stdout.write(
+                f"{profile:>8}{result['throughput']:>10.0f}{result['p50']:>9.2f}{result['p99']:>9.2f}"
+                f"{result['locked']:>8}{result['rows']:>8}"
+            )
+
+    def run_profile(self, profile, options):
+        # Each profile runs in a fresh process: the settings (and the PRAGMAs
+        # applied by the connection_created hook) are fixed at import time
+        with tempfile.TemporaryDirectory() as directory:
+            env = {
+                **os.environ,
+                'DJANGO_PROFILE': profile,
+                'DATABASE_ENGINE': 'sqlite3',
+                'SQLITE_PATH': os.path.join(directory, 'bench.sqlite3'),
+            }
+            command = [
+                sys.executable, str(settings.BASE_DIR / 'manage.py'), 'bench_concurrent_writers', '--worker',
+                '--threads', str(options['threads']),
+                '--operations', str(options['operations']),
+                '--sessions', str(options['sessions']),
+                '--read-ratio', str(options['read_ratio']),
+            ]
+            completed = subprocess.run(command, env=env, capture_output=True, text=True, check=True)
+        return json.loads(completed.stdout.strip().splitlines()[-1])
+
+    def run_worker(self, options):
+        call_command('migrate', verbosity=0)
+        connection.close()
+        logging.disable(logging.INFO)
+
+        store = ChatTurnStore()
+        sessions = [f'bench-{index}' for index in range(options['sessions'])]
+        latencies, errors = [], []
+        lock = threading.Lock()
+        barrier = threading.Barrier(options['threads'])
+
+        def worker(seed):
+            rng = random.Random(seed)
+            samples, failures = [], []
+            barrier.wait()
+            for _ in range(options['operations']):
+                session_id = rng.choice(sessions)
+                start = time.perf_counter()
+                try:
+                    if rng.random() < options['read_ratio']:
+                        list(Message.objects.filter(conversation__session_id=session_id).order_by('-created_at')[:50])
+                    else:
+                        store.save_turn(session_id, 'en', 'How do I check my balance?', 'Dial *123#')
+                except OperationalError as e:
+                    failures.append(str(e))
+                samples.append((time.perf_counter() - start) * 1000)
+            connection.close()
+            with lock:
+                latencies.extend(samples)
+                errors.extend(failures)
+
+        threads = [threading.Thread(target=worker, args=(seed,)) for seed in range(options['threads'])]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+
+        latencies.sort()
+        return {
+            'throughput': len(latencies) / elapsed,
+            'p50': statistics.median(latencies),
+            'p99': latencies[int(len(latencies) * 0.99) - 1],
+            'locked': sum('locked' in error for error in errors),
+            'errors': len(errors),
+            'rows': Message.objects.count(),
+        }
@@ -0,0 +1,101 @@
+import statistics
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from ai_agent.models import Conversation, Message
+from ai_agent.pagination import KeysetPaginator
+
+from ._utils import throwaway_database
+
+
+class Command(BaseCommand):
+    help = 'Seed a throwaway database and compare keyset vs OFFSET pagination of conversation history'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--messages', type=int, default=1_000_000)
+        parser.add_argument('--other-conversations', type=int, default=1_000,
+                            help='Extra conversations sharing the table (10 messages each)')
+        parser.add_argument('--page-size', type=int, default=50)
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        with throwaway_database():
+            start = time.perf_counter()
+            conversation = self.seed(options['messages'], options['other_conversations'])
+            self.stdout.write(f"seeded {options['messages']} messages in {time.perf_counter() - start:.1f}s")
+
+            self.report(conversation, options['messages'], options['page_size'], options['repeat'])
+            self.check_query_count(conversation, options['page_size'])
+
+    def seed(self, count, other_conversations):
+        target = Conversation.objects.create(session_id='bench-history')
+        others = Conversation.objects.bulk_create(
+            [Conversation(session_id=f'bench-other-{index}') for index in range(other_conversations)]
+        )
+        base = timezone.now() - timedelta(days=30)
+        table = Message._meta.db_table
+        sql = (
+            f'INSERT INTO {table} (conversation_id, content, is_user, intent, confidence, created_at) '
+            'VALUES (%s, %s, %s, %s, %s, %s)'
+        )
+
+        def rows(conversation_ids, total):
+            for index in range(total):
+                yield (
+                    conversation_ids[index % len(conversation_ids)].hex,
+                    f'message {index}',
+                    index % 2 == 0,
+                    '',
+                    0.0,
+                    base + timedelta(milliseconds=index),
+                )
+
+        batch = []
+        with connection.cursor() as cursor:
+            for row in rows([target.id], count):
+                batch.append(row)
+                if len(batch) == 10_000:
+                    cursor.executemany(sql, batch)
+                    batch.clear()
+            if others:
+                batch.extend(rows([other.id for other in others], len(others) * 10))
+            if batch:
+                cursor.executemany(sql, batch)
+        return target
+
+    def report(self, conversation, count, page_size, repeat):
+        paginator = KeysetPaginator(default_page_size=page_size, max_page_size=page_size)
+        queryset = Message.objects.filter(conversation_id=conversation.id)
+        ordered = queryset.order_by('created_at', 'id')
+
+        self.stdout.write(f"{'depth (rows)':>14}{'keyset ms':>12}{'offset ms':>12}")
+        for depth in (0, count // 100, count // 10, count // 2, count - page_size):
+            cursor = None
+            if depth:
+                anchor = ordered.values_list('created_at', 'id')[depth - 1]
+                cursor = paginator.encode_cursor(*anchor)
+
+            keyset = self.time(lambda: paginator.paginate(queryset, cursor=cursor), repeat)
+            offset = self.time(lambda: list(ordered[depth:depth + page_size]), repeat)
+            self.stdout.write(f"{depth:>14}{keyset:>12.2f}{offset:>12.2f}")
+
+    def check_query_count(self, conversation, page_size):
+        client = Client()
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(f'/api/conversations/{conversation.session_id}/messages/?page_size={page_size}')
+        self.stdout.write(f"history endpoint: HTTP {response.status_code}, {len(queries)} queries")
+
+    @staticmethod
+    def time(fn, repeat):
+        samples = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            fn()
+            samples.append((time.perf_counter() - start) * 1000)
+        return statistics.median(samples)
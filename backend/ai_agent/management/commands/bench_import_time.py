@@ -0,0 +1,84 @@
+import os
+import subprocess
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+# What a starting server or management command does before its first request
+STARTUP = (
+    "import django; django.setup(); "
+    "from django.urls import get_resolver; get_resolver().url_patterns"
+)
+
+# Imported on a provider's first use, never at startup
+LAZY_MODULES = (
+    'openai',
+    'aiohttp',
+    'ai_agent.services.ai_service',
+    'ai_agent.services.deepseek_service',
+)
+
+
+def parse_importtime(stderr):
+    """``{module: (self µs, cumulative µs)}`` from ``python -X importtime`` output"""
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        own, cumulative, name = line[len('import time:'):].split('|', 2)
+        modules[name.strip()] = (int(own), int(cumulative))
+    return modules
+
+
+class Command(BaseCommand):
+    help = (
+        'Import time of Django setup plus the URLconf with every provider enabled (python -X importtime); '
+        'fails when it passes --max-ms or when a provider SDK is imported at startup'
+    )
+    # The checks would import the URLconf in this process, which is not what is measured
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=5, help='Fresh interpreters to time; the fastest counts')
+        parser.add_argument('--max-ms', type=float, default=0,
+                            help='Fail when startup imports take longer than this (0: no limit)')
+        parser.add_argument('--top', type=int, default=15, help='Slowest modules to list')
+        parser.add_argument('--providers', default='deepseek,openai,mock', help='AI_PROVIDERS for the run')
+
+    def measure(self, providers):
+        env = {
+            **os.environ,
+            'DJANGO_SETTINGS_MODULE': os.environ.get('DJANGO_SETTINGS_MODULE', 'telecom_ai.settings'),
+            'AI_PROVIDERS': providers,
+            # Keys make every provider constructible, so nothing is skipped for a missing one
+            'DEEPSEEK_API_KEY': os.environ.get('DEEPSEEK_API_KEY', 'bench'),
+            'OPENAI_API_KEY': os.environ.get('OPENAI_API_KEY', 'bench'),
+            'WARM_UP_ON_STARTUP': 'False',
+        }
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', STARTUP],
+            capture_output=True, text=True, env=env, timeout=120,
+        )
+        if result.returncode:
+            raise CommandError(f"Startup failed:\n{result.stderr[-2000:]}")
+        return parse_importtime(result.stderr)
+
+    def handle(self, *args, **options):
+        runs = [self.measure(options['providers']) for _ in range(max(options['runs'], 1))]
+        totals = [sum(own for own, _ in modules.values()) / 1000 for modules in runs]
+        fastest = runs[totals.index(min(totals))]
+
+        self.stdout.write(
+            f"startup imports: {min(totals):.1f} ms fastest, {max(totals):.1f} ms slowest over {len(runs)} runs, "
+            f"{len(fastest)} modules (AI_PROVIDERS={options['providers']})"
+        )
+        self.stdout.write(f"{'module':<60}{'self ms':>10}{'cumulative ms':>15}")
+        slowest = sorted(fastest.items(), key=lambda item: item[1][1], reverse=True)[:options['top']]
+        for name, (own, cumulative) in slowest:
+            self.stdout.write(f"{name:<60}{own / 1000:>10.1f}{cumulative / 1000:>15.1f}")
+
+        eager = [name for name in LAZY_MODULES if name in fastest]
+        if eager:
+            raise CommandError(f"Imported at startup instead of on first use: {', '.join(eager)}")
+        if options['max_ms'] and min(totals) > options['max_ms']:
+            raise CommandError(f"Startup imports took {min(totals):.1f} ms, over the {options['max_ms']:.0f} ms limit")
@@ -0,0 +1,68 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from ai_agent.services.intent import INTENT_KEYWORDS, keyword_classifier
+from ai_agent.services.mock_ai_service import RESPONSES
+
+SAMPLE_MESSAGES = (
+    "Hello, I need help",
+    "How can I check my balance?",
+    "What internet packages do you have?",
+    "Is there network coverage in Herat?",
+    "How do I register my SIM card?",
+    "I have a technical problem with my phone",
+    "When does your office open?",
+    "سلام، چطور هستید؟",
+    "بیلانس من چقدر است؟",
+    "بسته های اینترنتی چی قیمت دارد؟",
+    "پوشش شبکه در بامیان چطور است؟",
+    "برای ثبت سیم چه چیزی لازم است؟",
+    "سلام، څنګه یاست؟",
+    "د انټرنیټ پیکیجونه څه دي؟",
+    "په کندهار کې د شبکې پوښښ شته؟",
+    "زما سګنال کمزوری دی",
+    "تخنیکي ستونزې لرم",
+)
+
+
+def legacy_classify(message):
+    """The per-call path MockAIService used before the precompiled classifier"""
+    # Rebuilding the tables mirrors the dict literal the old code evaluated on every call
+    responses = {language: {category: list(options) for category, options in table.items()}
+                 for language, table in RESPONSES.items()}
+    message_lower = message.lower()
+    for intent, words in INTENT_KEYWORDS:
+        if any(word in message_lower for word in words):
+            return intent, responses
+    return 'default', responses
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the precompiled intent classifier against the legacy keyword scan'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--messages', type=int, default=100_000)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        messages = [rng.choice(SAMPLE_MESSAGES) for _ in range(options['messages'])]
+
+        start = time.perf_counter()
+        legacy = [legacy_classify(message)[0] for message in messages]
+        legacy_elapsed = time.perf_counter() - start
+
+        start = time.perf_counter()
+        current = [keyword_classifier.classify(message).intent for message in messages]
+        current_elapsed = time.perf_counter() - start
+
+        mismatches = sum(1 for old, new in zip(legacy, current) if old != new)
+
+        count = len(messages)
+        self.stdout.write(f"messages:   {count}")
+        self.stdout.write(f"legacy:     {legacy_elapsed:.3f}s ({legacy_elapsed / count * 1e6:.2f} µs/msg)")
+        self.stdout.write(f"classifier: {current_elapsed:.3f}s ({current_elapsed / count * 1e6:.2f} µs/msg)")
+        self.stdout.write(f"speedup:    {legacy_elapsed / current_elapsed:.1f}x")
+        self.stdout.write(f"mismatches: {mismatches}")
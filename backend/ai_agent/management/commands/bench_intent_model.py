@@ -0,0 +1,79 @@
+import random
+import statistics
+import time
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+
+from ai_agent.models import TelecomKnowledgeBase
+from ai_agent.services.intent import keyword_classifier
+from ai_agent.services.intent_model import CATEGORY_INTENTS, train_intent_classifier
+from ai_agent.services.retrieval import QUESTION_FIELDS
+
+from ._utils import throwaway_database
+from .bench_intent import SAMPLE_MESSAGES
+
+
+class Command(BaseCommand):
+    help = (
+        'Accuracy and latency of the n-gram intent classifier, trained on the knowledge base fixture, '
+        'next to the keyword classifier'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--messages', type=int, default=20_000)
+        parser.add_argument('--batch-size', type=int, default=256)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        with throwaway_database():
+            call_command('loaddata', 'knowledge_base', verbosity=0)
+            entries = list(TelecomKnowledgeBase.objects.all())
+        classifier = train_intent_classifier(entries)
+
+        self.stdout.write("accuracy")
+        held_out = self.leave_one_entry_out(entries)
+        self.stdout.write(f"  knowledge base questions, leave-one-entry-out: {held_out:.1%}")
+        agreement = sum(
+            classifier.classify(message).intent == keyword_classifier.classify(message).intent
+            for message in SAMPLE_MESSAGES
+        ) / len(SAMPLE_MESSAGES)
+        self.stdout.write(f"  sample messages, agreement with the keyword classifier: {agreement:.1%}")
+
+        rng = random.Random(options['seed'])
+        messages = [rng.choice(SAMPLE_MESSAGES) for _ in range(options['messages'])]
+        self.stdout.write(f"latency over {len(messages)} messages")
+        self.stdout.write(f"{'classifier':<22}{'p50 µs':>9}{'p99 µs':>9}{'µs/msg in batches':>20}")
+        for name, model in (('keyword', keyword_classifier), ('ngram centroid', classifier)):
+            p50, p99 = self.per_message(model, messages)
+            batch = self.batched(model, messages, options['batch_size'])
+            self.stdout.write(f"{name:<22}{p50:>9.1f}{p99:>9.1f}{batch:>20.1f}")
+
+    @staticmethod
+    def leave_one_entry_out(entries):
+        correct = total = 0
+        for index, entry in enumerate(entries):
+            model = train_intent_classifier(entries[:index] + entries[index + 1:])
+            expected = CATEGORY_INTENTS.get(entry.category, entry.category)
+            for field in QUESTION_FIELDS:
+                total += 1
+                correct += model.classify(getattr(entry, field)).intent == expected
+        return correct / total if total else 0.0
+
+    @staticmethod
+    def per_message(model, messages):
+        samples = []
+        for message in messages:
+            start = time.perf_counter()
+            model.classify(message)
+            samples.append((time.perf_counter() - start) * 1e6)
+        samples.sort()
+        return statistics.median(samples), samples[int(len(samples) * 0.99) - 1]
+
+    @staticmethod
+    def batched(model, messages, batch_size):
+        classify_batch = getattr(model, 'classify_batch', None) or (lambda batch: [model.classify(m) for m in batch])
+        start = time.perf_counter()
+        for offset in range(0, len(messages), batch_size):
+            classify_batch(messages[offset:offset + batch_size])
+        return (time.perf_counter() - start) / len(messages) * 1e6
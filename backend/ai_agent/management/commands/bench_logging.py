@@ -0,0 +1,114 @@
+import logging
+import logging.config
+import os
+import statistics
+import tempfile
+import time
+from unittest import mock
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test import Client
+
+from ._utils import throwaway_database
+
+
+def sync_logging(directory, devnull):
+    """The dev profile's configuration: console + FileHandler, ai_agent at DEBUG"""
+    return {
+        'version': 1,
+        'disable_existing_loggers': False,
+        'handlers': {
+            # A terminal would make the baseline look even worse; /dev/null keeps it fair
+            'console': {'class': 'logging.StreamHandler', 'stream': devnull},
+            'file': {'class': 'logging.FileHandler', 'filename': os.path.join(directory, 'debug.log')},
+        },
+        'root': {'handlers': ['console', 'file'], 'level': 'INFO'},
+        'loggers': {
+            'django': {'handlers': ['console', 'file'], 'level': 'INFO', 'propagate': False},
+            'ai_agent': {'handlers': ['console', 'file'], 'level': 'DEBUG', 'propagate': False},
+        },
+    }
+
+
+def async_logging(directory, devnull):
+    """The prod profile's configuration: queue + listener thread + rotating JSON file"""
+    return {
+        'version': 1,
+        'disable_existing_loggers': False,
+        'handlers': {
+            'async_file': {
+                '()': 'ai_agent.log.AsyncQueueHandler',
+                'filename': os.path.join(directory, 'app.log'),
+            },
+        },
+        'root': {'handlers': ['async_file'], 'level': 'INFO'},
+        'loggers': {
+            'django': {'handlers': ['async_file'], 'level': 'INFO', 'propagate': False},
+            'ai_agent': {'handlers': ['async_file'], 'level': 'INFO', 'propagate': False},
+        },
+    }
+
+
+class Command(BaseCommand):
+    help = 'Compare chat_endpoint throughput with synchronous file logging and the async JSON pipeline'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=5000)
+        parser.add_argument('--message-chars', type=int, default=500)
+
+    def handle(self, *args, **options):
+        with throwaway_database(quiet_logging=False), open(os.devnull, 'w') as devnull:
+            self.stdout.write(
+                f"{'logging':>8}{'req/s':>10}{'p50 ms':>9}{'p99 ms':>9}{'logging µs/req':>16}{'log bytes':>12}"
+            )
+            try:
+                for name, build in (('sync', sync_logging), ('async', async_logging)):
+                    with tempfile.TemporaryDirectory() as directory:
+                        logging.config.dictConfig(build(directory, devnull))
+                        throughput, p50, p99, logging_us = self.run(options)
+                        # Closing the handlers drains the async queue before measuring the file size
+                        for handler in logging.getLogger('ai_agent').handlers:
+                            handler.close()
+                        size = sum(entry.stat().st_size for entry in os.scandir(directory))
+                    self.stdout.write(
+                        f"{name:>8}{throughput:>10.0f}{p50:>9.2f}{p99:>9.2f}{logging_us:>16.0f}{size:>12}"
+                    )
+            finally:
+                logging.config.dictConfig(settings.LOGGING)
+
+    def run(self, options):
+        # Sequential on purpose: the throwaway database is a shared-cache
+        # in-memory SQLite that serializes concurrent writers anyway
+        filler = ('How much does the monthly internet package cost? ' * 20)[:options['message_chars']]
+        client = Client()
+        latencies, failures = [], 0
+        in_logging = [0.0]
+        original_log = logging.Logger._log
+
+        def timed_log(logger, *args, **kwargs):
+            # Time spent inside logging calls on the request thread
+            start = time.perf_counter()
+            try:
+                return original_log(logger, *args, **kwargs)
+            finally:
+                in_logging[0] += time.perf_counter() - start
+
+        start = time.perf_counter()
+        with mock.patch.object(logging.Logger, '_log', timed_log):
+            for index in range(options['requests']):
+                request_start = time.perf_counter()
+                response = client.post('/api/chat/', {'message': f'{index} {filler}', 'session_id': 'bench-log'})
+                latencies.append((time.perf_counter() - request_start) * 1000)
+                failures += response.status_code != 200
+        elapsed = time.perf_counter() - start
+
+        if failures:
+            self.stderr.write(f"{failures} requests failed")
+        latencies.sort()
+        return (
+            len(latencies) / elapsed,
+            statistics.median(latencies),
+            latencies[int(len(latencies) * 0.99) - 1],
+            in_logging[0] / len(latencies) * 1e6,
+        )
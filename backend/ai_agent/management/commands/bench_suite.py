@@ -0,0 +1,238 @@
+import asyncio
+import json
+import platform
+import subprocess
+import time
+from unittest import mock
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.test import AsyncClient, override_settings
+
+from ai_agent import views
+from ai_agent.models import Message
+from ai_agent.persistence import ChatTurnStore
+from ai_agent.serializers import ChatRequestSerializer, MessageSerializer
+from ai_agent.services.cache import CachedAIService, MemoryCacheBackend, ResponseCache
+from ai_agent.services.http_client import close_async_sessions, close_sessions
+from ai_agent.services.mock_ai_service import MockAIService
+from ai_agent.services.router import ProviderRouter
+from ai_agent.services.singleflight import SingleFlightAIService
+
+from ._stub_upstream import DelayedUpstream
+from ._utils import count_queries, latency_summary, throwaway_database
+from .bench_intent import SAMPLE_MESSAGES
+
+ENDPOINTS = ('chat', 'chat_async', 'voice_chat', 'health')
+
+# Metrics where a higher number is better; for everything else lower is better
+HIGHER_IS_BETTER = ('ops_per_s', 'throughput_rps')
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True, timeout=5
+        ).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        'Micro-benchmarks (mock provider, serializers, ORM write path) and an open-loop load generator for the '
+        '/api endpoints against a stub provider; prints the results as JSON so runs can be diffed between commits'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--part', choices=('all', 'micro', 'load'), default='all')
+        parser.add_argument('--output', help='Also write the JSON report to this file')
+        parser.add_argument('--compare', help='A previous JSON report to print relative changes against')
+        parser.add_argument('--iterations', type=int, default=2000, help='Calls per micro-benchmark')
+        parser.add_argument('--endpoints', default=','.join(ENDPOINTS))
+        parser.add_argument('--rps', type=float, default=100, help='Target request rate per endpoint')
+        parser.add_argument('--duration', type=float, default=5, help='Seconds of load per endpoint')
+        parser.add_argument('--provider', choices=('stub', 'mock'), default='stub',
+                            help="'stub': the real provider stack routed to DeepSeek on a local stub; "
+                                 "'mock': the configured service")
+        parser.add_argument('--latency', type=float, default=0.05, help='Stub provider latency in seconds')
+        parser.add_argument('--distinct', type=int, default=0,
+                            help='Distinct chat messages to cycle through (0: every message is new)')
+
+    def handle(self, *args, **options):
+        endpoints = [endpoint for endpoint in options['endpoints'].split(',') if endpoint]
+        unknown = set(endpoints) - set(ENDPOINTS)
+        if unknown:
+            raise CommandError(f"Unknown endpoints: {', '.join(sorted(unknown))}")
+
+        report = {
+            'meta': {
+                'commit': git_commit(),
+                'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'options': {name: options[name] for name in (
+                    'iterations', 'rps', 'duration', 'provider', 'latency', 'distinct'
+                )},
+            },
+        }
+        with throwaway_database():
+            if options['part'] in ('all', 'micro'):
+                report['micro'] = self.micro(options['iterations'])
+            if options['part'] in ('all', 'load'):
+                report['load'] = self.load(endpoints, options)
+
+        text = json.dumps(report, indent=2, ensure_ascii=False)
+        self.stdout.write(text)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as output:
+                output.write(text + '\n')
+        if options['compare']:
+            with open(options['compare'], encoding='utf-8') as previous:
+                self.compare(json.load(previous), report)
+
+    # --- Micro-benchmarks ----------------------------------------------------
+
+    def micro(self, iterations):
+        mock_service = MockAIService()
+        store = ChatTurnStore()
+        chat_data = {'message': 'How much is the monthly internet package?', 'session_id': 'bench', 'language': 'fa'}
+        store.save_turn('bench-page', 'en', 'question', 'answer')
+        for index in range(24):
+            store.save_turn('bench-page', 'en', f'question {index}', f'answer {index}')
+        page = list(Message.objects.filter(conversation__session_id='bench-page')[:50])
+
+        cold = iter(range(iterations))
+        batch = [('bench-batch', 'en', f'question {index}', f'answer {index}', {}) for index in range(50)]
+        benchmarks = {
+            'mock_generate_response': lambda index: mock_service.generate_response(
+                SAMPLE_MESSAGES[index % len(SAMPLE_MESSAGES)], ('en', 'fa', 'ps')[index % 3]
+            ),
+            'chat_request_serializer': lambda index: ChatRequestSerializer(data=chat_data).is_valid(),
+            'message_serializer_50': lambda index: MessageSerializer(page, many=True).data,
+            'save_turn_hot_session': lambda index: store.save_turn('bench-hot', 'en', 'question', 'answer'),
+            'save_turn_cold_session': lambda index: store.save_turn(f'bench-cold-{next(cold)}', 'en', 'q', 'a'),
+            'save_turns_batch_50': lambda index: store.save_turns(batch),
+        }
+        results = {}
+        for name, benchmark in benchmarks.items():
+            samples = []
+            with count_queries() as queries:
+                for index in range(iterations):
+                    start = time.perf_counter()
+                    benchmark(index)
+                    samples.append((time.perf_counter() - start) * 1000)
+            total = sum(samples) / 1000
+            results[name] = {
+                'iterations': iterations,
+                'ops_per_s': round(iterations / total, 1),
+                **latency_summary(samples),
+                'queries_per_op': round(queries[0] / iterations, 2),
+            }
+            self.stderr.write(f"micro {name}: p50 {results[name]['p50_ms']} ms")
+        return results
+
+    # --- Load generator ------------------------------------------------------
+
+    def load(self, endpoints, options):
+        if options['provider'] == 'mock':
+            return self.drive_all(endpoints, options, upstream=None)
+
+        with DelayedUpstream(delay=options['latency']) as upstream, override_settings(
+            DEEPSEEK_API_KEY='bench',
+            DEEPSEEK_BASE_URL=upstream.url,
+            DEEPSEEK_POOL_SIZE=max(int(options['rps']), 10),
+            AI_ROUTING={'PROVIDERS': ['deepseek']},
+        ):
+            # The same layers views.py puts in front of the providers
+            service = SingleFlightAIService(ProviderRouter.from_settings())
+            service = CachedAIService(service, ResponseCache(MemoryCacheBackend()))
+            with mock.patch.object(views, 'ai_service', service):
+                results = self.drive_all(endpoints, options, upstream)
+            close_sessions()
+            return results
+
+    def drive_all(self, endpoints, options, upstream):
+        results = {}
+        for endpoint in endpoints:
+            results[endpoint] = asyncio.run(self.drive(endpoint, options, upstream))
+            self.stderr.write(
+                f"load {endpoint}: {results[endpoint]['throughput_rps']} req/s, p99 {results[endpoint]['p99_ms']} ms"
+            )
+        return results
+
+    def request(self, client, endpoint, index, distinct):
+        number = index % distinct if distinct else index
+        # Tagged per endpoint so one endpoint's answers are not cache hits for the next
+        message = f"{SAMPLE_MESSAGES[number % len(SAMPLE_MESSAGES)]} {endpoint} {number}"
+        session_id = f'load-{endpoint}-{index % 50}'
+        if endpoint == 'chat':
+            return client.post('/api/chat/', {'message': message, 'session_id': session_id},
+                               content_type='application/json')
+        if endpoint == 'chat_async':
+            return client.post('/api/async/chat/', {'message': message, 'session_id': session_id},
+                               content_type='application/json')
+        if endpoint == 'voice_chat':
+            return client.post('/api/voice-chat/', {'text': message, 'session_id': session_id},
+                               content_type='application/json')
+        return client.get('/api/health/')
+
+    async def drive(self, endpoint, options, upstream):
+        """Send requests on a fixed schedule of ``rps`` per second (open loop).
+
+        Latency is measured from each request's scheduled send time, so time
+        spent queued behind slow requests counts (no coordinated omission).
+        Requests go through the ASGI handler, which runs sync views one at a
+        time on its sync thread, as a single uvicorn worker would.
+        """
+        client = AsyncClient()
+        rps, total = options['rps'], max(int(options['rps'] * options['duration']), 1)
+        for index in range(3):
+            await self.request(client, endpoint, -1 - index, options['distinct'])   # warm-up, not measured
+
+        loop = asyncio.get_running_loop()
+        latencies, errors = [], 0
+        upstream_before = upstream.requests if upstream is not None else 0
+
+        async def one(index, start):
+            nonlocal errors
+            scheduled = start + index / rps
+            await asyncio.sleep(max(scheduled - loop.time(), 0))
+            response = await self.request(client, endpoint, index, options['distinct'])
+            latencies.append((loop.time() - scheduled) * 1000)
+            errors += response.status_code != 200
+
+        with count_queries() as queries:
+            start = loop.time()
+            await asyncio.gather(*(one(index, start) for index in range(total)))
+            elapsed = loop.time() - start
+        await close_async_sessions()
+
+        return {
+            'target_rps': rps,
+            'requests': total,
+            'errors': errors,
+            'elapsed_s': round(elapsed, 3),
+            'throughput_rps': round(total / elapsed, 1),
+            **latency_summary(latencies),
+            'queries_per_request': round(queries[0] / total, 2),
+            'upstream_calls': (upstream.requests - upstream_before) if upstream is not None else None,
+        }
+
+    # --- Comparison ----------------------------------------------------------
+
+    def compare(self, previous, current):
+        self.stderr.write(f"\nchange vs {previous['meta'].get('commit')} (+ is better)")
+        for part in ('micro', 'load'):
+            for name, metrics in current.get(part, {}).items():
+                before = previous.get(part, {}).get(name)
+                if not before:
+                    continue
+                changes = []
+                for metric in ('p50_ms', 'p99_ms', 'ops_per_s', 'throughput_rps'):
+                    if before.get(metric) and metrics.get(metric) is not None:
+                        change = (metrics[metric] - before[metric]) / before[metric]
+                        if metric not in HIGHER_IS_BETTER:
+                            change = -change
+                        changes.append(f"{metric} {change:+.1%}")
+                self.stderr.write(f"  {part}.{name}: {', '.join(changes)}")
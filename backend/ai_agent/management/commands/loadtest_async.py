@@ -0,0 +1,66 @@
+import asyncio
+import time
+from unittest import mock
+
+from django.core.management.base import BaseCommand
+from django.test import AsyncClient, override_settings
+
+from ai_agent import views
+from ai_agent.services.deepseek_service import DeepSeekAIService
+from ai_agent.services.http_client import close_async_sessions
+
+from ._stub_upstream import DelayedUpstream
+from ._utils import throwaway_database
+
+
+class Command(BaseCommand):
+    help = (
+        'Drive the sync and async chat endpoints in-process through the ASGI handler '
+        'against a delayed local DeepSeek stub and report how throughput scales with concurrency'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--delay', type=float, default=0.2, help='Upstream latency in seconds')
+        parser.add_argument('--levels', default='1,10,100,1000', help='Comma separated concurrency levels')
+        parser.add_argument('--sync-max', type=int, default=50,
+                            help='Highest concurrency level to also run against the sync endpoint')
+
+    def handle(self, *args, **options):
+        levels = [int(level) for level in options['levels'].split(',')]
+
+        with throwaway_database(), DelayedUpstream(delay=options['delay']) as upstream, override_settings(
+            DEEPSEEK_API_KEY='loadtest',
+            DEEPSEEK_BASE_URL=upstream.url,
+            DEEPSEEK_POOL_SIZE=options['sync_max'],
+        ), mock.patch.object(views, 'ai_service', DeepSeekAIService()):
+            self.stdout.write(f"upstream delay: {options['delay'] * 1000:.0f} ms")
+            self.stdout.write(f"{'endpoint':<18}{'concurrency':>12}{'elapsed':>10}{'req/s':>10}{'upstream peak':>15}")
+            for level in levels:
+                self.report('/api/async/chat/', level, upstream)
+                if level <= options['sync_max']:
+                    self.report('/api/chat/', level, upstream)
+
+    def report(self, path, concurrency, upstream):
+        upstream.max_in_flight = 0
+        elapsed, failures = asyncio.run(self.burst(path, concurrency))
+        self.stdout.write(
+            f"{path:<18}{concurrency:>12}{elapsed:>9.2f}s{concurrency / elapsed:>10.1f}{upstream.max_in_flight:>15}"
+            + (f"  ({failures} failed)" if failures else "")
+        )
+
+    async def burst(self, path, concurrency):
+        client = AsyncClient()
+
+        async def one(index):
+            response = await client.post(
+                path,
+                {'message': 'internet packages price', 'session_id': f'load-{path}-{index}'},
+                content_type='application/json',
+            )
+            return response.status_code == 200
+
+        start = time.perf_counter()
+        results = await asyncio.gather(*(one(index) for index in range(concurrency)))
+        elapsed = time.perf_counter() - start
+        await close_async_sessions()
+        return elapsed, results.count(False)
@@ -0,0 +1,50 @@
+import os
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from ai_agent.models import TelecomKnowledgeBase
+from ai_agent.services.intent_model import (
+    DEFAULT_INTENT_MODEL_SETTINGS, set_intent_classifier, train_intent_classifier, training_examples,
+)
+
+
+class Command(BaseCommand):
+    help = 'Train the local intent classifier from the knowledge base questions and save it'
+
+    def add_arguments(self, parser):
+        options = {**DEFAULT_INTENT_MODEL_SETTINGS, **getattr(settings, 'INTENT_CLASSIFIER', {})}
+        parser.add_argument('--output', default=options['MODEL_FILE'])
+        parser.add_argument('--n-features', type=int, default=options['N_FEATURES'])
+
+    def handle(self, *args, **options):
+        entries = list(TelecomKnowledgeBase.objects.all())
+        if not entries:
+            self.stderr.write("The knowledge base is empty; training on the intent keywords only")
+        examples = list(training_examples(entries))
+
+        start = time.perf_counter()
+        try:
+            classifier = train_intent_classifier(entries, n_features=options['n_features'])
+        except ValueError as e:
+            raise CommandError(str(e))
+        elapsed = time.perf_counter() - start
+
+        predicted = classifier.classify_batch([text for text, _ in examples])
+        correct = sum(match.intent == intent for match, (_, intent) in zip(predicted, examples))
+        for intent, count in sorted(Counter(intent for _, intent in examples).items()):
+            self.stdout.write(f"{intent:<12}{count:>6} examples")
+        self.stdout.write(
+            f"trained on {len(examples)} examples from {len(entries)} entries in {elapsed * 1000:.1f} ms; "
+            f"training accuracy {correct / len(examples):.1%}"
+        )
+
+        os.makedirs(os.path.dirname(os.path.abspath(options['output'])), exist_ok=True)
+        classifier.save(options['output'])
+        set_intent_classifier(classifier)
+        self.stdout.write(self.style.SUCCESS(
+            f"saved {options['output']} ({os.path.getsize(options['output'])} bytes); "
+            "running servers pick it up on restart"
+        ))
@@ -0,0 +1,24 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from ai_agent.warmup import memory_usage, warm_up
+
+
+class Command(BaseCommand):
+    help = (
+        'Build the provider stack, knowledge base index and intent model (optionally the spoken canned '
+        'answers) the way a starting server does, and report the time and memory it takes'
+    )
+    # The checks would import the URLconf first and hide its cost
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument('--speech', action='store_true',
+                            help='Also render every canned answer into the text-to-speech cache')
+
+    def handle(self, *args, **options):
+        before = memory_usage()
+        report = warm_up(speech=options['speech'])
+        report['memory_mb_before'] = before
+        self.stdout.write(json.dumps(report, indent=2))
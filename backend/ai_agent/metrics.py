@@ -0,0 +1,234 @@
+"""In-process metrics rendered in the Prometheus text exposition format.
+
+Every metric keeps plain counters per label combination behind its own
+lock, so recording a value costs a dict lookup, a bisect and an addition.
+Nothing is exported until ``/api/metrics`` is scraped.
+"""
+import functools
+import inspect
+import threading
+import time
+from bisect import bisect_left
+
+# Seconds; covers cache/KB answers (sub-millisecond) up to slow LLM calls
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(labelnames, labelvalues, extra=()):
+    pairs = list(zip(labelnames, labelvalues)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    type_name = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labelvalues, amount=1):
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    @property
+    def family(self):
+        # The name in HELP/TYPE must be the sample name, suffix included
+        return f'{self.name}_total'
+
+    def value(self, *labelvalues):
+        return self._values.get(labelvalues, 0)
+
+    def collect(self):
+        with self._lock:
+            values = list(self._values.items())
+        for labelvalues, value in sorted(values):
+            yield f'{self.family}{_format_labels(self.labelnames, labelvalues)} {_format_value(value)}'
+
+
+class Histogram:
+    type_name = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}    # label values -> [per-bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    @property
+    def family(self):
+        return self.name
+
+    def observe(self, value, *labelvalues):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._values.get(labelvalues)
+            if counts is None:
+                counts = self._values[labelvalues] = [0] * (len(self.buckets) + 1) + [0.0]
+            counts[index] += 1
+            counts[-1] += value
+
+    def count(self, *labelvalues):
+        counts = self._values.get(labelvalues)
+        return sum(counts[:-1]) if counts else 0
+
+    def time(self, *labelvalues):
+        return _Timer(self, labelvalues)
+
+    def collect(self):
+        with self._lock:
+            values = [(labelvalues, list(counts)) for labelvalues, counts in self._values.items()]
+        for labelvalues, counts in sorted(values):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labelnames, labelvalues, [('le', _format_value(bound))])
+                yield f'{self.name}_bucket{labels} {cumulative}'
+            labels = _format_labels(self.labelnames, labelvalues)
+            yield f'{self.name}_sum{labels} {_format_value(counts[-1])}'
+            yield f'{self.name}_count{labels} {cumulative}'
+
+
+class _Timer:
+    __slots__ = ('histogram', 'labelvalues', 'start')
+
+    def __init__(self, histogram, labelvalues):
+        self.histogram = histogram
+        self.labelvalues = labelvalues
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.start, *self.labelvalues)
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = {}
+
+    def register(self, metric):
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self):
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f'# HELP {metric.family} {metric.documentation}')
+            lines.append(f'# TYPE {metric.family} {metric.type_name}')
+            lines.extend(metric.collect())
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+chat_stage_seconds = registry.histogram(
+    'chat_stage_seconds', 'Time spent in each stage of a chat request', ('endpoint', 'stage')
+)
+chat_requests = registry.counter(
+    'chat_requests', 'Answered chat requests', ('endpoint', 'intent', 'language', 'provider')
+)
+ai_provider_seconds = registry.histogram(
+    'ai_provider_request_seconds', 'AI provider call latency', ('provider', 'method')
+)
+ai_fallback_responses = registry.counter(
+    'ai_fallback_responses', 'Canned fallback answers served instead of a provider answer', ('provider', 'method')
+)
+
+
+class StageTimer:
+    """Records consecutive stages of one request into ``chat_stage_seconds``.
+
+    Each ``lap(stage)`` observes the time since the previous lap; ``finish()``
+    observes the whole request as stage ``total``.
+    """
+
+    __slots__ = ('endpoint', 'started', 'last')
+
+    def __init__(self, endpoint):
+        self.endpoint = endpoint
+        self.started = self.last = time.perf_counter()
+
+    def lap(self, stage):
+        now = time.perf_counter()
+        chat_stage_seconds.observe(now - self.last, self.endpoint, stage)
+        self.last = now
+
+    def finish(self):
+        now = time.perf_counter()
+        chat_stage_seconds.observe(now - self.started, self.endpoint, 'total')
+        return now - self.started
+
+
+def instrument_provider(provider):
+    """Method decorator timing an AI service call and counting fallback answers.
+
+    Works for plain, ``async`` and generator (streaming) methods taking
+    ``(message, language)``. A call counts as a fallback when its full
+    answer equals the service's ``get_fallback_response(language)``.
+    """
+    def is_fallback(service, text, language):
+        get_fallback = getattr(service, 'get_fallback_response', None)
+        return get_fallback is not None and text == get_fallback(language)
+
+    def decorator(method):
+        name = method.__name__
+
+        if inspect.iscoroutinefunction(method):
+            @functools.wraps(method)
+            async def wrapper(self, message, language='en'):
+                start = time.perf_counter()
+                response = await method(self, message, language)
+                ai_provider_seconds.observe(time.perf_counter() - start, provider, name)
+                if is_fallback(self, response, language):
+                    ai_fallback_responses.inc(provider, name)
+                return response
+        elif inspect.isgeneratorfunction(method):
+            @functools.wraps(method)
+            def wrapper(self, message, language='en'):
+                start = time.perf_counter()
+                chunks = 0
+                first = None
+                for chunk in method(self, message, language):
+                    chunks += 1
+                    if first is None:
+                        first = chunk
+                    yield chunk
+                ai_provider_seconds.observe(time.perf_counter() - start, provider, name)
+                # The fallback is always sent as a single chunk
+                if chunks == 1 and is_fallback(self, first, language):
+                    ai_fallback_responses.inc(provider, name)
+        else:
+            @functools.wraps(method)
+            def wrapper(self, message, language='en'):
+                start = time.perf_counter()
+                response = method(self, message, language)
+                ai_provider_seconds.observe(time.perf_counter() - start, provider, name)
+                if is_fallback(self, response, language):
+                    ai_fallback_responses.inc(provider, name)
+                return response
+        return wrapper
+    return decorator
@@ -27,6 +27,10 @@ class Message(models.Model):
     
     class Meta:
         ordering = ['created_at']
+        indexes = [
+            # Serves conversation history reads and keyset pagination on (created_at, id)
+            models.Index(fields=['conversation', 'created_at', 'id'], name='message_conv_created_idx'),
+        ]
 
 class TelecomKnowledgeBase(models.Model):
     CATEGORIES = [
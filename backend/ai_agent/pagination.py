@@ -0,0 +1,64 @@
+import base64
+from datetime import datetime
+
+from django.db.models import Q
+
+
+class KeysetPaginator:
+    """Cursor pagination on ``(created_at, id)`` without OFFSET.
+
+    Each page is a single index range scan starting right after the last row
+    of the previous page, so page 10,000 costs the same as page 1.
+    """
+
+    def __init__(self, default_page_size=50, max_page_size=200):
+        self.default_page_size = default_page_size
+        self.max_page_size = max_page_size
+
+    @staticmethod
+    def encode_cursor(created_at, pk):
+        raw = f"{created_at.isoformat()}|{pk}".encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+    @staticmethod
+    def decode_cursor(cursor):
+        """Return ``(created_at, pk)``; raises ValueError for a malformed cursor"""
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            created_at, pk = base64.urlsafe_b64decode(padded.encode()).decode().split('|')
+            return datetime.fromisoformat(created_at), int(pk)
+        except (TypeError, ValueError) as e:
+            raise ValueError('Invalid cursor') from e
+
+    def page_size(self, value):
+        if value in (None, ''):
+            return self.default_page_size
+        size = int(value)
+        if size < 1:
+            raise ValueError('page_size must be positive')
+        return min(size, self.max_page_size)
+
+    def paginate(self, queryset, cursor=None, page_size=None, descending=False):
+        """Return ``(rows, next_cursor)``; ``next_cursor`` is None on the last page"""
+        size = self.page_size(page_size)
+        if descending:
+            queryset = queryset.order_by('-created_at', '-id')
+        else:
+            queryset = queryset.order_by('created_at', 'id')
+
+        if cursor:
+            created_at, pk = self.decode_cursor(cursor)
+            # The leading range condition keeps the filter sargable, so the
+            # (conversation, created_at, id) index seeks straight to the cursor
+            if descending:
+                after = Q(created_at__lte=created_at) & (Q(created_at__lt=created_at) | Q(id__lt=pk))
+            else:
+                after = Q(created_at__gte=created_at) & (Q(created_at__gt=created_at) | Q(id__gt=pk))
+            queryset = queryset.filter(after)
+
+        # Fetch one extra row to learn whether another page exists
+        rows = list(queryset[:size + 1])
+        if len(rows) <= size:
+            return rows, None
+        rows = rows[:size]
+        return rows, self.encode_cursor(rows[-1].created_at, rows[-1].id)
@@ -0,0 +1,377 @@
+import atexit
+import logging
+import queue
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, connection, transaction
+from django.utils import timezone
+
+from .context import conversation_history
+from .models import Conversation, Message
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PERSISTENCE_SETTINGS = {
+    'MODE': 'sync',               # 'sync' or 'write_behind'
+    'QUEUE_SIZE': 10000,          # turns, not messages
+    'BATCH_SIZE': 500,
+    'FLUSH_INTERVAL': 0.05,
+    'PUT_TIMEOUT': 1.0,
+}
+
+
+class SessionCache:
+    """LRU map of session_id -> (conversation id, user_language) for hot sessions"""
+
+    def __init__(self, max_sessions=10000):
+        self.max_sessions = max_sessions
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, session_id):
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is not None:
+                self._sessions.move_to_end(session_id)
+            return entry
+
+    def set(self, session_id, conversation_id, language):
+        with self._lock:
+            self._sessions[session_id] = (conversation_id, language)
+            self._sessions.move_to_end(session_id)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+
+    def discard(self, session_id):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._sessions.clear()
+
+
+class ChatTurnStore:
+    """Persists a user/assistant exchange with as few round-trips as possible.
+
+    A hot session costs one INSERT for both messages (plus a single-column
+    UPDATE when the language changed), all inside one transaction. Only cold
+    sessions pay for the conversation lookup.
+    """
+
+    def __init__(self, session_cache=None, history=None):
+        self.sessions = session_cache or SessionCache()
+        # Conversation context buffers are kept current from here (see context.py)
+        self.history = history
+
+    def resolve_conversation(self, session_id, language, update_language=True):
+        """Return the conversation id for a session, creating the conversation if needed"""
+        conversation_id, current_language = self._lookup(session_id, language)
+        if update_language and current_language != language:
+            self._set_language(conversation_id, language)
+            current_language = language
+        self.sessions.set(session_id, conversation_id, current_language)
+        return conversation_id
+
+    def _lookup(self, session_id, language):
+        cached = self.sessions.get(session_id)
+        if cached is not None:
+            return cached
+        conversation, created = Conversation.objects.only('id', 'user_language').get_or_create(
+            session_id=session_id,
+            defaults={'user_language': language}
+        )
+        return conversation.id, conversation.user_language
+
+    def _set_language(self, conversation_id, language):
+        Conversation.objects.filter(pk=conversation_id).update(
+            user_language=language,
+            updated_at=timezone.now()
+        )
+
+    def build_messages(self, conversation_id, user_content, ai_content, intent='', confidence=0.0):
+        return [
+            Message(
+                conversation_id=conversation_id,
+                content=user_content,
+                is_user=True,
+                intent=intent,
+                confidence=confidence
+            ),
+            Message(
+                conversation_id=conversation_id,
+                content=ai_content,
+                is_user=False
+            ),
+        ]
+
+    def save_turn(self, session_id, language, user_content, ai_content, update_language=True, **user_fields):
+        """Write both messages of a turn; returns ``(user_msg, ai_msg)``"""
+        try:
+            return self._save_turn(session_id, language, user_content, ai_content, update_language, **user_fields)
+        except IntegrityError:
+            # The cached conversation was deleted underneath us; look it up again
+            logger.warning(f"Conversation for session {session_id} vanished, retrying without cache")
+            self.sessions.discard(session_id)
+            return self._save_turn(session_id, language, user_content, ai_content, update_language, **user_fields)
+
+    def _save_turn(self, session_id, language, user_content, ai_content, update_language, **user_fields):
+        # The lookup stays outside the transaction: on SQLite a transaction that
+        # reads before it writes cannot wait for the write lock and fails with
+        # "database is locked" at once, whatever busy_timeout says
+        conversation_id, current_language = self._lookup(session_id, language)
+        # savepoint=False: a failure rolls back the enclosing transaction instead
+        # of paying for SAVEPOINT/RELEASE round-trips on every turn
+        with transaction.atomic(savepoint=False):
+            if update_language and current_language != language:
+                self._set_language(conversation_id, language)
+                current_language = language
+            user_msg, ai_msg = Message.objects.bulk_create(
+                self.build_messages(conversation_id, user_content, ai_content, **user_fields)
+            )
+        self.sessions.set(session_id, conversation_id, current_language)
+        self._remember(session_id, user_content, ai_content)
+        return user_msg, ai_msg
+
+    def save_turns(self, turns):
+        """Write many turns with a single ``bulk_create``; returns ``[(user_msg, ai_msg), ...]``.
+
+        ``turns`` are ``(session_id, language, user_content, ai_content, user_fields)``
+        tuples. Conversations are resolved for all sessions at once, so a batch
+        costs a fixed handful of queries however many sessions it spans.
+        Always synchronous, also under write-behind: the batch already is one INSERT.
+        """
+        try:
+            return self._save_turns(turns)
+        except IntegrityError:
+            logger.warning("A conversation in the batch vanished, retrying without cache")
+            for session_id, *_ in turns:
+                self.sessions.discard(session_id)
+            return self._save_turns(turns)
+
+    def _save_turns(self, turns):
+        # The last language seen for a session wins, as with consecutive save_turn calls
+        languages = {session_id: language for session_id, language, *_ in turns}
+        conversations = self._lookup_many(languages)
+        messages = []
+        for session_id, language, user_content, ai_content, user_fields in turns:
+            messages.extend(self.build_messages(conversations[session_id][0], user_content, ai_content, **user_fields))
+
+        changed = {}
+        for session_id, (conversation_id, current_language) in conversations.items():
+            if current_language != languages[session_id]:
+                changed.setdefault(languages[session_id], []).append(conversation_id)
+        with transaction.atomic(savepoint=False):
+            for language, conversation_ids in changed.items():
+                Conversation.objects.filter(pk__in=conversation_ids).update(
+                    user_language=language,
+                    updated_at=timezone.now()
+                )
+            Message.objects.bulk_create(messages)
+
+        for session_id, (conversation_id, _) in conversations.items():
+            self.sessions.set(session_id, conversation_id, languages[session_id])
+        for session_id, language, user_content, ai_content, _ in turns:
+            self._remember(session_id, user_content, ai_content)
+        return list(zip(messages[::2], messages[1::2]))
+
+    def _lookup_many(self, languages):
+        """``_lookup`` for many sessions: ``{session_id: (conversation id, user_language)}``"""
+        found = {}
+        for session_id in languages:
+            cached = self.sessions.get(session_id)
+            if cached is not None:
+                found[session_id] = cached
+        missing = [session_id for session_id in languages if session_id not in found]
+        if not missing:
+            return found
+
+        def fetch(session_ids):
+            rows = Conversation.objects.filter(session_id__in=session_ids).values_list(
+                'session_id', 'id', 'user_language'
+            )
+            found.update((session_id, (conversation_id, language)) for session_id, conversation_id, language in rows)
+
+        fetch(missing)
+        new = [session_id for session_id in missing if session_id not in found]
+        if new:
+            # Another request may create some of them first; read back the ids that won
+            Conversation.objects.bulk_create(
+                [Conversation(session_id=session_id, user_language=languages[session_id]) for session_id in new],
+                ignore_conflicts=True
+            )
+            fetch(new)
+        return found
+
+    def _remember(self, session_id, user_content, ai_content):
+        if self.history is not None:
+            self.history.append(session_id, user_content, ai_content)
+
+    def stats(self):
+        return {'mode': 'sync'}
+
+
+class WriteBehindChatStore(ChatTurnStore):
+    """Queues chat turns and lets a background thread insert them in batches.
+
+    The request only resolves the conversation (free for hot sessions) and
+    enqueues the two unsaved messages, so it no longer waits for the INSERT
+    and its fsync. The writer collects up to ``batch_size`` turns, waiting at
+    most ``flush_interval`` seconds after the first one, and writes them with
+    a single ``bulk_create``.
+
+    The queue is bounded: when it is full the request blocks for up to
+    ``put_timeout`` seconds and then writes its own turn synchronously, so
+    turns are never dropped and a slow database slows callers down instead
+    of growing memory. Pending turns are drained at interpreter exit.
+
+    Returned messages have no primary key; it is only assigned once written.
+    """
+
+    def __init__(self, session_cache=None, history=None, queue_size=10000, batch_size=500, flush_interval=0.05,
+                 put_timeout=1.0):
+        super().__init__(session_cache, history)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.queued = 0
+        self.written = 0
+        self.synchronous = 0
+        self.failed = 0
+        self._stats_lock = threading.Lock()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def save_turn(self, session_id, language, user_content, ai_content, update_language=True, **user_fields):
+        conversation_id = self.resolve_conversation(session_id, language, update_language)
+        messages = self.build_messages(conversation_id, user_content, ai_content, **user_fields)
+        self.start()
+        try:
+            self.queue.put(messages, timeout=self.put_timeout)
+        except queue.Full:
+            logger.warning("Write-behind queue is full, writing chat turn synchronously")
+            self._count('synchronous')
+            self.write_batch([messages])
+        else:
+            self._count('queued')
+        self._remember(session_id, user_content, ai_content)
+        return tuple(messages)
+
+    def start(self):
+        """Start the writer thread once per process"""
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='chat-write-behind', daemon=True)
+                self._thread.start()
+                atexit.register(self.stop)
+
+    def stop(self, timeout=10):
+        """Flush everything still queued and stop the writer"""
+        thread = self._thread
+        if thread is None:
+            return
+        self.queue.put(None)
+        thread.join(timeout)
+        self._thread = None
+
+    def flush(self):
+        """Block until every queued turn has been written"""
+        self.queue.join()
+
+    def _run(self):
+        running = True
+        while running:
+            batch, running = self._collect()
+            if batch:
+                self.write_batch(batch)
+                close_old_connections()
+            for _ in range(len(batch) + (not running)):
+                self.queue.task_done()
+        connection.close()
+
+    def _collect(self):
+        """Return ``(batch, keep_running)``; blocks until at least one item arrives"""
+        item = self.queue.get()
+        if item is None:
+            return [], False
+        batch = [item]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self.queue.get(timeout=remaining) if remaining > 0 else self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                # Shutdown: write what we have, then drain the rest
+                return batch + self._drain(), False
+            batch.append(item)
+        return batch, True
+
+    def _drain(self):
+        items = []
+        while True:
+            try:
+                item = self.queue.get_nowait()
+            except queue.Empty:
+                return items
+            if item is not None:
+                items.append(item)
+            else:
+                self.queue.task_done()
+
+    def write_batch(self, batch):
+        """Insert a batch of turns; falls back to one turn at a time on failure"""
+        try:
+            with transaction.atomic():
+                Message.objects.bulk_create([message for turn in batch for message in turn])
+            self._count('written', len(batch))
+            return
+        except Exception as e:
+            if len(batch) == 1:
+                self._count('failed')
+                logger.error(f"💥 Dropping chat turn that could not be written: {e}")
+                return
+            logger.warning(f"Batch insert of {len(batch)} chat turns failed ({e}), retrying one by one")
+
+        for turn in batch:
+            for message in turn:
+                message.pk = None   # may have been assigned by the rolled back insert
+            self.write_batch([turn])
+
+    def _count(self, counter, amount=1):
+        with self._stats_lock:
+            setattr(self, counter, getattr(self, counter) + amount)
+
+    def stats(self):
+        return {
+            'mode': 'write_behind',
+            'pending': self.queue.qsize(),
+            'queued': self.queued,
+            'written': self.written,
+            'synchronous': self.synchronous,
+            'failed': self.failed,
+        }
+
+
+def build_chat_store():
+    """Create the chat store selected by ``settings.CHAT_PERSISTENCE``"""
+    options = {**DEFAULT_PERSISTENCE_SETTINGS, **getattr(settings, 'CHAT_PERSISTENCE', {})}
+    if options['MODE'] == 'write_behind':
+        return WriteBehindChatStore(
+            history=conversation_history,
+            queue_size=options['QUEUE_SIZE'],
+            batch_size=options['BATCH_SIZE'],
+            flush_interval=options['FLUSH_INTERVAL'],
+            put_timeout=options['PUT_TIMEOUT'],
+        )
+    return ChatTurnStore(history=conversation_history)
+
+
+chat_store = build_chat_store()
@@ -21,4 +21,16 @@ class ChatRequestSerializer(serializers.Serializer):
 class VoiceChatRequestSerializer(serializers.Serializer):
     session_id = serializers.CharField(required=False, default='default')
     language = serializers.ChoiceField(choices=Conversation.LANGUAGES, default='en')
-    text = serializers.CharField(required=False)
\ No newline at end of file
+    text = serializers.CharField(required=False)
+    # Also return the answer as audio (``audio_url``) when server-side speech output is configured
+    speak = serializers.BooleanField(required=False, default=False)
+
+class ChatBatchRequestSerializer(serializers.Serializer):
+    # Items are validated one by one with ChatRequestSerializer so a bad item only fails itself
+    items = serializers.ListField(child=serializers.DictField(), allow_empty=False)
+
+    def validate_items(self, items):
+        max_items = self.context.get('max_items')
+        if max_items and len(items) > max_items:
+            raise serializers.ValidationError(f"At most {max_items} items per batch.")
+        return items
@@ -0,0 +1,234 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+from ..context import history_messages
+from .intent import keyword_classifier
+from .prompts import prompt_registry
+from .resilience import DEGRADED_SOURCES, current_provider
+from .text import normalize_text
+
+DEFAULT_CACHE_SETTINGS = {
+    'ENABLED': True,
+    'BACKEND': 'memory',          # 'memory' or 'django'
+    'CACHE_ALIAS': 'default',     # used by the 'django' backend
+    'TTL': 3600,
+    'MAX_ENTRIES': 2048,          # used by the 'memory' backend
+    'EXCLUDE_INTENTS': (),
+    'KEY_PREFIX': 'ai-response:v1',
+}
+
+
+class MemoryCacheBackend:
+    """In-process TTL + LRU store. Safe to share between request threads."""
+
+    def __init__(self, max_entries=2048):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    async def aget(self, key):
+        return self.get(key)
+
+    async def aset(self, key, value, ttl):
+        self.set(key, value, ttl)
+
+
+class DjangoCacheBackend:
+    """Delegates to a configured Django cache (LocMem, Memcached, Redis...).
+
+    Eviction is left to the backend itself, e.g. LocMemCache ``MAX_ENTRIES``
+    or Redis ``maxmemory-policy allkeys-lru``.
+    """
+
+    def __init__(self, alias='default'):
+        from django.core.cache import caches
+        self.cache = caches[alias]
+
+    def get(self, key):
+        return self.cache.get(key)
+
+    def set(self, key, value, ttl):
+        self.cache.set(key, value, ttl)
+
+    def clear(self):
+        self.cache.clear()
+
+    async def aget(self, key):
+        return await self.cache.aget(key)
+
+    async def aset(self, key, value, ttl):
+        await self.cache.aset(key, value, ttl)
+
+
+class ResponseCache:
+    """Caches provider answers keyed on (language, normalized message).
+
+    Only a session's first message is cached: later ones are sent to the
+    provider with the session's history, so their answers are not reusable.
+    """
+
+    def __init__(self, backend, ttl=3600, exclude_intents=(), key_prefix='ai-response:v1', classifier=keyword_classifier):
+        self.backend = backend
+        self.ttl = ttl
+        self.exclude_intents = frozenset(exclude_intents)
+        self.key_prefix = key_prefix
+        self.classifier = classifier
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self._stats_lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls):
+        options = {**DEFAULT_CACHE_SETTINGS, **getattr(settings, 'AI_RESPONSE_CACHE', {})}
+        if not options['ENABLED']:
+            return None
+        if options['BACKEND'] == 'django':
+            backend = DjangoCacheBackend(options['CACHE_ALIAS'])
+        else:
+            backend = MemoryCacheBackend(options['MAX_ENTRIES'])
+        return cls(
+            backend,
+            ttl=options['TTL'],
+            exclude_intents=options['EXCLUDE_INTENTS'],
+            key_prefix=options['KEY_PREFIX'],
+        )
+
+    def make_key(self, message, language):
+        """Return the cache key, or None when the message's intent opts out or it has history"""
+        if self.exclude_intents and self.classifier.classify(message).intent in self.exclude_intents:
+            self._count('bypassed')
+            return None
+        if history_messages():
+            # A follow-up is answered from its own session's earlier turns; never share that answer
+            self._count('bypassed')
+            return None
+        normalized = normalize_text(message)
+        # Hash so arbitrary user text is always a valid memcached/redis key
+        digest = hashlib.sha1(f"{language}\x00{normalized}".encode()).hexdigest()
+        # The prompt version retires every cached answer when the facts change
+        return f"{self.key_prefix}:{prompt_registry.version}:{language}:{digest}"
+
+    def get(self, key):
+        value = self.backend.get(key)
+        self._count('hits' if value is not None else 'misses')
+        return value
+
+    def set(self, key, value):
+        self.backend.set(key, value, self.ttl)
+
+    async def aget(self, key):
+        value = await self.backend.aget(key)
+        self._count('hits' if value is not None else 'misses')
+        return value
+
+    async def aset(self, key, value):
+        await self.backend.aset(key, value, self.ttl)
+
+    def _count(self, counter):
+        with self._stats_lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'bypassed': self.bypassed,
+            'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+class CachedAIService:
+    """Wraps an AI service and answers repeated questions from the cache.
+
+    Exposes the same interface as the wrapped service; anything not handled
+    here (classify, get_fallback_response, ...) is delegated to it.
+    """
+
+    def __init__(self, service, cache):
+        self.service = service
+        self.cache = cache
+
+    def __getattr__(self, name):
+        return getattr(self.service, name)
+
+    def _cacheable(self, response, language):
+        # Never pin a provider outage answer (fallback text or a degraded KB match) in the cache
+        if current_provider.get() in DEGRADED_SOURCES:
+            return False
+        get_fallback = getattr(self.service, 'get_fallback_response', None)
+        return bool(response) and (get_fallback is None or response != get_fallback(language))
+
+    def generate_response(self, message, language='en'):
+        key = self.cache.make_key(message, language)
+        if key is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                current_provider.set('cache')
+                return cached
+
+        response = self.service.generate_response(message, language)
+        if key is not None and self._cacheable(response, language):
+            self.cache.set(key, response)
+        return response
+
+    async def agenerate_response(self, message, language='en'):
+        key = self.cache.make_key(message, language)
+        if key is not None:
+            cached = await self.cache.aget(key)
+            if cached is not None:
+                current_provider.set('cache')
+                return cached
+
+        response = await self.service.agenerate_response(message, language)
+        if key is not None and self._cacheable(response, language):
+            await self.cache.aset(key, response)
+        return response
+
+    def stream_response(self, message, language='en'):
+        key = self.cache.make_key(message, language)
+        if key is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                current_provider.set('cache')
+                yield cached
+                return
+
+        chunks = []
+        for chunk in self.service.stream_response(message, language):
+            chunks.append(chunk)
+            yield chunk
+        response = ''.join(chunks)
+        if key is not None and self._cacheable(response, language):
+            self.cache.set(key, response)
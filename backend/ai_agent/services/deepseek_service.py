@@ -1,138 +1,89 @@
+import asyncio
+import json
+import aiohttp
 import requests
 import logging
 from django.conf import settings
 
+from ..metrics import instrument_provider
+from .http_client import apost_with_retries, get_async_session, get_session, post_with_retries
+from .prompts import PromptMixin
+from .resilience import remaining_time
+
 logger = logging.getLogger(__name__)
 
-class DeepSeekAIService:
+class DeepSeekAIService(PromptMixin):
+    name = 'deepseek'
+    
     def __init__(self):
         self.api_key = settings.DEEPSEEK_API_KEY
-        self.base_url = "https://api.deepseek.com/v1/chat/completions"
+        self.base_url = getattr(settings, 'DEEPSEEK_BASE_URL', "https://api.deepseek.com/v1/chat/completions")
+        # Listing models is free, unlike a completion
+        self.health_url = getattr(settings, 'DEEPSEEK_HEALTH_URL', None) or (
+            self.base_url.rsplit('/chat/completions', 1)[0] + '/models'
+        )
         self.supported_languages = ['en', 'fa', 'ps']
         
         if not self.api_key:
             logger.error("DeepSeek API key is not configured")
             raise ValueError("DeepSeek API key is required")
         
+        self.timeout = (
+            getattr(settings, 'DEEPSEEK_CONNECT_TIMEOUT', 3.05),
+            getattr(settings, 'DEEPSEEK_READ_TIMEOUT', 30),
+        )
+        self.max_retries = getattr(settings, 'DEEPSEEK_MAX_RETRIES', 2)
+        self.backoff_factor = getattr(settings, 'DEEPSEEK_BACKOFF_FACTOR', 0.5)
+        self.headers = {
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {self.api_key}"
+        }
+        # One keep-alive session per worker process, shared by every instance;
+        # completions are retried by post_with_retries, which keeps to the deadline
+        self.session = get_session(
+            'deepseek',
+            headers=self.headers,
+            pool_size=getattr(settings, 'DEEPSEEK_POOL_SIZE', 10),
+            max_retries=0,
+        )
+        
         logger.info("DeepSeekAIService initialized successfully")
     
-    def get_system_prompt(self, language):
-        prompts = {
-            'en': """You are a helpful AI customer support agent for Afghan Connect, Afghanistan's first Connect communications company.
-
-Key Information:
-- First Connect company in Afghanistan (since 2002)
-- Offers HD Voice, Internet, Data, and Mobile Payments
-- Over 6,000 employees, created 100,000+ jobs
-
-Common Telecom Queries and Responses:
-1. Balance Checking: "You can check your balance by dialing *123# or using the MyConnect mobile app. Your current balance will be displayed immediately."
-2. Internet Packages: 
-   - Basic Package: 100 AFN for 1GB (valid for 7 days)
-   - Standard Package: 200 AFN for 3GB (valid for 15 days)
-   - Premium Package: 500 AFN for 10GB (valid for 30 days)
-   - To subscribe: Dial *123*1# and follow the instructions
-3. SIM Registration: "For SIM registration, please visit your nearest Afghan Connect office with your original Tazkira ID card. The process takes about 15-20 minutes."
-4. Network Coverage: "We have extensive coverage in all 34 provinces, with strongest signals in Kabul, Herat, Mazar-i-Sharif, Kandahar, Jalalabad, and Kunduz."
-5. Technical Support: 
-   - No signal: Try restarting your phone, check SIM placement
-   - Internet slow: Check your data balance, try moving to open area
-   - Call issues: Check network coverage in your area
-6. Customer Service: Call 0799000000 or visit Connect.af for 24/7 support
-
-Guidelines:
-- Be concise, helpful and professional
-- Provide specific information from the knowledge above
-- If unsure about something, direct to customer support: 0799000000
-- Always be polite and patient with customers
-- Use simple, clear language that's easy to understand""",
-
-            'fa': """شما یک دستیار هوش مصنوعی پشتیبانی مشتریان برای شرکت افغان اتصال هستید، اولین شرکت ارتباطات بی سیم در افغانستان.
-
-اطلاعات کلیدی:
-- اولین شرکت بی سیم در افغانستان (از سال 2002)
-- ارائه دهنده خدمات صدا HD، اینترنت، دیتا و پرداخت های موبایل
-- بیش از 6,000 کارمند، ایجاد 100,000+ شغل
-
-پرسش های متداول و پاسخ ها:
-1. بررسی بیلانس: "شما می‌توانید با شماره‌گیری *123# یا استفاده از اپلیکیشن MyConnect بیلانس خود را بررسی کنید. بیلانس فعلی شما بلافاصله نمایش داده می‌شود."
-2. بسته های اینترنتی:
-   - بسته پایه: 100 افغانی برای 1 گیگابایت (معتبر برای 7 روز)
-   - بسته استاندارد: 200 افغانی برای 3 گیگابایت (معتبر برای 15 روز)
-   - بسته پریمیوم: 500 افغانی برای 10 گیگابایت (معتبر برای 30 روز)
-   - برای اشتراک: *123*1# را شماره گیری کرده و دستورات را دنبال کنید
-3. ثبت سیم: "برای ثبت سیم کارت، لطفاً به نزدیکترین دفتر افغان اتصال با کارت شناسایی تذکره اصلی مراجعه کنید. این فرآیند حدود 15-20 دقیقه طول می‌کشد."
-4. پوشش شبکه: "ما پوشش گسترده در تمام 34 ولایت داریم، با قویترین سیگنال در کابل، هرات، مزارشریف، قندهار، جلال آباد و کندز."
-5. پشتیبانی فنی:
-   - بدون سیگنال: تلفن خود را restart کنید، قرارگیری سیم را بررسی کنید
-   - اینترنت کند: بیلانس دیتای خود را بررسی کنید، به فضای باز بروید
-   - مشکلات تماس: پوشش شبکه در منطقه خود را بررسی کنید
-6. خدمات مشتریان: با 0799000000 تماس بگیرید یا به Connect.af مراجعه کنید
-
-دستورالعمل ها:
-- مختصر، مفید و حرفه ای باشید
-- اطلاعات خاص از دانش فوق ارائه دهید
-- اگر در مورد چیزی مطمئن نیستید، به پشتیبانی مشتریان ارجاع دهید: 0799000000
-- همیشه با مشتریان مودب و صبور باشید""",
-
-            'ps': """تاسې د افغان اتصال لپاره د مصنوعي ذکاء مرستیال یاست، د افغانستان لومړی بې سيمه اړیکې شرکت.
-
-مهم معلومات:
-- د افغانستان لومړی بې سيمه شرکت (له ۲۰۰۲ راهیسې)
-- د HD غږ، انټرنیټ، ډیټا او موبایل پیسې خدمتونه وړاندې کوي
-- له 6,000 څخه زیات کارکوونکي، 100,000+ دندې رامینځته کړې
-
-عمومي پوښتنې او ځوابونه:
-1. د بیلانس چک: "تاسې کولی شئ د *123# په ډایل کولو یا د MyConnect موبایل اپلیکیشن په کارولو سره خپل بیلانس وګورئ. ستاسې اوسنی بیلانس به فوراً ښکاره شي."
-2. د انټرنیټ پیکیجونه:
-   - اساسي پیکیج: 100 افغانۍ د 1 گیګابایټ لپاره (د 7 ورځو لپاره معتبر)
-   - معیاري پیکیج: 200 افغانۍ د 3 گیګابایټ لپاره (د 15 ورځو لپاره معتبر)
-   - پریمیوم پیکیج: 500 افغانۍ د 10 گیګابایټ لپاره (د 30 ورځو لپاره معتبر)
-   - د ګډون لپاره: *123*1# ډایل کړئ او لارښوونې تعقیب کړئ
-3. د سیم ثبت: "د سیم ثبت لپاره، مهرباني وکړئ د خپل اصلي تذکرې ID کارت سره د افغان اتصال نږدې دفتر ته مراجعه وکړئ. دا پروسه نږدې 15-20 دقیقې وخت نیسي."
-4. د شبکې پوښښ: "موږ په ټولو 34 ولایتونو کې پراخ پوښښ لرو، په کابل، هرات، مزارشریف، قندهار، جلال آباد او کندز کې د قوي سګنالونو سره."
-5. تخنیکي ملاتړ:
-   - سګنال نشته: خپل تلیفون restart کړئ، د سیم ځای په ځای کول وګورئ
-   - انټرنیټ ورو: خپل ډیټا بیلانس وګورئ، یوې خلاصې سیمې ته لاړ شه
-   - د زنګ ستونزې: په خپل سیمه کې د شبکې پوښښ وګورئ
-6. د پیرودونکو خدمت: په 0799000000 کې زنګ ووهئ یا Connect.af ته مراجعه وکړئ
-
-لارښوونې:
-- لنډ، مرستندویه او مسلکي اوسئ
-- د پورتنۍ پوهې څخه مشخص معلومات وړاندې کړئ
-- که تاسو د یو شي په اړه ډاډه نه یاست، د پیرودونکو ملاتړ ته یې ورګرځئ: 0799000000
-- تل په پیرودونکو کې درناوی او صبر وکړئ"""
+    def build_payload(self, message, language, stream=False):
+        return {
+            "model": "deepseek-chat",
+            "messages": self.build_messages(message, language),
+            "temperature": 0.7,
+            "max_tokens": 500,
+            "stream": stream
         }
-        return prompts.get(language, prompts['en'])
     
+    @instrument_provider('deepseek')
     def generate_response(self, message, language='en'):
         try:
-            logger.info(f"DeepSeek generating response for: {message[:50]}... in {language}")
-            
-            system_prompt = self.get_system_prompt(language)
+            logger.info("DeepSeek generating response for: %.50s... in %s", message, language)
             
-            headers = {
-                "Content-Type": "application/json",
-                "Authorization": f"Bearer {self.api_key}"
-            }
+            remaining = remaining_time()
+            if remaining is not None and remaining <= 0:
+                logger.error("DeepSeek request skipped: request deadline already passed")
+                return self.get_fallback_response(language)
             
-            payload = {
-                "model": "deepseek-chat",
-                "messages": [
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": message}
-                ],
-                "temperature": 0.7,
-                "max_tokens": 500,
-                "stream": False
-            }
+            payload = self.build_payload(message, language)
             
-            response = requests.post(self.base_url, headers=headers, json=payload, timeout=30)
+            # Never wait on the upstream past the request's deadline, retries and backoff included
+            response = post_with_retries(
+                self.session,
+                self.base_url,
+                self.timeout,
+                max_retries=self.max_retries,
+                backoff_factor=self.backoff_factor,
+                json=payload,
+            )
             
             if response.status_code == 200:
                 response_data = response.json()
                 ai_response = response_data['choices'][0]['message']['content']
-                logger.info(f"DeepSeek Response: {ai_response[:50]}...")
+                logger.info("DeepSeek Response: %.50s...", ai_response)
                 return ai_response
             else:
                 logger.error(f"DeepSeek API error: {response.status_code} - {response.text}")
@@ -148,10 +99,99 @@ Guidelines:
             logger.error(f"Unexpected error in DeepSeek service: {e}")
             return self.get_fallback_response(language)
     
-    def get_fallback_response(self, language):
-        fallbacks = {
-            'en': "I apologize, but I'm currently experiencing technical difficulties. Please try again in a moment or contact our support team at 0799000000 for immediate assistance.",
-            'fa': "عذر میخواهم، در حال حاضر با مشکلات فنی مواجه هستم. لطفاً چند لحظه دیگر تلاش کنید یا برای دریافت کمک فوری با تیم پشتیبانی ما در 0799000000 تماس بگیرید.",
-            'ps': "بخښنه غواړم، اوس مهال زه تخنیکي ستونزو سره مخ یم. مهرباني وکړئ یو څه وروسته بیا هڅه وکړئ یا د فوري مرستې لپاره زموږ د ملاتړ ټیم سره په 0799000000 کې اړیکه ونیسئ."
-        }
-        return fallbacks.get(language, fallbacks['en'])
\ No newline at end of file
+    @instrument_provider('deepseek')
+    async def agenerate_response(self, message, language='en'):
+        """Non-blocking variant of generate_response for the async views"""
+        try:
+            logger.info("DeepSeek generating async response for: %.50s... in %s", message, language)
+            
+            session = get_async_session(
+                'deepseek',
+                headers=self.headers,
+                pool_size=getattr(settings, 'DEEPSEEK_ASYNC_POOL_SIZE', 1000),
+                connect_timeout=self.timeout[0],
+                read_timeout=self.timeout[1],
+            )
+            remaining = remaining_time()
+            if remaining is not None and remaining <= 0:
+                logger.error("DeepSeek request skipped: request deadline already passed")
+                return self.get_fallback_response(language)
+            
+            # The deadline bounds the whole exchange, retries and backoff included
+            status_code, body = await asyncio.wait_for(apost_with_retries(
+                session,
+                self.base_url,
+                max_retries=self.max_retries,
+                backoff_factor=self.backoff_factor,
+                json=self.build_payload(message, language),
+            ), timeout=remaining)
+            
+            if status_code == 200:
+                ai_response = json.loads(body)['choices'][0]['message']['content']
+                logger.info("DeepSeek Response: %.50s...", ai_response)
+                return ai_response
+            else:
+                logger.error(f"DeepSeek API error: {status_code} - {body}")
+                return self.get_fallback_response(language)
+                
+        except asyncio.TimeoutError:
+            logger.error("DeepSeek API request timed out")
+            return self.get_fallback_response(language)
+        except aiohttp.ClientError as e:
+            logger.error(f"DeepSeek API request failed: {e}")
+            return self.get_fallback_response(language)
+        except Exception as e:
+            logger.error(f"Unexpected error in DeepSeek service: {e}")
+            return self.get_fallback_response(language)
+    
+    @instrument_provider('deepseek')
+    def stream_response(self, message, language='en'):
+        """Yield response text chunks as DeepSeek emits them (SSE, ``stream: true``).
+
+        If the upstream fails before any token was produced the fallback text is
+        yielded instead, so callers always receive a complete answer.
+        """
+        emitted = False
+        try:
+            logger.info("DeepSeek streaming response for: %.50s... in %s", message, language)
+            
+            payload = self.build_payload(message, language, stream=True)
+            
+            with post_with_retries(
+                self.session,
+                self.base_url,
+                self.timeout,
+                max_retries=self.max_retries,
+                backoff_factor=self.backoff_factor,
+                json=payload,
+                stream=True,
+            ) as response:
+                if response.status_code != 200:
+                    logger.error(f"DeepSeek API error: {response.status_code} - {response.text}")
+                else:
+                    for line in response.iter_lines(decode_unicode=False):
+                        if not line.startswith(b'data:'):
+                            continue
+                        data = line[5:].strip()
+                        if data == b'[DONE]':
+                            break
+                        delta = json.loads(data)['choices'][0].get('delta', {})
+                        token = delta.get('content')
+                        if token:
+                            emitted = True
+                            yield token
+                    
+        except requests.exceptions.Timeout:
+            logger.error("DeepSeek API stream timed out")
+        except requests.exceptions.RequestException as e:
+            logger.error(f"DeepSeek API stream failed: {e}")
+        except Exception as e:
+            logger.error(f"Unexpected error in DeepSeek stream: {e}")
+        
+        if not emitted:
+            yield self.get_fallback_response(language)
+    
+    def check_health(self):
+        """Cheap reachability and credentials check used by the health prober"""
+        response = self.session.get(self.health_url, timeout=self.timeout)
+        return response.status_code == 200
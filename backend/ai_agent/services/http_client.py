@@ -0,0 +1,162 @@
+import asyncio
+import os
+import random
+import threading
+import time
+import weakref
+
+import aiohttp
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from .resilience import clamp_timeout, remaining_time
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+# aiohttp sessions are bound to the event loop that created them
+_async_sessions = weakref.WeakKeyDictionary()
+
+
+def build_session(headers=None, pool_size=10, max_retries=2, backoff_factor=0.5, backoff_jitter=0.25):
+    """Create a keep-alive session with a bounded connection pool.
+
+    Retries cover connection errors plus 429/5xx responses with exponential,
+    jittered backoff (``Retry-After`` is honoured when the upstream sends it).
+    POST is retried too since chat completions have no side effects.
+    """
+    retry = Retry(
+        total=max_retries,
+        connect=max_retries,
+        read=0,
+        status=max_retries,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=None,
+        backoff_factor=backoff_factor,
+        backoff_jitter=backoff_jitter,
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry, pool_block=False)
+
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    if headers:
+        session.headers.update(headers)
+    return session
+
+
+def get_session(name, **kwargs):
+    """Return the process-wide session registered under ``name``.
+
+    Sessions are keyed by PID as well, so a worker forked from a preloaded
+    master never shares the parent's sockets.
+    """
+    key = (name, os.getpid())
+    session = _sessions.get(key)
+    if session is None:
+        with _sessions_lock:
+            session = _sessions.get(key)
+            if session is None:
+                session = _sessions[key] = build_session(**kwargs)
+    return session
+
+
+def close_sessions():
+    with _sessions_lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
+
+
+def get_async_session(name, headers=None, pool_size=1000, connect_timeout=3.05, read_timeout=30):
+    """Return the aiohttp session registered under ``name`` for the running loop.
+
+    A single uvicorn worker runs one loop, so this is effectively one pooled
+    client per worker, sized for thousands of concurrent slow upstream calls.
+    """
+    loop = asyncio.get_running_loop()
+    sessions = _async_sessions.setdefault(loop, {})
+    session = sessions.get(name)
+    if session is None or session.closed:
+        session = sessions[name] = aiohttp.ClientSession(
+            headers=headers,
+            connector=aiohttp.TCPConnector(limit=pool_size, keepalive_timeout=30),
+            timeout=aiohttp.ClientTimeout(sock_connect=connect_timeout, sock_read=read_timeout),
+        )
+    return session
+
+
+async def close_async_sessions():
+    """Close the sessions owned by the running loop (call before the loop shuts down)"""
+    sessions = _async_sessions.pop(asyncio.get_running_loop(), {})
+    for session in sessions.values():
+        await session.close()
+
+
+def retry_delay(attempt, backoff_factor, backoff_jitter, retry_after=None):
+    if retry_after is not None:
+        try:
+            return max(float(retry_after), 0.0)
+        except ValueError:
+            pass
+    return backoff_factor * (2 ** attempt) + random.uniform(0, backoff_jitter)
+
+
+def post_with_retries(session, url, timeout, max_retries=2, backoff_factor=0.5, backoff_jitter=0.25, **kwargs):
+    """Retry 429/5xx and connect errors by hand, within the request deadline.
+
+    The session's own ``Retry`` cannot see the deadline: it sleeps out any
+    ``Retry-After`` and reuses the first attempt's timeout. Here every attempt
+    gets its timeout clamped to the time left, and a retry whose wait would
+    run past the deadline is not made; the last response (or connection
+    error) is returned instead. Use with a session built with ``max_retries=0``.
+    """
+    attempt = 0
+    while True:
+        response = error = retry_after = None
+        try:
+            response = session.post(url, timeout=clamp_timeout(timeout), **kwargs)
+            if response.status_code not in RETRY_STATUSES or attempt >= max_retries:
+                return response
+            retry_after = response.headers.get('Retry-After')
+        except requests.exceptions.ConnectionError as e:
+            if attempt >= max_retries:
+                raise
+            error = e
+        delay = retry_delay(attempt, backoff_factor, backoff_jitter, retry_after)
+        remaining = remaining_time()
+        if remaining is not None and delay >= remaining:
+            if error is not None:
+                raise error
+            return response
+        if response is not None:
+            response.close()
+        time.sleep(delay)
+        attempt += 1
+
+
+async def apost_with_retries(session, url, max_retries=2, backoff_factor=0.5, backoff_jitter=0.25, **kwargs):
+    """Async counterpart of the session retry policy: retry 429/5xx and connect errors.
+
+    Returns ``(status, body_text)`` since aiohttp bodies must be read before the
+    connection goes back to the pool.
+    """
+    attempt = 0
+    while True:
+        retry_after = None
+        try:
+            async with session.post(url, **kwargs) as response:
+                body = await response.text()
+                if response.status not in RETRY_STATUSES or attempt >= max_retries:
+                    return response.status, body
+                retry_after = response.headers.get('Retry-After')
+        except aiohttp.ClientConnectionError:
+            if attempt >= max_retries:
+                raise
+        await asyncio.sleep(retry_delay(attempt, backoff_factor, backoff_jitter, retry_after))
+        attempt += 1
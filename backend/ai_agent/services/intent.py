@@ -0,0 +1,57 @@
+import re
+from collections import namedtuple
+
+# Intents in priority order: when a message contains keywords from several
+# intents, the one listed first wins (same behaviour as the old if/elif chain).
+INTENT_KEYWORDS = (
+    ('greeting', ('hello', 'hi', 'سلام', 'څنګه', 'greet')),
+    ('balance', ('balance', 'بیلانس', 'credit')),
+    ('package', ('package', 'internet', 'data', 'بسته', 'انټرنیټ', 'پیکیج', 'باندل')),
+    ('coverage', ('coverage', 'signal', 'network', 'پوشش', 'شبکه', 'پوښښ', 'سګنال')),
+    ('sim', ('sim', 'registration', 'سیم', 'ثبت', 'register')),
+    ('technical', ('technical', 'support', 'problem', 'issue', 'فنی', 'پشتیبانی', 'تخنیکي', 'ملاتړ', 'ستونزې')),
+)
+
+DEFAULT_INTENT = 'default'
+
+IntentMatch = namedtuple('IntentMatch', ['intent', 'confidence'])
+
+
+class KeywordIntentClassifier:
+    """Classifies a message against all intent keywords in a single regex pass.
+
+    Every keyword is compiled once into one plain alternation (longest first),
+    so a single ``findall`` replaces the chain of per-intent substring scans.
+    Keywords never contain one another across intents, so the result matches
+    the old checks; only keywords that overlap at a word boundary are counted
+    once instead of twice.
+    """
+
+    def __init__(self, keywords=INTENT_KEYWORDS):
+        self.intents = tuple(intent for intent, _ in keywords)
+        self._priority = {intent: index for index, (intent, _) in enumerate(keywords)}
+
+        self._keyword_intent = {}
+        for intent, words in keywords:
+            for word in words:
+                self._keyword_intent.setdefault(word, intent)
+
+        words = sorted(self._keyword_intent, key=len, reverse=True)
+        self._pattern = re.compile('|'.join(re.escape(word) for word in words))
+
+    def classify(self, message):
+        hits = {}
+        for word in self._pattern.findall(message.lower()):
+            intent = self._keyword_intent[word]
+            hits[intent] = hits.get(intent, 0) + 1
+
+        if not hits:
+            return IntentMatch(DEFAULT_INTENT, 0.0)
+
+        intent = min(hits, key=self._priority.__getitem__)
+        confidence = hits[intent] / sum(hits.values())
+        return IntentMatch(intent, round(confidence, 4))
+
+
+# Shared, stateless instance; the compiled pattern is safe to use across threads
+keyword_classifier = KeywordIntentClassifier()
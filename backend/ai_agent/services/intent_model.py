@@ -0,0 +1,205 @@
+"""Local intent model: nearest centroid over hashed character n-grams.
+
+Messages are turned into sparse vectors of character n-grams (the same ones
+the knowledge base retrieval uses) hashed into ``n_features`` buckets, so
+there is no vocabulary to keep and Dari/Pashto spelling variants still
+overlap. Training averages the unit vectors of each intent's examples into
+one centroid; a message gets the intent of the most similar centroid. The
+centroids are a small dense ``(intents, n_features)`` NumPy matrix, so a
+prediction is a gather and a few hundred multiply-adds.
+
+Examples come from the ``TelecomKnowledgeBase`` questions (labelled by
+category) plus the keywords of ``INTENT_KEYWORDS``, which also cover the
+greeting intent the knowledge base has no entries for.
+"""
+import logging
+import os
+import threading
+import zlib
+
+import numpy as np
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from .intent import DEFAULT_INTENT, INTENT_KEYWORDS, IntentMatch
+from .retrieval import QUESTION_FIELDS
+from .text import normalize_text
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INTENT_MODEL_SETTINGS = {
+    'MODEL_FILE': os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'intent_model.npz'),
+    'N_FEATURES': 2 ** 14,
+    'MIN_SIMILARITY': 0.1,    # below this the message gets the default intent
+}
+
+# Knowledge base categories that are named differently from the intents
+CATEGORY_INTENTS = {'packages': 'package'}
+
+
+def hashed_ngrams(message, n_features, min_n=2, max_n=4):
+    """``(columns, weights)``: the message's unit-length n-gram vector in sparse form.
+
+    The n-grams are those of ``retrieval.char_ngrams``, hashed straight from
+    a list instead of being counted in a ``Counter`` first.
+    """
+    crc32 = zlib.crc32    # rather than hash(): str hashes change with every process
+    hashes = [
+        crc32(padded[start:start + n].encode('utf-8'))
+        for padded in (f' {word} ' for word in normalize_text(message).split())
+        for n in range(min_n, max_n + 1)
+        for start in range(len(padded) - n + 1)
+    ]
+    columns, counts = np.unique(np.array(hashes, dtype=np.int64) % n_features, return_counts=True)
+    weights = 1 + np.log(counts.astype(np.float32))
+    if len(weights):
+        weights /= np.linalg.norm(weights)
+    return columns, weights
+
+
+def training_examples(entries):
+    """``(text, intent)`` pairs from knowledge base entries and the intent keywords"""
+    for entry in entries:
+        intent = CATEGORY_INTENTS.get(entry.category, entry.category)
+        for field in QUESTION_FIELDS:
+            text = getattr(entry, field)
+            if text:
+                yield text, intent
+    for intent, words in INTENT_KEYWORDS:
+        for word in words:
+            yield word, intent
+
+
+class NgramIntentClassifier:
+    """Nearest-centroid intent classifier; a drop-in for ``KeywordIntentClassifier``.
+
+    ``confidence`` is the softmax probability of the winning intent over the
+    cosine similarities, sharpened by ``temperature``. Immutable once built,
+    so one instance is shared by all threads.
+    """
+
+    def __init__(self, intents, centroids, min_similarity=0.1, temperature=0.05, min_n=2, max_n=4):
+        self.intents = tuple(intents)
+        self.centroids = np.ascontiguousarray(centroids, dtype=np.float32)
+        self.n_features = self.centroids.shape[1]
+        self.min_similarity = min_similarity
+        self.temperature = temperature
+        self.min_n = min_n
+        self.max_n = max_n
+
+    @classmethod
+    def fit(cls, examples, n_features=2 ** 14, **kwargs):
+        """Train from ``(text, intent)`` pairs"""
+        intents, sums = [], []
+        for text, intent in examples:
+            columns, weights = hashed_ngrams(text, n_features, kwargs.get('min_n', 2), kwargs.get('max_n', 4))
+            if not len(columns):
+                continue
+            if intent not in intents:
+                intents.append(intent)
+                sums.append(np.zeros(n_features, dtype=np.float32))
+            np.add.at(sums[intents.index(intent)], columns, weights)
+        if not intents:
+            raise ValueError("No training examples")
+        centroids = np.vstack(sums)
+        centroids /= np.linalg.norm(centroids, axis=1, keepdims=True)
+        return cls(intents, centroids, **kwargs)
+
+    def save(self, path):
+        # Write next to the target and rename, so a running process never reads half a file
+        partial = f'{path}.partial.npz'
+        np.savez_compressed(
+            partial,
+            intents=np.array(self.intents),
+            centroids=self.centroids,
+            params=np.array([self.min_similarity, self.temperature, self.min_n, self.max_n], dtype=np.float64),
+        )
+        os.replace(partial, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as model:
+            min_similarity, temperature, min_n, max_n = model['params'].tolist()
+            return cls(
+                model['intents'].tolist(), model['centroids'], min_similarity, temperature, int(min_n), int(max_n)
+            )
+
+    def classify(self, message):
+        columns, weights = hashed_ngrams(message, self.n_features, self.min_n, self.max_n)
+        if not len(columns):
+            return IntentMatch(DEFAULT_INTENT, 0.0)
+        return self._matches((self.centroids[:, columns] @ weights)[None, :])[0]
+
+    def classify_batch(self, messages):
+        """``IntentMatch`` for every message, scored in one vectorized pass"""
+        vectors = [hashed_ngrams(message, self.n_features, self.min_n, self.max_n) for message in messages]
+        lengths = np.fromiter((len(columns) for columns, _ in vectors), dtype=np.int64, count=len(vectors))
+        scores = np.zeros((len(messages), len(self.intents)), dtype=np.float32)
+        present = lengths > 0
+        if present.any():
+            columns = np.concatenate([columns for columns, _ in vectors])
+            weights = np.concatenate([weights for _, weights in vectors])
+            # Per message, sum the centroid columns of its n-grams times their weights
+            starts = np.cumsum(lengths) - lengths
+            scores[present] = np.add.reduceat(self.centroids[:, columns] * weights, starts[present], axis=1).T
+        matches = self._matches(scores)
+        return [match if length else IntentMatch(DEFAULT_INTENT, 0.0) for match, length in zip(matches, lengths)]
+
+    def _matches(self, scores):
+        best = scores.argmax(axis=1)
+        similarity = scores[np.arange(len(scores)), best]
+        confidence = 1.0 / np.exp((scores - similarity[:, None]) / self.temperature).sum(axis=1)
+        return [
+            IntentMatch(self.intents[index], round(probability, 4)) if score >= self.min_similarity
+            else IntentMatch(DEFAULT_INTENT, 0.0)
+            for index, score, probability in zip(best.tolist(), similarity.tolist(), confidence.tolist())
+        ]
+
+
+_classifier = None
+_classifier_lock = threading.Lock()
+
+
+def train_intent_classifier(entries=None, **kwargs):
+    """Fit a classifier on ``entries`` (default: the whole knowledge base)"""
+    options = {**DEFAULT_INTENT_MODEL_SETTINGS, **getattr(settings, 'INTENT_CLASSIFIER', {})}
+    if entries is None:
+        from ..models import TelecomKnowledgeBase
+        entries = TelecomKnowledgeBase.objects.all()
+    kwargs.setdefault('n_features', options['N_FEATURES'])
+    kwargs.setdefault('min_similarity', options['MIN_SIMILARITY'])
+    return NgramIntentClassifier.fit(training_examples(entries), **kwargs)
+
+
+def get_intent_classifier():
+    """The shared classifier: the saved model when there is one, else trained from the database on first use"""
+    global _classifier
+    if _classifier is None:
+        with _classifier_lock:
+            if _classifier is None:
+                options = {**DEFAULT_INTENT_MODEL_SETTINGS, **getattr(settings, 'INTENT_CLASSIFIER', {})}
+                if os.path.exists(options['MODEL_FILE']):
+                    _classifier = NgramIntentClassifier.load(options['MODEL_FILE'])
+                    logger.info(f"🏷️ Intent model loaded from {options['MODEL_FILE']}")
+                else:
+                    _classifier = train_intent_classifier()
+                    logger.info("🏷️ Intent model trained from the knowledge base")
+    return _classifier
+
+
+def set_intent_classifier(classifier):
+    """Replace the shared classifier, e.g. after retraining; None reloads on next use"""
+    global _classifier
+    with _classifier_lock:
+        _classifier = classifier
+
+
+def classify_intent(message):
+    return get_intent_classifier().classify(message)
+
+
+async def aclassify_intent(message):
+    # Only the very first call may need the database
+    if _classifier is None:
+        await sync_to_async(get_intent_classifier)()
+    return classify_intent(message)
@@ -0,0 +1,259 @@
+"""System prompts and fallback answers shared by the LLM-backed providers.
+
+The templates hold the wording; prices, codes and phone numbers come from one
+facts file (``settings.PROMPT_REGISTRY['FACTS_FILE']``) that the mock
+service's canned answers are rendered from as well. ``PromptRegistry``
+renders every language once and hands out the same string objects on every
+request, so the system prompt is a byte-identical prefix that upstream
+prompt caches can hit. Its ``version`` is a hash of the rendered text and
+changes only when the facts or templates do.
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from string import Template
+
+from django.conf import settings
+
+from ..context import history_messages
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PROMPT_SETTINGS = {
+    'FACTS_FILE': os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'telecom_facts.json'),
+    'CHECK_INTERVAL': 30,     # seconds between checks of the facts file for changes; 0 disables
+}
+
+SYSTEM_PROMPT_TEMPLATES = {
+    'en': """You are a helpful AI customer support agent for Afghan Connect, Afghanistan's first Connect communications company.
+
+Key Information:
+- First Connect company in Afghanistan (since $founded)
+- Offers HD Voice, Internet, Data, and Mobile Payments
+- Over $employees employees, created $jobs+ jobs
+
+Common Telecom Queries and Responses:
+1. Balance Checking: "You can check your balance by dialing $balance_code or using the $app_name mobile app. Your current balance will be displayed immediately."
+2. Internet Packages: 
+$packages
+   - To subscribe: Dial $subscribe_code and follow the instructions
+3. SIM Registration: "For SIM registration, please visit your nearest Afghan Connect office with your original Tazkira ID card. The process takes about 15-20 minutes."
+4. Network Coverage: "We have extensive coverage in all 34 provinces, with strongest signals in Kabul, Herat, Mazar-i-Sharif, Kandahar, Jalalabad, and Kunduz."
+5. Technical Support: 
+   - No signal: Try restarting your phone, check SIM placement
+   - Internet slow: Check your data balance, try moving to open area
+   - Call issues: Check network coverage in your area
+6. Customer Service: Call $support_phone or visit $website for 24/7 support
+
+Guidelines:
+- Be concise, helpful and professional
+- Provide specific information from the knowledge above
+- If unsure about something, direct to customer support: $support_phone
+- Always be polite and patient with customers
+- Use simple, clear language that's easy to understand""",
+
+    'fa': """شما یک دستیار هوش مصنوعی پشتیبانی مشتریان برای شرکت افغان اتصال هستید، اولین شرکت ارتباطات بی سیم در افغانستان.
+
+اطلاعات کلیدی:
+- اولین شرکت بی سیم در افغانستان (از سال $founded)
+- ارائه دهنده خدمات صدا HD، اینترنت، دیتا و پرداخت های موبایل
+- بیش از $employees کارمند، ایجاد $jobs+ شغل
+
+پرسش های متداول و پاسخ ها:
+1. بررسی بیلانس: "شما می‌توانید با شماره‌گیری $balance_code یا استفاده از اپلیکیشن $app_name بیلانس خود را بررسی کنید. بیلانس فعلی شما بلافاصله نمایش داده می‌شود."
+2. بسته های اینترنتی:
+$packages
+   - برای اشتراک: $subscribe_code را شماره گیری کرده و دستورات را دنبال کنید
+3. ثبت سیم: "برای ثبت سیم کارت، لطفاً به نزدیکترین دفتر افغان اتصال با کارت شناسایی تذکره اصلی مراجعه کنید. این فرآیند حدود 15-20 دقیقه طول می‌کشد."
+4. پوشش شبکه: "ما پوشش گسترده در تمام 34 ولایت داریم، با قویترین سیگنال در کابل، هرات، مزارشریف، قندهار، جلال آباد و کندز."
+5. پشتیبانی فنی:
+   - بدون سیگنال: تلفن خود را restart کنید، قرارگیری سیم را بررسی کنید
+   - اینترنت کند: بیلانس دیتای خود را بررسی کنید، به فضای باز بروید
+   - مشکلات تماس: پوشش شبکه در منطقه خود را بررسی کنید
+6. خدمات مشتریان: با $support_phone تماس بگیرید یا به $website مراجعه کنید
+
+دستورالعمل ها:
+- مختصر، مفید و حرفه ای باشید
+- اطلاعات خاص از دانش فوق ارائه دهید
+- اگر در مورد چیزی مطمئن نیستید، به پشتیبانی مشتریان ارجاع دهید: $support_phone
+- همیشه با مشتریان مودب و صبور باشید""",
+
+    'ps': """تاسې د افغان اتصال لپاره د مصنوعي ذکاء مرستیال یاست، د افغانستان لومړی بې سيمه اړیکې شرکت.
+
+مهم معلومات:
+- د افغانستان لومړی بې سيمه شرکت (له $founded راهیسې)
+- د HD غږ، انټرنیټ، ډیټا او موبایل پیسې خدمتونه وړاندې کوي
+- له $employees څخه زیات کارکوونکي، $jobs+ دندې رامینځته کړې
+
+عمومي پوښتنې او ځوابونه:
+1. د بیلانس چک: "تاسې کولی شئ د $balance_code په ډایل کولو یا د $app_name موبایل اپلیکیشن په کارولو سره خپل بیلانس وګورئ. ستاسې اوسنی بیلانس به فوراً ښکاره شي."
+2. د انټرنیټ پیکیجونه:
+$packages
+   - د ګډون لپاره: $subscribe_code ډایل کړئ او لارښوونې تعقیب کړئ
+3. د سیم ثبت: "د سیم ثبت لپاره، مهرباني وکړئ د خپل اصلي تذکرې ID کارت سره د افغان اتصال نږدې دفتر ته مراجعه وکړئ. دا پروسه نږدې 15-20 دقیقې وخت نیسي."
+4. د شبکې پوښښ: "موږ په ټولو 34 ولایتونو کې پراخ پوښښ لرو، په کابل، هرات، مزارشریف، قندهار، جلال آباد او کندز کې د قوي سګنالونو سره."
+5. تخنیکي ملاتړ:
+   - سګنال نشته: خپل تلیفون restart کړئ، د سیم ځای په ځای کول وګورئ
+   - انټرنیټ ورو: خپل ډیټا بیلانس وګورئ، یوې خلاصې سیمې ته لاړ شه
+   - د زنګ ستونزې: په خپل سیمه کې د شبکې پوښښ وګورئ
+6. د پیرودونکو خدمت: په $support_phone کې زنګ ووهئ یا $website ته مراجعه وکړئ
+
+لارښوونې:
+- لنډ، مرستندویه او مسلکي اوسئ
+- د پورتنۍ پوهې څخه مشخص معلومات وړاندې کړئ
+- که تاسو د یو شي په اړه ډاډه نه یاست، د پیرودونکو ملاتړ ته یې ورګرځئ: $support_phone
+- تل په پیرودونکو کې درناوی او صبر وکړئ"""
+}
+
+FALLBACK_TEMPLATES = {
+    'en': "I apologize, but I'm currently experiencing technical difficulties. Please try again in a moment or contact our support team at $support_phone for immediate assistance.",
+    'fa': "عذر میخواهم، در حال حاضر با مشکلات فنی مواجه هستم. لطفاً چند لحظه دیگر تلاش کنید یا برای دریافت کمک فوری با تیم پشتیبانی ما در $support_phone تماس بگیرید.",
+    'ps': "بخښنه غواړم، اوس مهال زه تخنیکي ستونزو سره مخ یم. مهرباني وکړئ یو څه وروسته بیا هڅه وکړئ یا د فوري مرستې لپاره زموږ د ملاتړ ټیم سره په $support_phone کې اړیکه ونیسئ."
+}
+
+
+# One line per package in place of $packages
+PACKAGE_LINE = {
+    'en': '   - {name} Package: {price_afn} AFN for {data_gb}GB (valid for {days} days)',
+    'fa': '   - بسته {name}: {price_afn} افغانی برای {data_gb} گیگابایت (معتبر برای {days} روز)',
+    'ps': '   - {name} پیکیج: {price_afn} افغانۍ د {data_gb} گیګابایټ لپاره (د {days} ورځو لپاره معتبر)',
+}
+
+
+def template_values(facts):
+    """$placeholder values for the scalar facts"""
+    values = {key: value for key, value in facts.items() if isinstance(value, (str, int, float))}
+    values['employees'] = f"{facts['employees']:,}"
+    values['jobs'] = f"{facts['jobs']:,}"
+    return values
+
+
+def render_packages(facts, language, line_format):
+    """The package table as text, one ``line_format`` line per package"""
+    names = facts['package_names'].get(language, facts['package_names']['en'])
+    return '\n'.join(
+        line_format.format(name=names[package['key']], **package) for package in facts['packages']
+    )
+
+
+class PromptRegistry:
+    """Renders the system prompts and fallback texts from the facts file.
+
+    ``reload()`` re-reads the facts and re-renders everything; listeners
+    added with ``add_listener`` are called afterwards (the mock service
+    re-renders its answers this way). With ``check_interval`` set, the
+    file's mtime is checked at most that often and a change reloads it.
+    """
+
+    def __init__(self, facts_file, check_interval=30):
+        self.facts_file = facts_file
+        self.check_interval = check_interval
+        self.listeners = []
+        self._lock = threading.Lock()
+        self._next_check = 0.0
+        self._load()
+
+    @classmethod
+    def from_settings(cls):
+        options = {**DEFAULT_PROMPT_SETTINGS, **getattr(settings, 'PROMPT_REGISTRY', {})}
+        return cls(options['FACTS_FILE'], options['CHECK_INTERVAL'])
+
+    def _load(self):
+        with open(self.facts_file, encoding='utf-8') as facts_file:
+            facts = json.load(facts_file)
+        self._mtime = os.stat(self.facts_file).st_mtime
+        system_prompts = {
+            language: self.render(template, facts, language, PACKAGE_LINE[language])
+            for language, template in SYSTEM_PROMPT_TEMPLATES.items()
+        }
+        fallbacks = {
+            language: self.render(template, facts, language)
+            for language, template in FALLBACK_TEMPLATES.items()
+        }
+        digest = hashlib.sha256()
+        for language in sorted(system_prompts):
+            digest.update(system_prompts[language].encode('utf-8'))
+            digest.update(fallbacks[language].encode('utf-8'))
+        # Swapped in one assignment so readers never see a half-rendered set
+        self._rendered = (facts, system_prompts, fallbacks, f"{facts.get('version', 0)}-{digest.hexdigest()[:12]}")
+
+    @staticmethod
+    def render(template, facts, language, package_line=None):
+        """Fill a template's $placeholders from the facts"""
+        values = template_values(facts)
+        if package_line is not None:
+            values['packages'] = render_packages(facts, language, package_line)
+        return Template(template).substitute(values)
+
+    @property
+    def facts(self):
+        return self._rendered[0]
+
+    @property
+    def version(self):
+        self.check_for_changes()
+        return self._rendered[3]
+
+    def system_prompt(self, language):
+        self.check_for_changes()
+        prompts = self._rendered[1]
+        return prompts.get(language, prompts['en'])
+
+    def fallback(self, language):
+        fallbacks = self._rendered[2]
+        return fallbacks.get(language, fallbacks['en'])
+
+    def add_listener(self, callback):
+        """Call ``callback(registry)`` after every reload"""
+        self.listeners.append(callback)
+
+    def reload(self):
+        """Re-read the facts file and re-render; returns the new version"""
+        with self._lock:
+            previous = self._rendered[3]
+            self._load()
+        for callback in self.listeners:
+            callback(self)
+        if self._rendered[3] != previous:
+            logger.info("📝 Prompts reloaded: version %s -> %s", previous, self._rendered[3])
+        return self._rendered[3]
+
+    def check_for_changes(self):
+        """Reload when the facts file changed on disk; one stat() per ``check_interval``"""
+        if not self.check_interval:
+            return
+        now = time.monotonic()
+        if now < self._next_check:
+            return
+        self._next_check = now + self.check_interval
+        try:
+            changed = os.stat(self.facts_file).st_mtime != self._mtime
+        except OSError as e:
+            logger.warning(f"Cannot check prompt facts file: {e}")
+            return
+        if changed:
+            self.reload()
+
+
+prompt_registry = PromptRegistry.from_settings()
+
+
+class PromptMixin:
+    """Prompt building and fallback text for chat-completion style providers"""
+
+    def get_system_prompt(self, language):
+        return prompt_registry.system_prompt(language)
+
+    def build_messages(self, message, language):
+        """System prompt, the recent turns of the session in scope, then the new message"""
+        return [
+            {"role": "system", "content": self.get_system_prompt(language)},
+            *history_messages(),
+            {"role": "user", "content": message}
+        ]
+
+    def get_fallback_response(self, language):
+        return prompt_registry.fallback(language)
@@ -0,0 +1,385 @@
+import asyncio
+import contextlib
+import contextvars
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from django.conf import settings
+
+from ..metrics import registry
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RESILIENCE_SETTINGS = {
+    'FAILURE_THRESHOLD': 5,       # consecutive failed calls that open the circuit
+    'RECOVERY_TIMEOUT': 30,       # seconds open before a half-open trial call
+    'HEDGE': False,
+    'HEDGE_QUANTILE': 0.95,       # hedge once a call runs longer than this latency quantile
+    'HEDGE_MIN_DELAY': 0.05,
+    'HEDGE_DEFAULT_DELAY': 1.0,   # until enough latencies have been observed
+    'HEDGE_MAX_WORKERS': 32,
+    'DEGRADED_KB_MIN_SCORE': 0.35,
+}
+
+CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+circuit_rejections = registry.counter(
+    'ai_circuit_rejections', 'Provider calls skipped because the circuit was open', ('provider',)
+)
+hedged_requests = registry.counter(
+    'ai_hedged_requests', 'Second attempts fired because the first exceeded the hedge delay', ('provider',)
+)
+
+
+# --- Deadlines ---------------------------------------------------------------
+
+_deadline = contextvars.ContextVar('ai_request_deadline', default=None)
+
+
+@contextlib.contextmanager
+def deadline_scope(seconds):
+    """Give every provider call made inside the block at most ``seconds`` in total.
+
+    Stored in a context variable so it follows the request through sync code,
+    asyncio tasks and (via ``copy_context``) worker threads.
+    """
+    deadline = time.monotonic() + seconds if seconds else None
+    current = _deadline.get()
+    if current is not None and (deadline is None or current < deadline):
+        deadline = current     # an enclosing scope is stricter
+    token = _deadline.set(deadline)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining_time():
+    """Seconds left before the current request's deadline, or None without one"""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def clamp_timeout(timeout):
+    """Shrink a timeout (seconds or a requests ``(connect, read)`` tuple) to the deadline"""
+    remaining = remaining_time()
+    if remaining is None:
+        return timeout
+    remaining = max(remaining, 0.001)
+    if isinstance(timeout, tuple):
+        return tuple(min(part, remaining) for part in timeout)
+    return min(timeout, remaining)
+
+
+# --- Provider attribution --------------------------------------------------
+
+# Name of the backend that produced the last answer in this context: a
+# provider name, 'cache', 'knowledge_base' or 'fallback' (DEGRADED_SOURCES).
+# The views reset it before a call and read it afterwards to tag the response.
+current_provider = contextvars.ContextVar('ai_provider', default=None)
+
+DEGRADED_SOURCES = ('knowledge_base', 'fallback')
+
+
+def degraded_response(message, language, min_score, fallback):
+    """Best answer available without a provider: a weaker KB match, else ``fallback``"""
+    from .retrieval import answer_from_knowledge_base
+    return _degraded(answer_from_knowledge_base(message, language, min_score=min_score), fallback)
+
+
+async def adegraded_response(message, language, min_score, fallback):
+    from .retrieval import aanswer_from_knowledge_base
+    return _degraded(await aanswer_from_knowledge_base(message, language, min_score=min_score), fallback)
+
+
+def _degraded(answer, fallback):
+    if answer is not None:
+        current_provider.set('knowledge_base')
+        return answer
+    current_provider.set('fallback')
+    return fallback
+
+
+# --- Circuit breaker ---------------------------------------------------------
+
+class CircuitBreaker:
+    """Closed -> open after ``failure_threshold`` consecutive failures; open ->
+    half-open after ``recovery_timeout`` seconds, letting one trial call through;
+    the trial closes the circuit again or re-opens it.
+    """
+
+    def __init__(self, name, failure_threshold=5, recovery_timeout=30):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._state == OPEN and time.monotonic() - self._opened_at >= self.recovery_timeout:
+                return HALF_OPEN
+            return self._state
+
+    def allow(self):
+        """Whether a call may go to the provider right now"""
+        with self._lock:
+            if self._state == CLOSED:
+                return True
+            if self._state == OPEN:
+                if time.monotonic() - self._opened_at < self.recovery_timeout:
+                    return False
+                self._state = HALF_OPEN
+            if self._trial_in_flight:
+                return False
+            self._trial_in_flight = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            if self._state != CLOSED:
+                logger.info(f"🔌 Circuit {self.name} closed")
+            self._state = CLOSED
+            self._failures = 0
+            self._trial_in_flight = False
+
+    def release(self):
+        """Free the trial slot of a call that ended without an outcome (cancelled, client gone)"""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_in_flight = False
+            if self._state == HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != OPEN:
+                    logger.warning(f"🔌 Circuit {self.name} opened after {self._failures} failures")
+                self._state = OPEN
+                self._opened_at = time.monotonic()
+
+
+class LatencyTracker:
+    """Recent call latencies: quantiles for the hedge delay, an EWMA for routing"""
+
+    def __init__(self, size=200, min_samples=20, alpha=0.3):
+        self.min_samples = min_samples
+        self.alpha = alpha
+        self.ewma = None
+        self._samples = deque(maxlen=size)
+
+    def add(self, seconds):
+        self._samples.append(seconds)
+        self.ewma = seconds if self.ewma is None else self.alpha * seconds + (1 - self.alpha) * self.ewma
+
+    def quantile(self, q):
+        samples = sorted(self._samples)
+        if len(samples) < self.min_samples:
+            return None
+        return samples[min(int(len(samples) * q), len(samples) - 1)]
+
+
+# --- Resilient service wrapper -----------------------------------------------
+
+class ResilientAIService:
+    """Wraps a provider service with a circuit breaker and optional hedging.
+
+    A call fails when it raises or when the provider answers with its own
+    fallback text (how the services report upstream errors). Failed calls,
+    and every call while the circuit is open, get a knowledge base answer
+    at a relaxed threshold, or the fallback text. With hedging on, a second
+    identical call is fired when the first has not answered within the
+    recent p95 latency, and whichever succeeds first is returned.
+    """
+
+    def __init__(self, service, name, failure_threshold=5, recovery_timeout=30, hedge=False,
+                 hedge_quantile=0.95, hedge_min_delay=0.05, hedge_default_delay=1.0, hedge_max_workers=32,
+                 degraded_kb_min_score=0.35):
+        self.service = service
+        self.name = name
+        self.circuit_breaker = CircuitBreaker(name, failure_threshold, recovery_timeout)
+        self.latencies = LatencyTracker()
+        self.hedge = hedge
+        self.hedge_quantile = hedge_quantile
+        self.hedge_min_delay = hedge_min_delay
+        self.hedge_default_delay = hedge_default_delay
+        self.degraded_kb_min_score = degraded_kb_min_score
+        self._executor = ThreadPoolExecutor(hedge_max_workers, thread_name_prefix=f'{name}-hedge') if hedge else None
+
+    @classmethod
+    def from_settings(cls, service, name):
+        options = {**DEFAULT_RESILIENCE_SETTINGS, **getattr(settings, 'AI_RESILIENCE', {})}
+        return cls(
+            service,
+            name,
+            failure_threshold=options['FAILURE_THRESHOLD'],
+            recovery_timeout=options['RECOVERY_TIMEOUT'],
+            hedge=options['HEDGE'],
+            hedge_quantile=options['HEDGE_QUANTILE'],
+            hedge_min_delay=options['HEDGE_MIN_DELAY'],
+            hedge_default_delay=options['HEDGE_DEFAULT_DELAY'],
+            hedge_max_workers=options['HEDGE_MAX_WORKERS'],
+            degraded_kb_min_score=options['DEGRADED_KB_MIN_SCORE'],
+        )
+
+    def __getattr__(self, name):
+        return getattr(self.service, name)
+
+    def hedge_delay(self):
+        observed = self.latencies.quantile(self.hedge_quantile)
+        return max(observed if observed is not None else self.hedge_default_delay, self.hedge_min_delay)
+
+    def _failed(self, response, language):
+        return not response or response == self._fallback_text(language)
+
+    def _fallback_text(self, language):
+        get_fallback = getattr(self.service, 'get_fallback_response', None)
+        return get_fallback(language) if get_fallback is not None else ''
+
+    def degraded_response(self, message, language):
+        return degraded_response(message, language, self.degraded_kb_min_score, self._fallback_text(language))
+
+    async def adegraded_response(self, message, language):
+        return await adegraded_response(message, language, self.degraded_kb_min_score, self._fallback_text(language))
+
+    def _record(self, response, language, started):
+        if self._failed(response, language):
+            self.circuit_breaker.record_failure()
+            return False
+        self.latencies.add(time.monotonic() - started)
+        self.circuit_breaker.record_success()
+        return True
+
+    def _call(self, message, language):
+        try:
+            return self.service.generate_response(message, language)
+        except Exception as e:
+            logger.error(f"💥 {self.name} provider call raised: {e}")
+            return None
+
+    def attempt(self, message, language='en'):
+        """The provider's answer, or None when the circuit is open or the call failed"""
+        if not self.circuit_breaker.allow():
+            circuit_rejections.inc(self.name)
+            return None
+        started = time.monotonic()
+        if self._executor is None:
+            response = self._call(message, language)
+        else:
+            response = self._hedged_call(message, language)
+        return response if self._record(response, language, started) else None
+
+    def generate_response(self, message, language='en'):
+        response = self.attempt(message, language)
+        if response is None:
+            return self.degraded_response(message, language)
+        current_provider.set(self.name)
+        return response
+
+    def _hedged_call(self, message, language):
+        # copy_context() carries the request deadline into the worker threads
+        attempts = [self._executor.submit(contextvars.copy_context().run, self._call, message, language)]
+        done, _ = wait(attempts, timeout=self.hedge_delay())
+        if not done:
+            hedged_requests.inc(self.name)
+            attempts.append(self._executor.submit(contextvars.copy_context().run, self._call, message, language))
+
+        pending = set(attempts)
+        result = None
+        while pending:
+            remaining = remaining_time()
+            done, pending = wait(pending, timeout=None if remaining is None else max(remaining, 0),
+                                 return_when=FIRST_COMPLETED)
+            if not done:
+                break      # deadline passed; abandon both attempts
+            for future in done:
+                result = future.result()
+                if not self._failed(result, language):
+                    return result
+        return result
+
+    async def aattempt(self, message, language='en'):
+        if not self.circuit_breaker.allow():
+            circuit_rejections.inc(self.name)
+            return None
+        started = time.monotonic()
+        try:
+            if self.hedge:
+                response = await self._ahedged_call(message, language)
+            else:
+                response = await self._acall(message, language)
+        except BaseException:
+            # Cancelled: no verdict on the provider, but a half-open trial must not stay in flight
+            self.circuit_breaker.release()
+            raise
+        return response if self._record(response, language, started) else None
+
+    async def agenerate_response(self, message, language='en'):
+        response = await self.aattempt(message, language)
+        if response is None:
+            return await self.adegraded_response(message, language)
+        current_provider.set(self.name)
+        return response
+
+    async def _acall(self, message, language):
+        try:
+            return await self.service.agenerate_response(message, language)
+        except Exception as e:
+            logger.error(f"💥 {self.name} provider call raised: {e}")
+            return None
+
+    async def _ahedged_call(self, message, language):
+        attempts = [asyncio.ensure_future(self._acall(message, language))]
+        done, _ = await asyncio.wait(attempts, timeout=self.hedge_delay())
+        if not done:
+            hedged_requests.inc(self.name)
+            attempts.append(asyncio.ensure_future(self._acall(message, language)))
+
+        pending = set(attempts)
+        result = None
+        try:
+            while pending:
+                remaining = remaining_time()
+                done, pending = await asyncio.wait(
+                    pending, timeout=None if remaining is None else max(remaining, 0),
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                if not done:
+                    break
+                for task in done:
+                    result = task.result()
+                    if not self._failed(result, language):
+                        return result
+            return result
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def stream_response(self, message, language='en'):
+        if not self.circuit_breaker.allow():
+            circuit_rejections.inc(self.name)
+            yield self.degraded_response(message, language)
+            return
+
+        current_provider.set(self.name)
+        started = time.monotonic()
+        chunks = []
+        try:
+            for chunk in self.service.stream_response(message, language):
+                chunks.append(chunk)
+                yield chunk
+        except Exception:
+            self.circuit_breaker.record_failure()
+            raise
+        except BaseException:
+            # GeneratorExit when the client disconnects mid-stream: release the trial slot
+            self.circuit_breaker.release()
+            raise
+        self._record(''.join(chunks), language, started)
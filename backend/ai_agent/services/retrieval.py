@@ -0,0 +1,234 @@
+import logging
+import math
+import threading
+from collections import Counter, namedtuple
+
+import numpy as np
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from .text import normalize_text
+
+logger = logging.getLogger(__name__)
+
+# Question columns indexed for every entry; answers are returned in the caller's language
+QUESTION_FIELDS = ('question_en', 'question_dari', 'question_pashto')
+ANSWER_FIELDS = {'en': 'answer_en', 'fa': 'answer_dari', 'ps': 'answer_pashto'}
+
+KnowledgeBaseMatch = namedtuple('KnowledgeBaseMatch', ['entry_id', 'category', 'score', 'answers'])
+
+_Snapshot = namedtuple('_Snapshot', ['vocabulary', 'idf', 'idf_unseen', 'indptr', 'indices', 'data', 'doc_entries'])
+
+
+def char_ngrams(text, min_n=2, max_n=4):
+    """Character n-grams taken inside word boundaries of the normalized text.
+
+    Works the same for English, Dari and Pashto without a word tokenizer and
+    tolerates the spelling variation common in typed Dari/Pashto.
+    """
+    grams = Counter()
+    for word in normalize_text(text).split():
+        padded = f' {word} '
+        for n in range(min_n, max_n + 1):
+            for start in range(len(padded) - n + 1):
+                grams[padded[start:start + n]] += 1
+    return grams
+
+
+class KnowledgeBaseIndex:
+    """TF-IDF retrieval over TelecomKnowledgeBase questions.
+
+    Weights are kept column-major (CSC layout) in plain NumPy arrays, so a
+    query only touches the postings of its own n-grams. Entries can be added,
+    replaced or removed one at a time; only the changed entry is re-tokenized
+    and the arrays are re-materialized lazily on the next search.
+    """
+
+    def __init__(self, min_n=2, max_n=4):
+        self.min_n = min_n
+        self.max_n = max_n
+        self._entries = {}      # entry id -> (category, answers, [Counter per question])
+        self._df = Counter()
+        self._lock = threading.RLock()
+        self._dirty = True
+        self._loaded = False
+        self._snapshot = None
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def loaded(self):
+        return self._loaded
+
+    def load(self, queryset):
+        """(Re)build the whole index from a TelecomKnowledgeBase queryset"""
+        with self._lock:
+            self._entries.clear()
+            self._df.clear()
+            for entry in queryset:
+                self._add(entry)
+            self._dirty = True
+            self._loaded = True
+        logger.info(f"📚 Knowledge base index built with {len(self._entries)} entries")
+
+    def reset(self):
+        """Forget everything; the next get_knowledge_base_index() reloads from the database"""
+        with self._lock:
+            self._entries.clear()
+            self._df.clear()
+            self._dirty = True
+            self._loaded = False
+
+    def upsert(self, entry):
+        with self._lock:
+            self._remove(entry.pk)
+            self._add(entry)
+            self._dirty = True
+
+    def remove(self, entry_id):
+        with self._lock:
+            self._remove(entry_id)
+            self._dirty = True
+
+    def _add(self, entry):
+        documents = []
+        for field in QUESTION_FIELDS:
+            grams = char_ngrams(getattr(entry, field) or '', self.min_n, self.max_n)
+            if grams:
+                documents.append(grams)
+                self._df.update(grams.keys())
+        answers = {language: getattr(entry, field) for language, field in ANSWER_FIELDS.items()}
+        self._entries[entry.pk] = (entry.category, answers, documents)
+
+    def _remove(self, entry_id):
+        previous = self._entries.pop(entry_id, None)
+        if previous is not None:
+            for grams in previous[2]:
+                self._df.subtract(grams.keys())
+            self._df += Counter()  # drop n-grams whose document frequency reached zero
+
+    def _materialize(self):
+        documents = [(entry_id, grams) for entry_id, (_, _, docs) in self._entries.items() for grams in docs]
+        n_docs = len(documents)
+        vocabulary = {gram: column for column, gram in enumerate(self._df)}
+        idf = np.array(
+            [math.log((1 + n_docs) / (1 + self._df[gram])) + 1 for gram in self._df], dtype=np.float32
+        )
+
+        columns, rows, weights = [], [], []
+        for row, (_, grams) in enumerate(documents):
+            doc_columns = np.fromiter((vocabulary[gram] for gram in grams), dtype=np.int64, count=len(grams))
+            tf = 1 + np.log(np.fromiter(grams.values(), dtype=np.float32, count=len(grams)))
+            doc_weights = tf * idf[doc_columns]
+            columns.append(doc_columns)
+            rows.append(np.full(len(grams), row, dtype=np.int32))
+            weights.append(doc_weights / np.linalg.norm(doc_weights))
+
+        if documents:
+            columns = np.concatenate(columns)
+            order = np.argsort(columns, kind='stable')
+            indices = np.concatenate(rows)[order]
+            data = np.concatenate(weights)[order].astype(np.float32)
+            indptr = np.searchsorted(columns[order], np.arange(len(vocabulary) + 1))
+        else:
+            indices = np.empty(0, dtype=np.int32)
+            data = np.empty(0, dtype=np.float32)
+            indptr = np.zeros(1, dtype=np.int64)
+
+        # Searches read one immutable snapshot, so they never block each other
+        self._snapshot = _Snapshot(
+            vocabulary=vocabulary,
+            idf=idf,
+            idf_unseen=math.log(1 + n_docs) + 1,
+            indptr=indptr,
+            indices=indices,
+            data=data,
+            doc_entries=tuple(
+                (entry_id, self._entries[entry_id][0], self._entries[entry_id][1]) for entry_id, _ in documents
+            ),
+        )
+        self._dirty = False
+
+    def answers(self):
+        """``{language: answer}`` of every entry"""
+        with self._lock:
+            return [answers for _, answers, _ in self._entries.values()]
+
+    def materialize(self):
+        """Build the search arrays now instead of on the next search"""
+        with self._lock:
+            if self._dirty:
+                self._materialize()
+
+    def search(self, message):
+        """Return the best matching entry as a KnowledgeBaseMatch, or None"""
+        if self._dirty:
+            self.materialize()
+        snapshot = self._snapshot
+        if not snapshot.doc_entries:
+            return None
+
+        grams = char_ngrams(message, self.min_n, self.max_n)
+        vocabulary = snapshot.vocabulary
+        known = [(vocabulary[gram], count) for gram, count in grams.items() if gram in vocabulary]
+        if not known:
+            return None
+
+        columns = np.fromiter((column for column, _ in known), dtype=np.int64, count=len(known))
+        tf = 1 + np.log(np.fromiter((count for _, count in known), dtype=np.float32, count=len(known)))
+        query = tf * snapshot.idf[columns]
+        # Unseen n-grams still count towards the query norm (with the maximum
+        # idf), so a query that only partially overlaps an entry scores lower
+        unseen = sum((1 + math.log(count)) ** 2 for gram, count in grams.items() if gram not in vocabulary)
+        query /= math.sqrt(float(query @ query) + unseen * snapshot.idf_unseen ** 2)
+
+        # Gather the postings of every query n-gram without a Python loop
+        starts = snapshot.indptr[columns]
+        lengths = snapshot.indptr[columns + 1] - starts
+        offsets = np.repeat(starts - (np.cumsum(lengths) - lengths), lengths)
+        postings = np.arange(int(lengths.sum())) + offsets
+        weights = np.repeat(query, lengths) * snapshot.data[postings]
+        scores = np.bincount(snapshot.indices[postings], weights=weights, minlength=len(snapshot.doc_entries))
+
+        best = int(scores.argmax())
+        entry_id, category, answers = snapshot.doc_entries[best]
+        return KnowledgeBaseMatch(entry_id, category, round(float(scores[best]), 4), answers)
+
+
+knowledge_base_index = KnowledgeBaseIndex()
+
+
+def get_knowledge_base_index():
+    """Return the shared index, building it from the database on first use"""
+    if not knowledge_base_index.loaded:
+        from ..models import TelecomKnowledgeBase
+        with knowledge_base_index._lock:
+            if not knowledge_base_index.loaded:
+                knowledge_base_index.load(TelecomKnowledgeBase.objects.all())
+    return knowledge_base_index
+
+
+def answer_from_knowledge_base(message, language, min_score=None):
+    """Return the stored answer when the best match clears the threshold, else None.
+
+    ``min_score`` overrides the configured threshold, e.g. to accept weaker
+    matches while the AI provider is unavailable.
+    """
+    options = getattr(settings, 'KNOWLEDGE_BASE_RETRIEVAL', {})
+    if not options.get('ENABLED', True):
+        return None
+    if min_score is None:
+        min_score = options.get('MIN_SCORE', 0.6)
+    match = get_knowledge_base_index().search(message)
+    if match is None or match.score < min_score:
+        return None
+    logger.info("📚 Answered from knowledge base entry %s (score %s)", match.entry_id, match.score)
+    return match.answers.get(language) or match.answers['en']
+
+
+async def aanswer_from_knowledge_base(message, language, min_score=None):
+    # Only the very first lookup needs the database; searches are pure CPU
+    if not knowledge_base_index.loaded:
+        await sync_to_async(get_knowledge_base_index)()
+    return answer_from_knowledge_base(message, language, min_score)
@@ -0,0 +1,236 @@
+"""Provider registry and router.
+
+Providers are listed in ``settings.AI_PROVIDERS`` (dotted class path, weight,
+relative cost) and enabled, in failover order, by ``AI_ROUTING['PROVIDERS']``.
+Each one gets its own circuit breaker; the router orders the healthy ones
+per request according to the routing policy and moves on to the next when a
+provider fails, so a request only degrades to the knowledge base or the
+fallback text when every provider has failed.
+
+Providers are built lazily: a provider's module, and the SDK it imports, is
+only loaded when the provider is first used, so management commands and
+worker boots do not pay for providers they never call.
+"""
+import logging
+import random
+import threading
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from .prompts import prompt_registry
+from .resilience import (
+    DEFAULT_RESILIENCE_SETTINGS, OPEN, ResilientAIService, adegraded_response, current_provider, degraded_response,
+)
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ROUTING_SETTINGS = {
+    'PROVIDERS': ['mock'],
+    'POLICY': 'failover',
+    'EWMA_ALPHA': 0.3,
+}
+
+
+class LazyProvider:
+    """A provider built from its dotted class path on first use, once per process.
+
+    Attribute access is forwarded to the built provider. When building fails
+    (a missing SDK or API key) the error is kept and re-raised on every use,
+    and ``failed`` lets the router skip the provider.
+    """
+
+    def __init__(self, name, class_path):
+        self.name = name
+        self.class_path = class_path
+        self._provider = None
+        self._error = None
+        self._lock = threading.Lock()
+
+    @property
+    def failed(self):
+        return self._error is not None
+
+    def get(self):
+        provider = self._provider
+        if provider is not None:
+            return provider
+        with self._lock:
+            if self._provider is None and self._error is None:
+                try:
+                    self._provider = import_string(self.class_path)()
+                    logger.info("✅ AI provider %s initialized", self.name)
+                except Exception as e:
+                    # e.g. a missing API key: route around the provider instead of failing requests
+                    logger.error(f"❌ Failed to initialize AI provider {self.name}: {e}")
+                    self._error = e
+        if self._error is not None:
+            raise self._error
+        return self._provider
+
+    def __getattr__(self, name):
+        return getattr(self.get(), name)
+
+
+class ProviderRoute:
+    """A provider behind its circuit breaker, with its routing weight and cost"""
+
+    __slots__ = ('service', 'weight', 'cost')
+
+    def __init__(self, service, weight=1.0, cost=0.0):
+        self.service = service
+        self.weight = weight
+        self.cost = cost
+
+    @property
+    def name(self):
+        return self.service.name
+
+    @property
+    def available(self):
+        """False once the provider has failed to initialize"""
+        return not getattr(self.service.service, 'failed', False)
+
+    @property
+    def latency(self):
+        """EWMA of successful call latency in seconds; 0 until observed so new providers get tried"""
+        return self.service.latencies.ewma or 0.0
+
+
+def _failover(routes):
+    return list(routes)
+
+
+def _weighted(routes):
+    # Weighted random order without replacement (Efraimidis-Spirakis keys)
+    return sorted(routes, key=lambda route: random.random() ** (1.0 / max(route.weight, 1e-9)), reverse=True)
+
+
+def _latency(routes):
+    return sorted(routes, key=lambda route: route.latency)
+
+
+def _cost(routes):
+    return sorted(routes, key=lambda route: (route.cost, route.latency))
+
+
+POLICIES = {
+    'failover': _failover,
+    'weighted': _weighted,
+    'latency': _latency,
+    'cost': _cost,
+}
+
+
+class ProviderRouter:
+    """One AI service interface over several providers.
+
+    Tags every answer with the backend that produced it through
+    ``current_provider``.
+    """
+
+    name = 'router'
+
+    def __init__(self, routes, policy='failover', degraded_kb_min_score=0.35):
+        if not routes:
+            raise ValueError("At least one AI provider is required")
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown routing policy {policy!r}; expected one of {', '.join(POLICIES)}")
+        self.routes = list(routes)
+        self.policy = policy
+        self._order = POLICIES[policy]
+        self.degraded_kb_min_score = degraded_kb_min_score
+        self.supported_languages = ['en', 'fa', 'ps']
+
+    @classmethod
+    def from_settings(cls):
+        options = {**DEFAULT_ROUTING_SETTINGS, **getattr(settings, 'AI_ROUTING', {})}
+        resilience = {**DEFAULT_RESILIENCE_SETTINGS, **getattr(settings, 'AI_RESILIENCE', {})}
+        catalog = getattr(settings, 'AI_PROVIDERS', {})
+        routes = []
+        for name in options['PROVIDERS']:
+            config = catalog.get(name)
+            if config is None:
+                logger.error("❌ AI provider %r is not defined in AI_PROVIDERS", name)
+                continue
+            service = ResilientAIService.from_settings(LazyProvider(name, config['CLASS']), name)
+            service.latencies.alpha = options['EWMA_ALPHA']
+            routes.append(ProviderRoute(service, config.get('WEIGHT', 1.0), config.get('COST', 0.0)))
+        return cls(routes, options['POLICY'], resilience['DEGRADED_KB_MIN_SCORE'])
+
+    @property
+    def providers(self):
+        return [route.service for route in self.routes if route.available]
+
+    def initialize(self):
+        """Build every provider now instead of on first use, e.g. before forking workers"""
+        for route in self.routes:
+            provider = route.service.service
+            if isinstance(provider, LazyProvider):
+                try:
+                    provider.get()
+                except Exception:
+                    pass    # logged; the route is skipped from now on
+        return [route.name for route in self.routes if route.available]
+
+    def candidates(self):
+        """Routes in the order this request should try them; open circuits go last"""
+        ordered = [route for route in self._order(self.routes) if route.available]
+        return [route for route in ordered if route.service.circuit_breaker.state != OPEN] + [
+            route for route in ordered if route.service.circuit_breaker.state == OPEN
+        ]
+
+    def get_fallback_response(self, language):
+        return prompt_registry.fallback(language)
+
+    def generate_response(self, message, language='en'):
+        for route in self.candidates():
+            response = route.service.attempt(message, language)
+            if response is not None:
+                current_provider.set(route.name)
+                return response
+        return degraded_response(message, language, self.degraded_kb_min_score, self.get_fallback_response(language))
+
+    async def agenerate_response(self, message, language='en'):
+        for route in self.candidates():
+            response = await route.service.aattempt(message, language)
+            if response is not None:
+                current_provider.set(route.name)
+                return response
+        return await adegraded_response(
+            message, language, self.degraded_kb_min_score, self.get_fallback_response(language)
+        )
+
+    def stream_response(self, message, language='en'):
+        # Tokens already sent cannot be taken back, so there is no failover mid-stream
+        routes = self.candidates()
+        if not routes:
+            yield degraded_response(message, language, self.degraded_kb_min_score, self.get_fallback_response(language))
+            return
+        yield from routes[0].service.stream_response(message, language)
+
+    def check_health(self):
+        """Healthy while at least one provider is"""
+        for service in self.providers:
+            check = getattr(service, 'check_health', None)
+            try:
+                if check is None or check():
+                    return True
+            except Exception as e:
+                logger.warning(f"AI provider {service.name} health check failed: {e}")
+        return False
+
+    def stats(self):
+        return {
+            'policy': self.policy,
+            'providers': [
+                {
+                    'name': route.name,
+                    'circuit': route.service.circuit_breaker.state,
+                    'latency_ewma_ms': round(route.latency * 1000, 2),
+                    'weight': route.weight,
+                    'cost': route.cost,
+                }
+                for route in self.routes
+            ],
+        }
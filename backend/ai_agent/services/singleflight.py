@@ -0,0 +1,153 @@
+"""Request coalescing ("single-flight") in front of the AI providers.
+
+When many customers ask the same question at once, only the first request
+calls the provider; identical requests arriving while that call is in flight
+wait for it and share its answer. Requests are identical when they have the
+same language, normalized message and prompt version, and the same prior
+turns: new conversations coalesce freely, but one session's context never
+shapes another session's answer.
+
+Threads coalesce with threads and asyncio tasks with tasks on the same loop.
+"""
+import asyncio
+import hashlib
+import threading
+
+from django.conf import settings
+
+from ..context import history_messages
+from ..metrics import registry
+from .prompts import prompt_registry
+from .resilience import current_provider, remaining_time
+from .text import normalize_text
+
+DEFAULT_SINGLE_FLIGHT_SETTINGS = {
+    'ENABLED': True,
+}
+
+upstream_calls = registry.counter(
+    'ai_single_flight_calls', 'Provider calls made on behalf of one or more identical requests', ('method',)
+)
+coalesced_requests = registry.counter(
+    'ai_coalesced_requests', 'Requests answered by waiting for an identical in-flight provider call', ('method',)
+)
+
+
+class _Flight:
+    """One in-flight call; followers wait on ``done``"""
+
+    __slots__ = ('done', 'response', 'provider', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.response = None
+        self.provider = None
+        self.error = None
+
+
+class SingleFlightAIService:
+    """Wraps an AI service so identical concurrent requests share one upstream call.
+
+    Followers answer with the leader's response and provider attribution,
+    or its exception. A follower whose request deadline runs out first stops
+    waiting and calls the service itself, which answers within the deadline.
+    Streams are not coalesced.
+    """
+
+    def __init__(self, service):
+        self.service = service
+        self._flights = {}
+        self._async_flights = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls, service):
+        options = {**DEFAULT_SINGLE_FLIGHT_SETTINGS, **getattr(settings, 'AI_SINGLE_FLIGHT', {})}
+        return cls(service) if options['ENABLED'] else None
+
+    def __getattr__(self, name):
+        return getattr(self.service, name)
+
+    @staticmethod
+    def make_key(message, language):
+        digest = hashlib.sha1(f"{language}\x00{normalize_text(message)}".encode())
+        for turn in history_messages():
+            digest.update(f"\x00{turn['role']}\x00{turn['content']}".encode())
+        return prompt_registry.version, digest.hexdigest()
+
+    def generate_response(self, message, language='en'):
+        key = self.make_key(message, language)
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+
+        if not leader:
+            remaining = remaining_time()
+            if flight.done.wait(None if remaining is None else max(remaining, 0)):
+                coalesced_requests.inc('sync')
+                return self._share(flight)
+            return self.service.generate_response(message, language)
+
+        upstream_calls.inc('sync')
+        try:
+            flight.response = self.service.generate_response(message, language)
+            flight.provider = current_provider.get()
+            return flight.response
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+
+    async def agenerate_response(self, message, language='en'):
+        key = (asyncio.get_running_loop(), *self.make_key(message, language))
+        task = self._async_flights.get(key)
+        leader = task is None
+        if leader:
+            upstream_calls.inc('async')
+            # A task of its own, so a leader that is cancelled (client gone)
+            # does not cancel the call its followers are waiting for
+            task = self._async_flights[key] = asyncio.ensure_future(self._acall(message, language))
+            task.add_done_callback(lambda done: self._land(key, done))
+
+        remaining = remaining_time()
+        try:
+            response, provider = await asyncio.wait_for(
+                asyncio.shield(task), None if remaining is None else max(remaining, 0)
+            )
+        except asyncio.TimeoutError:
+            return await self.service.agenerate_response(message, language)
+        if not leader:
+            coalesced_requests.inc('async')
+        current_provider.set(provider)
+        return response
+
+    def _land(self, key, task):
+        if self._async_flights.get(key) is task:
+            del self._async_flights[key]
+
+    async def _acall(self, message, language):
+        # Runs in a copy of the leader's context; the provider it sets stays there
+        response = await self.service.agenerate_response(message, language)
+        return response, current_provider.get()
+
+    @staticmethod
+    def _share(flight):
+        if flight.error is not None:
+            raise flight.error
+        current_provider.set(flight.provider)
+        return flight.response
+
+    def stream_response(self, message, language='en'):
+        yield from self.service.stream_response(message, language)
+
+    def stats(self):
+        return {
+            'in_flight': len(self._flights) + len(self._async_flights),
+            'upstream_calls': upstream_calls.value('sync') + upstream_calls.value('async'),
+            'coalesced': coalesced_requests.value('sync') + coalesced_requests.value('async'),
+        }
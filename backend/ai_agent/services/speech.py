@@ -0,0 +1,385 @@
+"""Server-side speech-to-text for ``/api/voice-chat/`` audio uploads.
+
+An engine turns 16-bit mono PCM into text. Engines are CPU-bound, so they
+run in a pool of worker processes: a stream checks out one worker for its
+whole upload, sends the audio over a pipe chunk by chunk as it is read from
+the request, and gets the partial transcript back after every chunk. Only
+one chunk is held in memory at a time.
+
+Engines are named by dotted path in ``settings.SPEECH_TO_TEXT['ENGINE']``
+and built inside each worker, so model files are loaded once per process.
+An engine has ``recognizer(language, sample_rate)``, returning an object
+with ``accept(chunk) -> partial text`` and ``finish() -> final text``.
+"""
+import codecs
+import json
+import logging
+import multiprocessing
+import queue
+import struct
+import threading
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from ..metrics import registry
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SPEECH_SETTINGS = {
+    'ENGINE': '',                 # dotted path; empty turns audio uploads off
+    'OPTIONS': {},                # keyword arguments for the engine
+    'PROCESSES': 2,               # 0 runs the engine in the request thread
+    'START_METHOD': 'spawn',      # forking a threaded server is unsafe
+    'ACQUIRE_TIMEOUT': 5,         # seconds to wait for a free worker
+    'STARTUP_TIMEOUT': 60,        # seconds a new worker may spend loading the engine
+    'CHUNK_TIMEOUT': 10,          # seconds a worker may spend on one chunk
+    'CHUNK_SIZE': 8192,           # bytes read from the request per step
+    'MAX_BYTES': 16000 * 2 * 120, # two minutes of 16 kHz audio
+}
+
+speech_streams = registry.counter(
+    'ai_speech_streams', 'Audio uploads transcribed, by outcome', ('outcome',)
+)
+
+
+class SpeechRecognitionError(Exception):
+    """The engine failed or timed out on a stream"""
+
+
+class SpeechBusyError(SpeechRecognitionError):
+    """Every worker stayed busy for ``ACQUIRE_TIMEOUT`` seconds"""
+
+
+class AudioFormatError(ValueError):
+    """The upload is not audio the engines can read"""
+
+
+class FakeSpeechEngine:
+    """Test engine: the "audio" is UTF-8 text, transcribed as it arrives"""
+
+    def __init__(self, **options):
+        self.options = options
+
+    def recognizer(self, language, sample_rate):
+        return FakeRecognizer()
+
+
+class FakeRecognizer:
+    def __init__(self):
+        self.decoder = codecs.getincrementaldecoder('utf-8')('replace')
+        self.text = ''
+
+    def accept(self, chunk):
+        self.text += self.decoder.decode(chunk)
+        return ' '.join(self.text.split())
+
+    def finish(self):
+        self.text += self.decoder.decode(b'', final=True)
+        return ' '.join(self.text.split())
+
+
+class VoskSpeechEngine:
+    """Offline CPU recognition with Vosk (``pip install vosk``).
+
+    ``models`` maps a language code to an unpacked Vosk model directory.
+    All of them are loaded when the worker starts, not on a stream's clock.
+    """
+
+    def __init__(self, models, **options):
+        import vosk    # optional dependency, only needed in the worker processes
+        vosk.SetLogLevel(-1)
+        self.vosk = vosk
+        self.models = {language: vosk.Model(path) for language, path in models.items()}
+
+    def recognizer(self, language, sample_rate):
+        if language not in self.models:
+            raise SpeechRecognitionError(f"No speech model for language '{language}'")
+        return VoskRecognizer(self.vosk.KaldiRecognizer(self.models[language], sample_rate))
+
+
+class VoskRecognizer:
+    def __init__(self, recognizer):
+        self.recognizer = recognizer
+        self.segments = []
+
+    def _text(self, tail):
+        return ' '.join(segment for segment in self.segments + [tail] if segment)
+
+    def accept(self, chunk):
+        if self.recognizer.AcceptWaveform(chunk):
+            # End of an utterance: its text is final
+            self.segments.append(json.loads(self.recognizer.Result())['text'])
+            return self._text('')
+        return self._text(json.loads(self.recognizer.PartialResult())['partial'])
+
+    def finish(self):
+        return self._text(json.loads(self.recognizer.FinalResult())['text'])
+
+
+def pcm_audio(chunks, content_type, sample_rate=16000):
+    """``(sample_rate, chunks)`` with the audio of an upload as raw 16-bit mono PCM.
+
+    ``audio/wav`` uploads have their header read and checked; raw uploads
+    (``audio/pcm``, ``application/octet-stream``) use ``sample_rate``.
+    Raises ``AudioFormatError`` for anything else.
+    """
+    if content_type in ('audio/pcm', 'application/octet-stream'):
+        return sample_rate, chunks
+    if content_type not in ('audio/wav', 'audio/wave', 'audio/x-wav'):
+        raise AudioFormatError(f"Unsupported audio type '{content_type}'")
+
+    # Read just far enough to see the 'fmt ' and 'data' chunk headers
+    header, offset, rate = b'', 12, None
+    for chunk in chunks:
+        header += chunk
+        if len(header) > 65536:
+            break
+        if offset == 12 and len(header) >= 12 and (header[:4] != b'RIFF' or header[8:12] != b'WAVE'):
+            raise AudioFormatError("Not a WAV file")
+        while len(header) >= offset + 8:
+            kind, size = struct.unpack_from('<4sI', header, offset)
+            if kind == b'data':
+                if rate is None:
+                    raise AudioFormatError("WAV data before its format")
+                rest = header[offset + 8:]
+                return rate, _prepend(rest, chunks)
+            if len(header) < offset + 8 + size:
+                break
+            if kind == b'fmt ':
+                encoding, channels, rate, _, _, bits = struct.unpack_from('<HHIIHH', header, offset + 8)
+                if (encoding, channels, bits) != (1, 1, 16):
+                    raise AudioFormatError("WAV audio must be 16-bit mono PCM")
+            offset += 8 + size + size % 2
+    raise AudioFormatError("Truncated WAV header")
+
+
+def _prepend(first, chunks):
+    if first:
+        yield first
+    yield from chunks
+
+
+def _serve(conn, engine_path, options):
+    """Worker process: one recognizer at a time, driven over ``conn``"""
+    try:
+        engine = import_string(engine_path)(**options)
+    except Exception as e:
+        conn.send(('error', f'{type(e).__name__}: {e}'))
+        return
+    conn.send(('ok', None))    # ready
+    recognizer = None
+    while True:
+        try:
+            command, *args = conn.recv()
+        except (EOFError, KeyboardInterrupt):
+            return
+        try:
+            if command == 'start':
+                recognizer, reply = engine.recognizer(*args), None
+            elif command == 'audio':
+                reply = recognizer.accept(args[0])
+            else:
+                recognizer, reply = None, recognizer.finish()
+            conn.send(('ok', reply))
+        except Exception as e:
+            recognizer = None
+            conn.send(('error', f'{type(e).__name__}: {e}'))
+
+
+class _Worker:
+    def __init__(self, context, engine_path, options, startup_timeout):
+        self.conn, child = context.Pipe()
+        self.process = context.Process(
+            target=_serve, args=(child, engine_path, options), name='speech-worker', daemon=True
+        )
+        self.process.start()
+        child.close()
+        try:
+            self._receive(startup_timeout, "start up")
+        except SpeechRecognitionError:
+            self.stop()
+            raise
+
+    def _receive(self, timeout, doing):
+        try:
+            if not self.conn.poll(timeout):
+                raise SpeechRecognitionError(f"Speech engine took over {timeout}s to {doing}")
+            outcome, reply = self.conn.recv()
+        except (EOFError, OSError) as e:
+            raise SpeechRecognitionError(f"Speech worker died: {e}")
+        if outcome == 'error':
+            raise SpeechRecognitionError(reply)
+        return reply
+
+    def call(self, timeout, *message):
+        try:
+            self.conn.send(message)
+        except OSError as e:
+            raise SpeechRecognitionError(f"Speech worker died: {e}")
+        return self._receive(timeout, f"handle '{message[0]}'")
+
+    def stop(self):
+        self.conn.close()
+        self.process.terminate()
+        self.process.join(1)
+
+
+class _LocalWorker:
+    """``PROCESSES = 0``: the engine runs in the calling thread"""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.recognizer = None
+
+    def call(self, timeout, command, *args):
+        try:
+            if command == 'start':
+                self.recognizer = self.engine.recognizer(*args)
+                return None
+            if command == 'audio':
+                return self.recognizer.accept(args[0])
+            return self.recognizer.finish()
+        except SpeechRecognitionError:
+            raise
+        except Exception as e:
+            raise SpeechRecognitionError(f'{type(e).__name__}: {e}')
+
+    def stop(self):
+        pass
+
+
+class Transcription:
+    """One upload's session with a checked-out worker; ``close()`` hands it back"""
+
+    def __init__(self, pool, worker):
+        self.pool = pool
+        self.worker = worker
+        self.text = ''
+        self.broken = False
+
+    def _call(self, *message):
+        try:
+            return self.worker.call(self.pool.chunk_timeout, *message)
+        except SpeechRecognitionError:
+            # The worker may be stuck mid-chunk; a fresh one replaces it
+            self.broken = True
+            raise
+
+    def start(self, language, sample_rate):
+        self._call('start', language, sample_rate)
+
+    def feed(self, chunk):
+        """Send a chunk of PCM; returns the partial transcript so far"""
+        self.text = self._call('audio', chunk) or ''
+        return self.text
+
+    def finish(self):
+        self.text = self._call('finish') or ''
+        return self.text
+
+    def close(self):
+        if self.worker is not None:
+            self.pool.release(self.worker, self.broken)
+            self.worker = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class SpeechWorkerPool:
+    """Worker processes running the speech engine, one stream per worker.
+
+    Workers start on first use and are replaced when they crash or time out.
+    """
+
+    def __init__(self, engine, options=None, processes=2, start_method='spawn',
+                 acquire_timeout=5, startup_timeout=60, chunk_timeout=10):
+        self.engine = engine
+        self.options = options or {}
+        self.processes = processes
+        self.acquire_timeout = acquire_timeout
+        self.startup_timeout = startup_timeout
+        self.chunk_timeout = chunk_timeout
+        self._context = multiprocessing.get_context(start_method)
+        self._local_engine = None
+        self._local_lock = threading.Lock()
+        self._idle = queue.LifoQueue()
+        for _ in range(processes):
+            self._idle.put(None)    # a slot whose worker has not been started yet
+
+    @classmethod
+    def from_settings(cls):
+        """The configured pool, or None when no engine is set"""
+        options = {**DEFAULT_SPEECH_SETTINGS, **getattr(settings, 'SPEECH_TO_TEXT', {})}
+        if not options['ENGINE']:
+            return None
+        return cls(
+            options['ENGINE'],
+            options=options['OPTIONS'],
+            processes=options['PROCESSES'],
+            start_method=options['START_METHOD'],
+            acquire_timeout=options['ACQUIRE_TIMEOUT'],
+            startup_timeout=options['STARTUP_TIMEOUT'],
+            chunk_timeout=options['CHUNK_TIMEOUT'],
+        )
+
+    def _local_worker(self):
+        with self._local_lock:
+            if self._local_engine is None:
+                self._local_engine = import_string(self.engine)(**self.options)
+        return _LocalWorker(self._local_engine)
+
+    def acquire(self):
+        """Check out a worker; raises ``SpeechBusyError`` if none frees up in time"""
+        if self.processes == 0:
+            return self._local_worker()
+        try:
+            worker = self._idle.get(timeout=self.acquire_timeout)
+        except queue.Empty:
+            raise SpeechBusyError(f"No speech worker free within {self.acquire_timeout}s")
+        if worker is None:
+            try:
+                worker = _Worker(self._context, self.engine, self.options, self.startup_timeout)
+            except Exception:
+                self._idle.put(None)
+                raise
+        return worker
+
+    def release(self, worker, broken=False):
+        if self.processes == 0:
+            return
+        if broken:
+            logger.warning("🎙️ Replacing a failed speech worker")
+            worker.stop()
+            worker = None
+        self._idle.put(worker)
+
+    def open(self, language, sample_rate):
+        """A started ``Transcription``; the caller must ``close()`` it"""
+        transcription = Transcription(self, self.acquire())
+        try:
+            transcription.start(language, sample_rate)
+        except BaseException:
+            transcription.close()
+            raise
+        return transcription
+
+    def close(self):
+        while True:
+            try:
+                worker = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            if worker is not None:
+                worker.stop()
+
+    def stats(self):
+        return {
+            'engine': self.engine,
+            'processes': self.processes,
+            'busy': self.processes - self._idle.qsize(),
+        }
@@ -0,0 +1,38 @@
+import re
+
+# Arabic code points that Dari/Pashto keyboards and copy-pasted text mix with
+# their Persian equivalents, plus Arabic-Indic and Persian digits.
+_CHAR_MAP = str.maketrans({
+    'ي': 'ی',
+    'ى': 'ی',
+    'ئ': 'ی',
+    'ك': 'ک',
+    'ة': 'ه',
+    'ۀ': 'ه',
+    'أ': 'ا',
+    'إ': 'ا',
+    'آ': 'ا',
+    'ٱ': 'ا',
+    '\u200c': ' ',  # zero-width non-joiner
+    '\u200d': '',  # zero-width joiner
+    '\u0640': '',  # tatweel
+    **{chr(0x0660 + digit): str(digit) for digit in range(10)},
+    **{chr(0x06F0 + digit): str(digit) for digit in range(10)},
+})
+
+# Arabic harakat and Quranic annotation marks are dropped in place
+_DIACRITICS = re.compile('[\u064b-\u065f\u0670\u06d6-\u06ed]')
+# Anything that is not a letter, digit or whitespace becomes a separator
+_PUNCTUATION = re.compile(r'[^\w\s]|_')
+_WHITESPACE = re.compile(r'\s+')
+
+
+def normalize_text(text):
+    """Canonical form of a user message used for cache keys and matching.
+
+    Case-folds, unifies Arabic/Persian letter variants and digits, strips
+    punctuation, symbols and diacritics, and collapses whitespace.
+    """
+    text = _DIACRITICS.sub('', text.casefold().translate(_CHAR_MAP))
+    text = _PUNCTUATION.sub(' ', text)
+    return _WHITESPACE.sub(' ', text).strip()
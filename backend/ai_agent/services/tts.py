@@ -0,0 +1,326 @@
+"""Server-side text-to-speech for voice chat answers.
+
+A synthesizer renders text to a WAV file. Synthesizers are CPU-bound and
+run in a process pool; each worker builds its synthesizer once and writes
+the clip straight into the cache directory, so audio never crosses the
+pipe back to the web process.
+
+Clips are content-addressed: the clip id is a hash of (synthesizer,
+language, voice, hash of the text), so the same answer in the same voice is
+rendered once and served from disk after that. Canned mock and knowledge
+base answers repeat constantly, which makes almost every clip a cache hit.
+Identical clips requested at the same moment share one render.
+"""
+import asyncio
+import hashlib
+import logging
+import multiprocessing
+import os
+import shutil
+import subprocess
+import threading
+import uuid
+import wave
+from concurrent.futures import Future, ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from ..metrics import registry
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TTS_SETTINGS = {
+    'ENGINE': '',                 # dotted path; empty turns speech output off
+    'OPTIONS': {},                # keyword arguments for the synthesizer
+    'VOICES': {},                 # language -> voice name; default: the language code
+    'PROCESSES': 2,               # 0 renders in the request thread
+    'START_METHOD': 'spawn',
+    'TIMEOUT': 10,                # seconds a request waits for a render
+    'CACHE_DIR': os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'tts_cache'),
+    'MAX_CACHE_BYTES': 512 * 1024 * 1024,
+}
+
+tts_clips = registry.counter(
+    'ai_tts_clips', 'Spoken answers, by where the audio came from', ('source',)
+)
+
+
+class FakeSynthesizer:
+    """Test synthesizer: 8 kHz silence, 10 ms per character of text"""
+
+    def __init__(self, **options):
+        self.options = options
+
+    def synthesize(self, text, language, voice, path):
+        with wave.open(path, 'wb') as writer:
+            writer.setnchannels(1)
+            writer.setsampwidth(2)
+            writer.setframerate(8000)
+            writer.writeframes(b'\x00\x00' * 80 * len(text))
+
+
+class EspeakSynthesizer:
+    """CPU synthesis with the ``espeak-ng`` command line tool.
+
+    ``voices`` are espeak-ng voice names (``espeak-ng --voices``); the text
+    goes in on stdin, so answers never show up in process listings.
+    """
+
+    def __init__(self, binary='espeak-ng', speed=160, **options):
+        self.binary = shutil.which(binary) or binary
+        self.speed = speed
+
+    def synthesize(self, text, language, voice, path):
+        subprocess.run(
+            [self.binary, '-v', voice, '-s', str(self.speed), '-w', path, '--stdin'],
+            input=text.encode('utf-8'), capture_output=True, check=True, timeout=60,
+        )
+
+
+_synthesizer = None
+
+
+def _init_worker(engine_path, options):
+    global _synthesizer
+    _synthesizer = import_string(engine_path)(**options)
+
+
+def _render(text, language, voice, path, synthesizer=None):
+    """Render to a temporary file and move it into place; returns the clip's size"""
+    partial = f'{path}.{uuid.uuid4().hex}.partial'
+    try:
+        (synthesizer or _synthesizer).synthesize(text, language, voice, partial)
+        os.replace(partial, path)
+    finally:
+        if os.path.exists(partial):
+            os.remove(partial)
+    return os.path.getsize(path)
+
+
+class AudioCache:
+    """Rendered clips on disk, ``<dir>/<id[:2]>/<id>.wav``, trimmed oldest-first past ``max_bytes``"""
+
+    def __init__(self, directory, max_bytes=512 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._size = None
+        self._lock = threading.Lock()
+        # A render landing in another thread may hold the lock at the moment of a fork
+        os.register_at_fork(after_in_child=self._forget_size)
+
+    def _forget_size(self):
+        self._size = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def clip_id(engine, language, voice, text):
+        text_hash = hashlib.sha256(text.encode('utf-8')).hexdigest()
+        return hashlib.sha256(f'{engine}\n{language}\n{voice}\n{text_hash}'.encode('utf-8')).hexdigest()
+
+    def path(self, clip_id):
+        return os.path.join(self.directory, clip_id[:2], f'{clip_id}.wav')
+
+    def prepare(self, clip_id):
+        path = self.path(clip_id)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        return path
+
+    def hit(self, clip_id):
+        """Whether the clip is on disk; marks it recently used"""
+        try:
+            os.utime(self.path(clip_id))
+            return True
+        except FileNotFoundError:
+            return False
+
+    def _files(self):
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                if name.endswith('.wav'):
+                    path = os.path.join(root, name)
+                    try:
+                        stat = os.stat(path)
+                    except FileNotFoundError:
+                        continue
+                    yield stat.st_mtime, stat.st_size, path
+
+    def added(self, size):
+        """Account for a new clip, trimming the cache to 90% when it grows past ``max_bytes``"""
+        with self._lock:
+            if self._size is None:
+                self._size = sum(size for _, size, _ in self._files())
+            else:
+                self._size += size
+            if self._size <= self.max_bytes:
+                return
+            for _, size, path in sorted(self._files()):
+                if self._size <= self.max_bytes * 0.9:
+                    break
+                try:
+                    os.remove(path)
+                    self._size -= size
+                except FileNotFoundError:
+                    pass
+
+    def stats(self):
+        return {'directory': self.directory, 'bytes': self._size, 'max_bytes': self.max_bytes}
+
+
+class SpeechSynthesizer:
+    """Renders answers to cached clips on a pool of worker processes"""
+
+    def __init__(self, engine, cache, options=None, voices=None, processes=2, start_method='spawn', timeout=10):
+        self.engine = engine
+        self.cache = cache
+        self.options = options or {}
+        self.voices = voices or {}
+        self.processes = processes
+        self.timeout = timeout
+        self._context = multiprocessing.get_context(start_method)
+        self._executor = None
+        self._local = None
+        self._lock = threading.Lock()
+        self._in_flight = {}
+        # A process forked from this one (a gunicorn worker of a preloaded
+        # master) inherits the pool object but not its threads or processes
+        os.register_at_fork(after_in_child=self._forget_pool)
+
+    def _forget_pool(self):
+        self._executor = None
+        self._lock = threading.Lock()
+        self._in_flight = {}
+
+    @classmethod
+    def from_settings(cls):
+        """The configured synthesizer, or None when no engine is set"""
+        options = {**DEFAULT_TTS_SETTINGS, **getattr(settings, 'TEXT_TO_SPEECH', {})}
+        if not options['ENGINE']:
+            return None
+        return cls(
+            options['ENGINE'],
+            AudioCache(options['CACHE_DIR'], options['MAX_CACHE_BYTES']),
+            options=options['OPTIONS'],
+            voices=options['VOICES'],
+            processes=options['PROCESSES'],
+            start_method=options['START_METHOD'],
+            timeout=options['TIMEOUT'],
+        )
+
+    def voice(self, language):
+        return self.voices.get(language, language)
+
+    def _submit(self, text, language, voice, path):
+        if self.processes == 0:
+            if self._local is None:
+                self._local = import_string(self.engine)(**self.options)
+            return _render(text, language, voice, path, self._local)
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                self.processes, mp_context=self._context,
+                initializer=_init_worker, initargs=(self.engine, self.options),
+            )
+        return self._executor.submit(_render, text, language, voice, path)
+
+    def render(self, text, language):
+        """``(clip_id, future)`` for the clip of ``text``; the future is None on a cache hit"""
+        voice = self.voice(language)
+        clip_id = self.cache.clip_id(self.engine, language, voice, text)
+        if self.cache.hit(clip_id):
+            return clip_id, None
+        with self._lock:
+            future = self._in_flight.get(clip_id)
+            if future is None:
+                if self.processes == 0:
+                    # Rendered right here, under the lock: identical requests wait for it
+                    future = Future()
+                    try:
+                        future.set_result(self._submit(text, language, voice, self.cache.prepare(clip_id)))
+                    except Exception as e:
+                        future.set_exception(e)
+                else:
+                    try:
+                        future = self._submit(text, language, voice, self.cache.prepare(clip_id))
+                    except BrokenProcessPool:
+                        self._executor = None
+                        future = self._submit(text, language, voice, self.cache.prepare(clip_id))
+                self._in_flight[clip_id] = future
+                new = True
+            else:
+                new = False
+        if new:
+            # Outside the lock: a future that is already done runs the callback right away
+            future.add_done_callback(lambda done: self._landed(clip_id, done))
+        return clip_id, future
+
+    def _landed(self, clip_id, future):
+        with self._lock:
+            self._in_flight.pop(clip_id, None)
+        if future.exception() is None:
+            self.cache.added(future.result())
+        else:
+            logger.error(f"💥 Speech synthesis failed: {future.exception()}")
+            if isinstance(future.exception(), BrokenProcessPool):
+                with self._lock:
+                    self._executor = None
+
+    def clip(self, text, language):
+        """Id of the cached clip for ``text``, rendering it if needed; None if that fails or times out.
+
+        A render that outlives the timeout still finishes and lands in the
+        cache for the next request.
+        """
+        try:
+            clip_id, future = self.render(text, language)
+            if future is None:
+                tts_clips.inc('cache')
+                return clip_id
+            future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            tts_clips.inc('timeout')
+            return None
+        except Exception as e:
+            tts_clips.inc('error')
+            logger.error(f"💥 Speech synthesis failed: {e}")
+            return None
+        tts_clips.inc('synthesized')
+        return clip_id
+
+    async def aclip(self, text, language):
+        """``clip()`` for the async views: waits for the worker without holding a thread"""
+        if self.processes == 0:
+            return await sync_to_async(self.clip, thread_sensitive=False)(text, language)
+        try:
+            clip_id, future = self.render(text, language)
+            if future is None:
+                tts_clips.inc('cache')
+                return clip_id
+            # shield(): a timed-out wait leaves the render running for the cache
+            await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), self.timeout)
+        except (FutureTimeoutError, asyncio.TimeoutError):
+            tts_clips.inc('timeout')
+            return None
+        except Exception as e:
+            tts_clips.inc('error')
+            logger.error(f"💥 Speech synthesis failed: {e}")
+            return None
+        tts_clips.inc('synthesized')
+        return clip_id
+
+    def path(self, clip_id):
+        return self.cache.path(clip_id)
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self):
+        return {
+            'engine': self.engine,
+            'processes': self.processes,
+            'rendering': len(self._in_flight),
+            'cache': self.cache.stats(),
+        }
@@ -0,0 +1,31 @@
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .context import conversation_history
+from .db import configure_sqlite
+from .models import Conversation, TelecomKnowledgeBase
+from .persistence import chat_store
+from .services.retrieval import knowledge_base_index
+
+connection_created.connect(configure_sqlite, dispatch_uid='ai_agent.configure_sqlite')
+
+
+@receiver(post_save, sender=TelecomKnowledgeBase)
+def update_knowledge_base_index(sender, instance, raw=False, **kwargs):
+    # Until the index is first used it will be built from the database anyway
+    if knowledge_base_index.loaded:
+        knowledge_base_index.upsert(instance)
+
+
+@receiver(post_delete, sender=TelecomKnowledgeBase)
+def remove_from_knowledge_base_index(sender, instance, **kwargs):
+    if knowledge_base_index.loaded:
+        knowledge_base_index.remove(instance.pk)
+
+
+@receiver(post_delete, sender=Conversation)
+def forget_conversation_session(sender, instance, **kwargs):
+    chat_store.sessions.discard(instance.session_id)
+    if conversation_history is not None:
+        conversation_history.discard(instance.session_id)
@@ -1,3 +1,1538 @@
-from django.test import TestCase
+import asyncio
+import io
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+import uuid
+import wave
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 
-# Create your tests here.
+from unittest import mock, skipUnless
+
+from django.db import connections
+from django.test import TestCase, TransactionTestCase, override_settings
+
+from . import views, warmup
+from .context import ConversationHistory, conversation_history, estimate_tokens, history_scope
+from .health import ProviderHealthProber, circuit_breaker_states
+from .log import AsyncQueueHandler
+from .metrics import Histogram, MetricsRegistry, ai_fallback_responses, chat_requests, chat_stage_seconds
+from .management.commands._stub_upstream import DelayedUpstream
+from .models import Conversation, Message, TelecomKnowledgeBase
+from .persistence import ChatTurnStore, WriteBehindChatStore, chat_store
+from .services.cache import CachedAIService, DjangoCacheBackend, MemoryCacheBackend, ResponseCache
+from .services.deepseek_service import DeepSeekAIService
+from .services.http_client import close_async_sessions, close_sessions
+from .services.intent import KeywordIntentClassifier, keyword_classifier
+from .services.intent_model import (
+    NgramIntentClassifier, get_intent_classifier, set_intent_classifier, train_intent_classifier,
+)
+from .services import mock_ai_service
+from .services.mock_ai_service import MockAIService, RESPONSES
+from .services.prompts import PromptRegistry, prompt_registry
+from .services.resilience import CircuitBreaker, ResilientAIService, current_provider, deadline_scope, hedged_requests
+from .services.router import LazyProvider, ProviderRoute, ProviderRouter
+from .services.singleflight import SingleFlightAIService, coalesced_requests
+from .services.speech import AudioFormatError, SpeechBusyError, SpeechRecognitionError, SpeechWorkerPool, pcm_audio
+from .services.tts import AudioCache, SpeechSynthesizer, tts_clips
+from .services.retrieval import get_knowledge_base_index, knowledge_base_index
+from .services.text import normalize_text
+
+
+class ChatTestCase(TestCase):
+    """Forgets cached sessions and their history buffers; each test rolls the database back"""
+
+    def setUp(self):
+        chat_store.sessions.clear()
+        conversation_history.clear()
+        # Both are built from the database on first use; keep that out of query counts
+        get_knowledge_base_index()
+        get_intent_classifier()
+
+
+class KeywordIntentClassifierTests(TestCase):
+    def test_classifies_each_language(self):
+        self.assertEqual(keyword_classifier.classify('How do I check my balance?').intent, 'balance')
+        self.assertEqual(keyword_classifier.classify('بسته های اینترنتی').intent, 'package')
+        self.assertEqual(keyword_classifier.classify('د شبکې پوښښ').intent, 'coverage')
+
+    def test_priority_follows_keyword_order(self):
+        match = keyword_classifier.classify('Hello, my SIM is blocked')
+        self.assertEqual(match.intent, 'greeting')
+        self.assertEqual(match.confidence, 0.5)
+
+    def test_unknown_message_is_default(self):
+        match = keyword_classifier.classify('When does the office open?')
+        self.assertEqual(match, ('default', 0.0))
+
+    def test_custom_keywords(self):
+        classifier = KeywordIntentClassifier((('roaming', ('roaming',)),))
+        self.assertEqual(classifier.classify('ROAMING abroad'), ('roaming', 1.0))
+
+
+class NgramIntentClassifierTests(ChatTestCase):
+    fixtures = ['knowledge_base']
+
+    def setUp(self):
+        super().setUp()
+        self.classifier = train_intent_classifier()
+        set_intent_classifier(self.classifier)
+        self.addCleanup(set_intent_classifier, None)
+
+    def test_classifies_all_languages(self):
+        for message, intent in (
+            ('How can I check my balance please?', 'balance'),
+            ('بسته های انټرنتی', 'package'),
+            ('سلام', 'greeting'),
+            ('د سیم ثبت', 'sim'),
+        ):
+            match = self.classifier.classify(message)
+            self.assertEqual(match.intent, intent, message)
+            self.assertGreater(match.confidence, 0.5)
+        self.assertEqual(self.classifier.classify('?!'), ('default', 0.0))
+
+    def test_batch_matches_single_messages(self):
+        messages = ['hello', '', 'internet packages', 'zzz', 'پوشش شبکه']
+        self.assertEqual(self.classifier.classify_batch(messages), [self.classifier.classify(m) for m in messages])
+
+    def test_saved_model_is_loaded(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'intent.npz')
+            self.classifier.save(path)
+            set_intent_classifier(None)
+            with self.settings(INTENT_CLASSIFIER={'MODEL_FILE': path}):
+                loaded = get_intent_classifier()
+        self.assertIsInstance(loaded, NgramIntentClassifier)
+        self.assertEqual(loaded.intents, self.classifier.intents)
+        self.assertEqual(loaded.classify('my balance'), self.classifier.classify('my balance'))
+
+    def test_user_messages_store_intent(self):
+        self.client.post('/api/chat/', {'message': 'Which internet packages do you offer?', 'session_id': 'intent'})
+        user_msg = Message.objects.get(conversation__session_id='intent', is_user=True)
+        self.assertEqual(user_msg.intent, 'package')
+        self.assertGreater(user_msg.confidence, 0.5)
+        self.assertEqual(Message.objects.get(conversation__session_id='intent', is_user=False).intent, '')
+
+
+class MockAIServiceTests(TestCase):
+    def test_response_comes_from_classified_table(self):
+        service = MockAIService()
+        response = service.generate_response('balance', 'ps')
+        self.assertIn(response, RESPONSES['ps']['balance'])
+
+    def test_response_tables_are_read_only(self):
+        with self.assertRaises(TypeError):
+            RESPONSES['en']['balance'] = ()
+
+
+class StubUpstream:
+    """Local stand-in for the DeepSeek chat completions API.
+
+    ``statuses`` is consumed one entry per request before falling back to 200,
+    which lets tests inject 429/5xx responses (sent with ``retry_after`` as
+    their Retry-After header when given); ``delays`` likewise holds seconds
+    to stall chat completion requests before answering.
+    """
+
+    def __init__(self, content='Stub answer', statuses=(), chunks=None, delays=(), retry_after=None):
+        self.content = content
+        self.retry_after = retry_after
+        self.chunks = chunks or [content]
+        self.statuses = list(statuses)
+        self.delays = list(delays)
+        self.requests = 0
+        self.connections = set()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length', 0))
+                self.server.last_payload = json.loads(self.rfile.read(length) or b'{}')
+                stub.requests += 1
+                stub.connections.add(self.client_address)
+                status = stub.statuses.pop(0) if stub.statuses else 200
+                time.sleep(stub.delays.pop(0) if stub.delays else 0)
+                if status == 200 and self.server.last_payload.get('stream'):
+                    return self.stream_chunks()
+                body = json.dumps({'choices': [{'message': {'content': stub.content}}]}).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                if status != 200 and stub.retry_after is not None:
+                    self.send_header('Retry-After', str(stub.retry_after))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                stub.requests += 1
+                self.server.last_path = self.path
+                status = stub.statuses.pop(0) if stub.statuses else 200
+                body = json.dumps({'data': [{'id': 'deepseek-chat'}]}).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def stream_chunks(self):
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/event-stream')
+                self.send_header('Connection', 'close')
+                self.end_headers()
+                for chunk in stub.chunks:
+                    event = {'choices': [{'delta': {'content': chunk}}]}
+                    self.wfile.write(f"data: {json.dumps(event)}\n\n".encode())
+                    self.wfile.flush()
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.close_connection = True
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        # Clients cut off by a deadline close the socket before the stalled reply is written
+        self.server.handle_error = lambda request, client_address: None
+        self.url = f'http://127.0.0.1:{self.server.server_port}/v1/chat/completions'
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@override_settings(DEEPSEEK_API_KEY='test-key', DEEPSEEK_BACKOFF_FACTOR=0)
+class DeepSeekSessionTests(TestCase):
+    def setUp(self):
+        close_sessions()
+        self.addCleanup(close_sessions)
+
+    def test_connection_is_reused_across_calls(self):
+        with StubUpstream() as upstream, self.settings(DEEPSEEK_BASE_URL=upstream.url):
+            service = DeepSeekAIService()
+            for _ in range(1000):
+                self.assertEqual(service.generate_response('balance', 'en'), 'Stub answer')
+        self.assertEqual(upstream.requests, 1000)
+        self.assertEqual(len(upstream.connections), 1)
+
+    def test_retries_rate_limited_and_server_errors(self):
+        with StubUpstream(statuses=[429, 503]) as upstream, self.settings(DEEPSEEK_BASE_URL=upstream.url):
+            response = DeepSeekAIService().generate_response('balance', 'en')
+        self.assertEqual(response, 'Stub answer')
+        self.assertEqual(upstream.requests, 3)
+
+    def test_retries_stop_at_the_request_deadline(self):
+        with StubUpstream(statuses=[429], retry_after=30) as upstream, self.settings(DEEPSEEK_BASE_URL=upstream.url):
+            service = DeepSeekAIService()
+            start = time.perf_counter()
+            with deadline_scope(0.5):
+                response = service.generate_response('balance', 'en')
+            self.assertLess(time.perf_counter() - start, 0.5)
+        self.assertEqual(response, service.get_fallback_response('en'))
+        self.assertEqual(upstream.requests, 1)
+
+    def test_falls_back_when_retries_are_exhausted(self):
+        with StubUpstream(statuses=[500] * 5) as upstream, self.settings(DEEPSEEK_BASE_URL=upstream.url):
+            service = DeepSeekAIService()
+            response = service.generate_response('balance', 'fa')
+        self.assertEqual(response, service.get_fallback_response('fa'))
+
+
+@override_settings(DEEPSEEK_API_KEY='test-key', DEEPSEEK_BACKOFF_FACTOR=0)
+class ChatStreamTests(ChatTestCase):
+    def setUp(self):
+        super().setUp()
+        close_sessions()
+        self.addCleanup(close_sessions)
+
+    def read_events(self, response):
+        body = b''.join(response.streaming_content).decode()
+        return [block for block in body.split('\n\n') if block]
+
+    def test_deepseek_stream_yields_tokens_in_order(self):
+        with StubUpstream(chunks=['Dial ', '*123#', ' now']) as upstream, self.settings(DEEPSEEK_BASE_URL=upstream.url):
+            tokens = list(DeepSeekAIService().stream_response('balance', 'en'))
+        self.assertEqual(tokens, ['Dial ', '*123#', ' now'])
+
+    def test_deepseek_stream_falls_back_on_upstream_error(self):
+        with StubUpstream(statuses=[400]) as upstream, self.settings(DEEPSEEK_BASE_URL=upstream.url):
+            service = DeepSeekAIService()
+            tokens = list(service.stream_response('balance', 'ps'))
+        self.assertEqual(tokens, [service.get_fallback_response('ps')])
+
+    def test_stream_endpoint_relays_tokens_and_persists_reply(self):
+        with StubUpstream(chunks=['Dial ', '*123#']) as upstream, self.settings(DEEPSEEK_BASE_URL=upstream.url):
+            with mock.patch.object(views, 'ai_service', DeepSeekAIService()):
+                response = self.client.post('/api/chat/stream/', {'message': 'balance', 'session_id': 's1'})
+                self.assertEqual(response['Content-Type'], 'text/event-stream')
+                events = self.read_events(response)
+
+        self.assertEqual(events[0], 'data: {"token": "Dial "}')
+        self.assertEqual(events[1], 'data: {"token": "*123#"}')
+        self.assertTrue(events[2].startswith('event: done\n'))
+        self.assertEqual(
+            list(Message.objects.values_list('content', 'is_user')),
+            [('balance', True), ('Dial *123#', False)],
+        )
+
+    def test_stream_endpoint_with_mock_service(self):
+        response = self.client.post('/api/chat/stream/', {'message': 'sim', 'language': 'fa'})
+        events = self.read_events(response)
+        tokens = [json.loads(event[len('data: '):])['token'] for event in events[:-1]]
+        self.assertIn(''.join(tokens), RESPONSES['fa']['sim'])
+        self.assertEqual(Message.objects.get(is_user=False).content, ''.join(tokens))
+
+
+@override_settings(DEEPSEEK_API_KEY='test-key', DEEPSEEK_BACKOFF_FACTOR=0)
+class AsyncChatTests(ChatTestCase):
+    async def test_async_chat_endpoint_persists_both_turns(self):
+        response = await self.async_client.post(
+            '/api/async/chat/',
+            {'message': 'balance', 'session_id': 'async-1', 'language': 'fa'},
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(response.json()['response'], RESPONSES['fa']['balance'])
+        self.assertEqual(await Message.objects.filter(conversation__session_id='async-1').acount(), 2)
+
+    async def test_async_chat_validates_input(self):
+        response = await self.async_client.post('/api/async/chat/', {}, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('message', response.json())
+
+    async def test_async_chat_rejects_get(self):
+        response = await self.async_client.get('/api/async/chat/')
+        self.assertEqual(response.status_code, 405)
+
+    async def test_async_voice_chat_updates_conversation(self):
+        response = await self.async_client.post(
+            '/api/async/voice-chat/',
+            {'text': 'network coverage', 'session_id': 'voice-1'},
+            content_type='application/json',
+        )
+        self.assertEqual(response.json()['original_text'], 'network coverage')
+        self.assertTrue(await Conversation.objects.filter(session_id='voice-1').aexists())
+
+    async def test_deepseek_async_calls_run_concurrently(self):
+        with DelayedUpstream(delay=0.2, content='Async answer') as upstream, self.settings(DEEPSEEK_BASE_URL=upstream.url):
+            service = DeepSeekAIService()
+            start = time.perf_counter()
+            responses = await asyncio.gather(*(service.agenerate_response('hi', 'en') for _ in range(50)))
+            elapsed = time.perf_counter() - start
+            await close_async_sessions()
+
+        self.assertEqual(set(responses), {'Async answer'})
+        self.assertEqual(upstream.max_in_flight, 50)
+        self.assertLess(elapsed, 2)
+
+    async def test_deepseek_async_falls_back_after_retries(self):
+        with StubUpstream(statuses=[503] * 5) as upstream, self.settings(DEEPSEEK_BASE_URL=upstream.url):
+            service = DeepSeekAIService()
+            response = await service.agenerate_response('hi', 'ps')
+            await close_async_sessions()
+        self.assertEqual(response, service.get_fallback_response('ps'))
+        self.assertEqual(upstream.requests, 3)
+
+
+class CountingService:
+    def __init__(self, response='Dial *123#'):
+        self.response = response
+        self.calls = 0
+
+    def generate_response(self, message, language='en'):
+        self.calls += 1
+        return self.response
+
+    def get_fallback_response(self, language):
+        return 'Please try again later'
+
+
+class ResponseCacheTests(TestCase):
+    def test_normalize_text(self):
+        self.assertEqual(normalize_text('  What is *123#?? '), 'what is 123')
+        self.assertEqual(normalize_text('بيلانس من؟'), 'بیلانس من')
+        self.assertEqual(normalize_text('مي\u200cخواهم ۱۲۳'), 'می خواهم 123')
+
+    def test_equivalent_questions_share_an_entry(self):
+        service = CountingService()
+        cached = CachedAIService(service, ResponseCache(MemoryCacheBackend()))
+        cached.generate_response('What is my balance?', 'en')
+        cached.generate_response('what is my   BALANCE', 'en')
+        cached.generate_response('what is my balance', 'fa')
+        self.assertEqual(service.calls, 2)
+        self.assertEqual(cached.cache.stats(), {'hits': 1, 'misses': 2, 'bypassed': 0, 'hit_ratio': 0.3333})
+
+    def test_lru_eviction_and_ttl(self):
+        backend = MemoryCacheBackend(max_entries=2)
+        backend.set('a', 1, ttl=60)
+        backend.set('b', 2, ttl=60)
+        backend.get('a')
+        backend.set('c', 3, ttl=60)
+        self.assertIsNone(backend.get('b'))
+        self.assertEqual(backend.get('a'), 1)
+
+        with mock.patch('ai_agent.services.cache.time.monotonic', return_value=time.monotonic() + 120):
+            self.assertIsNone(backend.get('a'))
+        self.assertEqual(len(backend), 1)
+
+    def test_excluded_intents_bypass_the_cache(self):
+        service = CountingService()
+        cached = CachedAIService(service, ResponseCache(MemoryCacheBackend(), exclude_intents=['balance']))
+        cached.generate_response('balance', 'en')
+        cached.generate_response('balance', 'en')
+        self.assertEqual(service.calls, 2)
+        self.assertEqual(cached.cache.bypassed, 2)
+
+    def test_answers_with_session_history_are_not_shared(self):
+        service = CountingService()
+        cached = CachedAIService(service, ResponseCache(MemoryCacheBackend()))
+        alice = [{'role': 'user', 'content': 'My account is 0700123456'}, {'role': 'assistant', 'content': 'Noted'}]
+        with mock.patch('ai_agent.services.cache.history_messages', return_value=alice):
+            cached.generate_response('what is my number', 'en')
+        cached.generate_response('what is my number', 'en')
+        self.assertEqual(service.calls, 2)
+        self.assertEqual(cached.cache.stats()['hits'], 0)
+        self.assertEqual(cached.cache.bypassed, 1)
+
+    def test_fallback_answers_are_not_cached(self):
+        service = CountingService(response='Please try again later')
+        cached = CachedAIService(service, ResponseCache(MemoryCacheBackend()))
+        cached.generate_response('balance', 'en')
+        cached.generate_response('balance', 'en')
+        self.assertEqual(service.calls, 2)
+
+    def test_django_cache_backend(self):
+        service = CountingService()
+        cached = CachedAIService(service, ResponseCache(DjangoCacheBackend('default')))
+        cached.cache.backend.clear()
+        self.assertEqual(cached.generate_response('sim card', 'ps'), 'Dial *123#')
+        self.assertEqual(cached.generate_response('SIM card!', 'ps'), 'Dial *123#')
+        self.assertEqual(service.calls, 1)
+
+
+class KnowledgeBaseRetrievalTests(ChatTestCase):
+    fixtures = ['knowledge_base']
+
+    def setUp(self):
+        super().setUp()
+        knowledge_base_index.reset()
+        self.addCleanup(knowledge_base_index.reset)
+
+    def test_matches_questions_in_every_language(self):
+        index = get_knowledge_base_index()
+        self.assertEqual(index.search('how can I check my balance').category, 'balance')
+        self.assertEqual(index.search('سیم کارت خود را ثبت کنم').category, 'sim')
+        self.assertEqual(index.search('ستاسو د شبکې پوښښ چیرته دی').category, 'coverage')
+
+    def test_unrelated_message_scores_low(self):
+        match = get_knowledge_base_index().search('What is the weather like today?')
+        self.assertLess(match.score, 0.6)
+
+    def test_index_follows_saves_and_deletes(self):
+        index = get_knowledge_base_index()
+        entry = TelecomKnowledgeBase.objects.create(
+            question_en='Do you offer roaming abroad?', question_dari='رومینگ', question_pashto='رومینګ',
+            answer_en='Roaming works in 40 countries.', answer_dari='رومینگ', answer_pashto='رومینګ',
+            category='technical',
+        )
+        self.assertEqual(index.search('roaming abroad').entry_id, entry.pk)
+
+        entry.delete()
+        match = index.search('roaming abroad')
+        self.assertTrue(match is None or match.entry_id != entry.pk)
+
+    def test_chat_answers_from_knowledge_base(self):
+        response = self.client.post('/api/chat/', {'message': 'How do I register my SIM card?', 'language': 'ps'})
+        self.assertEqual(response.data['ai_provider'], 'knowledge_base')
+        self.assertEqual(response.data['response'], TelecomKnowledgeBase.objects.get(pk=6).answer_pashto)
+
+    def test_chat_falls_through_to_ai_service(self):
+        response = self.client.post('/api/chat/', {'message': 'hello there'})
+        self.assertEqual(response.data['ai_provider'], 'mock')
+
+    @override_settings(KNOWLEDGE_BASE_RETRIEVAL={'ENABLED': False})
+    def test_retrieval_can_be_disabled(self):
+        response = self.client.post('/api/chat/', {'message': 'How do I register my SIM card?'})
+        self.assertEqual(response.data['ai_provider'], 'mock')
+
+
+class ConversationHistoryTests(TestCase):
+    def setUp(self):
+        self.conversation = Conversation.objects.create(session_id='history')
+        Message.objects.bulk_create(
+            [Message(conversation=self.conversation, content=f'm{index}') for index in range(7)]
+        )
+        self.url = '/api/conversations/history/messages/'
+
+    def test_walks_all_pages_in_order(self):
+        contents, url = [], f'{self.url}?page_size=3'
+        while url:
+            with self.assertNumQueries(2):
+                data = self.client.get(url).data
+            contents.extend(message['content'] for message in data['results'])
+            url = data['next']
+        self.assertEqual(contents, [f'm{index}' for index in range(7)])
+
+    def test_descending_order(self):
+        data = self.client.get(f'{self.url}?page_size=2&order=desc').data
+        self.assertEqual([message['content'] for message in data['results']], ['m6', 'm5'])
+        data = self.client.get(f"{self.url}?page_size=2&order=desc&cursor={data['next_cursor']}").data
+        self.assertEqual([message['content'] for message in data['results']], ['m4', 'm3'])
+
+    def test_unknown_conversation(self):
+        self.assertEqual(self.client.get('/api/conversations/missing/messages/').status_code, 404)
+
+    def test_invalid_cursor(self):
+        self.assertEqual(self.client.get(f'{self.url}?cursor=not-a-cursor').status_code, 400)
+
+
+class ChatPersistenceTests(ChatTestCase):
+    def test_hot_session_costs_one_insert(self):
+        self.client.post('/api/chat/', {'message': 'hello', 'session_id': 'hot'})
+        with self.assertNumQueries(1):
+            response = self.client.post('/api/chat/', {'message': 'balance', 'session_id': 'hot'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Message.objects.filter(conversation__session_id='hot').count(), 4)
+        self.assertEqual(response.data['message_id'], str(Message.objects.get(content=response.data['response']).id))
+
+    def test_language_change_updates_only_the_language(self):
+        self.client.post('/api/chat/', {'message': 'hello', 'session_id': 'lang'})
+        # A provider call (here for the single-flight key) reads a cold session's history once
+        conversation_history.load('lang')
+        with self.assertNumQueries(2):
+            self.client.post('/api/chat/', {'message': 'balance', 'session_id': 'lang', 'language': 'ps'})
+        self.assertEqual(Conversation.objects.get(session_id='lang').user_language, 'ps')
+
+    def test_cold_session_resolves_conversation_once(self):
+        Conversation.objects.create(session_id='cold', user_language='fa')
+        conversation_history.load('cold')
+        with self.assertNumQueries(2):
+            self.client.post('/api/chat/', {'message': 'balance', 'session_id': 'cold', 'language': 'fa'})
+        self.assertEqual(Conversation.objects.count(), 1)
+
+    def test_turns_keep_their_order(self):
+        user_msg, ai_msg = chat_store.save_turn('order', 'en', 'question', 'answer')
+        self.assertLess(user_msg.id, ai_msg.id)
+        self.assertEqual(
+            list(Message.objects.filter(conversation__session_id='order').values_list('content', 'is_user')),
+            [('question', True), ('answer', False)],
+        )
+
+    def test_deleted_conversation_is_recreated(self):
+        chat_store.save_turn('gone', 'en', 'q1', 'a1')
+        Conversation.objects.filter(session_id='gone').delete()
+        chat_store.save_turn('gone', 'en', 'q2', 'a2')
+        self.assertEqual(Message.objects.filter(conversation__session_id='gone').count(), 2)
+
+
+class ConcurrencyProbeService(CountingService):
+    """Records how many calls overlap"""
+
+    def __init__(self, delay=0.05):
+        super().__init__()
+        self.delay = delay
+        self.in_flight = 0
+        self.peak = 0
+        self.lock = threading.Lock()
+
+    def generate_response(self, message, language='en'):
+        with self.lock:
+            self.calls += 1
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+        time.sleep(self.delay)
+        with self.lock:
+            self.in_flight -= 1
+        return f'answer to {message}'
+
+
+class ChatBatchTests(ChatTestCase):
+    def post_batch(self, items):
+        return self.client.post('/api/chat/batch/', {'items': items}, content_type='application/json')
+
+    def test_identical_questions_are_answered_once(self):
+        service = ConcurrencyProbeService(delay=0)
+        with mock.patch.object(views, 'ai_service', service):
+            response = self.post_batch([
+                {'message': 'zzz Balance?', 'session_id': 'b1'},
+                {'message': 'zzz balance', 'session_id': 'b2'},
+                {'session_id': 'b3'},
+                {'message': 'zzz other', 'session_id': 'b1', 'language': 'fa'},
+            ])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(service.calls, 2)
+        self.assertEqual(response.data['unique_messages'], 2)
+        results = response.data['results']
+        self.assertEqual([result['status'] for result in results], ['success', 'success', 'error', 'success'])
+        self.assertEqual(results[0]['response'], results[1]['response'])
+        self.assertIn('message', results[2]['errors'])
+        self.assertEqual(Message.objects.count(), 6)
+        self.assertEqual(Conversation.objects.get(session_id='b1').user_language, 'fa')
+        self.assertEqual(results[3]['message_id'], str(Message.objects.get(content='answer to zzz other').id))
+
+    def test_one_insert_for_all_messages(self):
+        items = [{'message': f'zzz {index}', 'session_id': f'bulk-{index % 3}'} for index in range(6)]
+        with mock.patch.object(views, 'ai_service', CountingService()):
+            # Cold sessions: lookup, insert conversations, read their ids back, insert messages
+            with self.assertNumQueries(4):
+                self.post_batch(items)
+            with self.assertNumQueries(1):
+                response = self.post_batch(items)
+        self.assertEqual(Message.objects.count(), 24)
+        user_msg = Message.objects.filter(is_user=True, content='zzz 1').first()
+        self.assertEqual((user_msg.intent, user_msg.confidence), ('default', 0.0))
+        self.assertTrue(all(result['status'] == 'success' for result in response.data['results']))
+
+    def test_concurrency_is_bounded(self):
+        service = ConcurrencyProbeService()
+        items = [{'message': f'zzz {index}'} for index in range(6)]
+        with mock.patch.object(views, 'ai_service', service), self.settings(
+            CHAT_BATCH={'MAX_ITEMS': 10, 'MAX_CONCURRENCY': 2}
+        ):
+            self.post_batch(items)
+            too_many = self.post_batch(items * 2)
+        self.assertEqual(service.calls, 6)
+        self.assertEqual(service.peak, 2)
+        self.assertEqual(too_many.status_code, 400)
+
+
+class WriteBehindChatStoreTests(TransactionTestCase):
+    def make_store(self, **kwargs):
+        store = WriteBehindChatStore(**kwargs)
+        self.addCleanup(store.stop)
+        return store
+
+    def test_background_writer_batches_turns(self):
+        store = self.make_store(batch_size=50, flush_interval=0.2)
+        for index in range(120):
+            user_msg, ai_msg = store.save_turn('burst', 'en', f'q{index}', f'a{index}')
+        self.assertIsNone(ai_msg.id)
+        store.flush()
+
+        self.assertEqual(store.stats()['written'], 120)
+        self.assertEqual(
+            list(Message.objects.order_by('id').values_list('content', 'is_user')[:2]),
+            [('q0', True), ('a0', False)],
+        )
+        self.assertEqual(Message.objects.count(), 240)
+
+    def test_full_queue_writes_synchronously_and_stop_drains(self):
+        store = self.make_store(queue_size=1, put_timeout=0.01)
+        with mock.patch.object(store, 'start'):
+            store.save_turn('full', 'en', 'queued', 'a1')
+            store.save_turn('full', 'en', 'direct', 'a2')
+        self.assertEqual(list(Message.objects.values_list('content', flat=True)), ['direct', 'a2'])
+
+        store.start()
+        store.stop()
+        self.assertEqual(Message.objects.count(), 4)
+        self.assertEqual(store.stats()['queued'], 1)
+        self.assertEqual(store.stats()['synchronous'], 1)
+
+    def test_failed_batch_is_retried_turn_by_turn(self):
+        store = self.make_store()
+        good = store.build_messages(store.resolve_conversation('ok', 'en'), 'q', 'a')
+        orphan = store.build_messages(uuid.uuid4(), 'lost', 'lost')
+        store.write_batch([good, orphan])
+
+        self.assertEqual(list(Message.objects.values_list('content', flat=True)), ['q', 'a'])
+        self.assertEqual((store.written, store.failed), (1, 1))
+
+    def test_chat_endpoint_returns_before_the_write(self):
+        store = self.make_store()
+        with mock.patch.object(views, 'chat_store', store):
+            response = self.client.post('/api/chat/', {'message': 'balance', 'session_id': 'wb'})
+            store.flush()
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(response.data['message_id'])
+        self.assertEqual(Message.objects.filter(conversation__session_id='wb').count(), 2)
+
+
+class SQLiteTuningTests(TestCase):
+    def pragmas(self, *names):
+        # A fresh connection, so connection_created fires under the overridden settings
+        new_connection = connections.create_connection('default')
+        self.addCleanup(new_connection.close)
+        with new_connection.cursor() as cursor:
+            values = []
+            for name in names:
+                cursor.execute(f'PRAGMA {name}')
+                values.append(cursor.fetchone()[0])
+        return values
+
+    @override_settings(SQLITE_PRAGMAS={'busy_timeout': 12345, 'synchronous': 'NORMAL'})
+    def test_connection_created_hook_applies_pragmas(self):
+        self.assertEqual(self.pragmas('busy_timeout', 'synchronous'), [12345, 1])
+
+    @override_settings(SQLITE_PRAGMAS={})
+    def test_dev_profile_leaves_connection_alone(self):
+        self.assertEqual(self.pragmas('synchronous'), [2])
+
+
+class AsyncLoggingTests(TestCase):
+    def make_handler(self, **kwargs):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        handler = AsyncQueueHandler(
+            os.path.join(directory.name, 'app.log'), flush_interval=0, lean_records=False, **kwargs
+        )
+        self.addCleanup(handler.close)
+        logger = logging.getLogger(f'ai_agent.tests.{self._testMethodName}')
+        logger.propagate = False
+        logger.addHandler(handler)
+        self.addCleanup(logger.removeHandler, handler)
+        return handler, logger
+
+    def read_lines(self, handler):
+        filename = handler.listener.handlers[0].baseFilename
+        handler.close()
+        with open(filename, encoding='utf-8') as log_file:
+            return [json.loads(line) for line in log_file]
+
+    def test_writes_truncated_json_with_context(self):
+        handler, logger = self.make_handler(max_chars=20)
+        logger.warning('Message: %s', 'x' * 100, extra={'session_id': 's1', 'latency_ms': 12.5})
+        [entry] = self.read_lines(handler)
+        self.assertEqual(entry['message'], 'Message: xxxxxxxxxxx…')
+        self.assertEqual((entry['level'], entry['session_id'], entry['latency_ms']), ('WARNING', 's1', 12.5))
+
+    def test_message_is_rendered_by_the_listener(self):
+        handler, logger = self.make_handler()
+        with mock.patch.object(handler.queue, 'put_nowait') as put:
+            logger.warning('%s', 'body')
+        record = put.call_args.args[0]
+        self.assertEqual((record.msg, record.args), ('%s', ('body',)))
+
+    def test_records_keep_caller_details_by_default(self):
+        handler, _ = self.make_handler()
+        directory = os.path.dirname(handler.listener.handlers[0].baseFilename)
+        AsyncQueueHandler(os.path.join(directory, 'default.log'), flush_interval=0).close()
+        self.assertIsNotNone(logging._srcfile)
+        self.assertTrue(logging.logThreads)
+
+    @skipUnless(hasattr(os, 'fork'), 'needs fork()')
+    def test_forked_child_writes_its_own_file(self):
+        handler, logger = self.make_handler()
+        logger.warning('parent')
+        pid = os.fork()
+        if pid == 0:
+            try:
+                logger.warning('child')
+                handler.close()
+            finally:
+                os._exit(0)
+        os.waitpid(pid, 0)
+        root, ext = os.path.splitext(handler.filename)
+        with open(f'{root}.{pid}{ext}', encoding='utf-8') as child_log:
+            self.assertEqual([json.loads(line)['message'] for line in child_log], ['child'])
+        self.assertEqual([entry['message'] for entry in self.read_lines(handler)], ['parent'])
+
+    def test_full_queue_drops_instead_of_blocking(self):
+        handler, logger = self.make_handler(queue_size=1)
+        handler.listener.stop()   # nothing drains the queue any more
+        logger.warning('kept')
+        logger.warning('dropped')
+        self.assertEqual(handler.dropped, 1)
+
+
+class MetricsTests(ChatTestCase):
+    def test_histogram_renders_cumulative_buckets(self):
+        registry = MetricsRegistry()
+        histogram = registry.register(Histogram('latency_seconds', 'Latency', ('stage',), buckets=(0.1, 1)))
+        for value in (0.05, 0.1, 0.5, 3):
+            histogram.observe(value, 'generate')
+        self.assertEqual(registry.render().splitlines(), [
+            '# HELP latency_seconds Latency',
+            '# TYPE latency_seconds histogram',
+            'latency_seconds_bucket{stage="generate",le="0.1"} 2',
+            'latency_seconds_bucket{stage="generate",le="1"} 3',
+            'latency_seconds_bucket{stage="generate",le="+Inf"} 4',
+            'latency_seconds_sum{stage="generate"} 3.65',
+            'latency_seconds_count{stage="generate"} 4',
+        ])
+
+    def test_counter_family_is_named_like_its_samples(self):
+        registry = MetricsRegistry()
+        registry.counter('answers', 'Answers', ('provider',)).inc('mock')
+        self.assertEqual(registry.render().splitlines(), [
+            '# HELP answers_total Answers',
+            '# TYPE answers_total counter',
+            'answers_total{provider="mock"} 1',
+        ])
+
+    def test_chat_request_records_stages_and_counters(self):
+        before = chat_requests.value('chat', 'balance', 'ps', 'mock')
+        stages = {stage: chat_stage_seconds.count('chat', stage) for stage in ('validate', 'generate', 'persist', 'total')}
+        self.client.post('/api/chat/', {'message': 'check my balance', 'language': 'ps'})
+        self.assertEqual(chat_requests.value('chat', 'balance', 'ps', 'mock'), before + 1)
+        for stage, count in stages.items():
+            self.assertEqual(chat_stage_seconds.count('chat', stage), count + 1, stage)
+
+    @override_settings(DEEPSEEK_API_KEY='test-key', DEEPSEEK_BACKOFF_FACTOR=0)
+    def test_fallback_answers_are_counted(self):
+        before = ai_fallback_responses.value('deepseek', 'generate_response')
+        with StubUpstream(statuses=[400]) as upstream, self.settings(DEEPSEEK_BASE_URL=upstream.url):
+            DeepSeekAIService().generate_response('balance', 'en')
+        close_sessions()
+        self.assertEqual(ai_fallback_responses.value('deepseek', 'generate_response'), before + 1)
+
+    def test_metrics_endpoint(self):
+        self.client.post('/api/chat/', {'message': 'hello'})
+        response = self.client.get('/api/metrics')
+        self.assertEqual(response['Content-Type'], 'text/plain; version=0.0.4; charset=utf-8')
+        body = response.content.decode()
+        self.assertIn('# TYPE chat_stage_seconds histogram', body)
+        self.assertIn('chat_requests_total{endpoint="chat",intent="greeting",language="en",provider="mock"}', body)
+        self.assertIn('ai_provider_request_seconds_count{provider="mock",method="generate_response"}', body)
+        # Every sample belongs to the family declared by the TYPE line before it
+        family = None
+        for line in body.splitlines():
+            if line.startswith('# TYPE '):
+                family = line.split()[2]
+            elif not line.startswith('#'):
+                name = line.split('{')[0].split(' ')[0]
+                self.assertIn(name, {family, f'{family}_bucket', f'{family}_sum', f'{family}_count'})
+
+
+class SlowHealthService:
+    def __init__(self, delay=0.0, healthy=True):
+        self.delay = delay
+        self.healthy = healthy
+        self.checks = 0
+
+    def check_health(self):
+        self.checks += 1
+        time.sleep(self.delay)
+        if isinstance(self.healthy, Exception):
+            raise self.healthy
+        return self.healthy
+
+
+class HealthProbeTests(TestCase):
+    def use_prober(self, service, **kwargs):
+        prober = ProviderHealthProber(service, **kwargs)
+        self.addCleanup(prober.stop)
+        patcher = mock.patch.object(views, 'provider_prober', prober)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return prober
+
+    def test_liveness_does_no_io(self):
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/health/live/')
+        self.assertEqual(response.json(), {'status': 'alive'})
+
+    def test_readiness_never_waits_for_the_provider(self):
+        service = SlowHealthService(delay=0.5)
+        self.use_prober(service, interval=60)
+        start = time.perf_counter()
+        data = self.client.get('/api/health/ready/').json()
+        self.assertLess(time.perf_counter() - start, 0.25)
+        self.assertEqual((data['status'], data['database'], data['ai_provider']['status']), ('ready', 'ok', 'unknown'))
+
+    def test_readiness_reports_cached_provider_failure(self):
+        prober = self.use_prober(SlowHealthService(healthy=ConnectionError('refused')))
+        prober.probe()
+        response = self.client.get('/api/health/ready/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['status'], 'degraded')
+        self.assertEqual(response.json()['ai_provider']['error'], 'refused')
+
+    def test_readiness_fails_without_database(self):
+        with mock.patch.object(views, 'database_status', return_value='unable to open database file'):
+            response = self.client.get('/api/health/ready/')
+        self.assertEqual(response.status_code, 503)
+
+    def test_stale_result_is_flagged(self):
+        prober = ProviderHealthProber(SlowHealthService(), stale_after=10)
+        prober.probe()
+        with mock.patch('ai_agent.health.time.time', return_value=time.time() + 60):
+            self.assertEqual(prober.state().status, 'stale')
+
+    def test_legacy_health_endpoint_does_not_generate(self):
+        self.use_prober(SlowHealthService(), interval=60)
+        with mock.patch.object(views.ai_service, 'generate_response') as generate:
+            response = self.client.get('/api/health/')
+        generate.assert_not_called()
+        self.assertEqual(response.data['status'], 'healthy')
+        self.assertEqual(response.data['message'], 'Answering with mock (failover routing)')
+
+    @override_settings(DEEPSEEK_API_KEY='test-key')
+    def test_deepseek_health_check_lists_models(self):
+        with StubUpstream(statuses=[200, 401]) as upstream, self.settings(DEEPSEEK_BASE_URL=upstream.url):
+            service = DeepSeekAIService()
+            self.assertTrue(service.check_health())
+            self.assertFalse(service.check_health())
+        close_sessions()
+        self.assertEqual(upstream.server.last_path, '/v1/models')
+
+
+@override_settings(DEEPSEEK_API_KEY='test-key', DEEPSEEK_MAX_RETRIES=0)
+class ResilienceTests(ChatTestCase):
+    def setUp(self):
+        super().setUp()
+        close_sessions()
+        self.addCleanup(close_sessions)
+
+    def resilient(self, **kwargs):
+        service = ResilientAIService(DeepSeekAIService(), 'deepseek', **kwargs)
+        if service._executor is not None:
+            self.addCleanup(service._executor.shutdown)
+        return service
+
+    def test_circuit_opens_fails_fast_and_recovers(self):
+        with StubUpstream(statuses=[503] * 3) as upstream, self.settings(DEEPSEEK_BASE_URL=upstream.url):
+            service = self.resilient(failure_threshold=3, recovery_timeout=0.2)
+            fallback = service.get_fallback_response('en')
+            for _ in range(5):
+                self.assertEqual(service.generate_response('zzz', 'en'), fallback)
+            self.assertEqual(upstream.requests, 3)
+            self.assertEqual(service.circuit_breaker.state, 'open')
+            self.assertEqual(circuit_breaker_states(CachedAIService(service, None)), {'deepseek': 'open'})
+
+            time.sleep(0.25)
+            self.assertEqual(service.circuit_breaker.state, 'half_open')
+            self.assertEqual(service.generate_response('zzz', 'en'), 'Stub answer')
+        self.assertEqual(upstream.requests, 4)
+        self.assertEqual(service.circuit_breaker.state, 'closed')
+
+    def test_failed_half_open_trial_reopens(self):
+        breaker = CircuitBreaker('test', failure_threshold=1, recovery_timeout=0.05)
+        breaker.record_failure()
+        self.assertFalse(breaker.allow())
+        time.sleep(0.06)
+        self.assertTrue(breaker.allow())
+        self.assertFalse(breaker.allow())    # one trial at a time
+        breaker.record_failure()
+        self.assertEqual(breaker.state, 'open')
+
+    def half_open(self, provider, name='trial'):
+        service = ResilientAIService(provider, name, failure_threshold=1, recovery_timeout=0.05)
+        service.circuit_breaker.record_failure()
+        time.sleep(0.06)
+        return service
+
+    def test_disconnected_half_open_stream_frees_the_trial(self):
+        provider = FakeProvider('stream')
+        provider.stream_response = lambda message, language: iter(['one ', 'two'])
+        service = self.half_open(provider)
+        stream = service.stream_response('zzz', 'en')
+        self.assertEqual(next(stream), 'one ')
+        stream.close()    # the SSE client went away
+        self.assertEqual(service.circuit_breaker.state, 'half_open')
+        self.assertEqual(service.generate_response('zzz', 'en'), 'stream answer')
+        self.assertEqual(service.circuit_breaker.state, 'closed')
+
+    async def test_cancelled_half_open_trial_frees_the_trial(self):
+        service = self.half_open(SlowService(delay=1))
+        task = asyncio.ensure_future(service.aattempt('zzz', 'en'))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await task
+        self.assertTrue(service.circuit_breaker.allow())
+
+    def test_open_circuit_answers_from_knowledge_base(self):
+        with StubUpstream(statuses=[503]) as upstream, self.settings(DEEPSEEK_BASE_URL=upstream.url):
+            service = self.resilient(failure_threshold=1)
+            service.generate_response('zzz', 'en')
+            with mock.patch('ai_agent.services.retrieval.answer_from_knowledge_base', return_value='KB answer') as kb:
+                self.assertEqual(service.generate_response('my balance', 'en'), 'KB answer')
+        kb.assert_called_once_with('my balance', 'en', min_score=0.35)
+        self.assertEqual(upstream.requests, 1)
+
+    def test_hedged_request_beats_a_stalled_attempt(self):
+        with StubUpstream(delays=[1.5]) as upstream, self.settings(DEEPSEEK_BASE_URL=upstream.url):
+            service = self.resilient(hedge=True, hedge_default_delay=0.1)
+            hedged = hedged_requests.value('deepseek')
+            start = time.perf_counter()
+            response = service.generate_response('balance', 'en')
+            elapsed = time.perf_counter() - start
+        self.assertEqual(response, 'Stub answer')
+        self.assertLess(elapsed, 1)
+        self.assertEqual(upstream.requests, 2)
+        self.assertEqual(hedged_requests.value('deepseek'), hedged + 1)
+
+    async def test_async_hedged_request(self):
+        with StubUpstream(delays=[1.5]) as upstream, self.settings(DEEPSEEK_BASE_URL=upstream.url):
+            service = self.resilient(hedge=True, hedge_default_delay=0.1)
+            start = time.perf_counter()
+            response = await service.agenerate_response('balance', 'en')
+            elapsed = time.perf_counter() - start
+            await close_async_sessions()
+        self.assertEqual(response, 'Stub answer')
+        self.assertLess(elapsed, 1)
+        self.assertEqual(upstream.requests, 2)
+
+    def test_deadline_cuts_the_upstream_wait(self):
+        with StubUpstream(delays=[1.5]) as upstream, self.settings(DEEPSEEK_BASE_URL=upstream.url):
+            service = DeepSeekAIService()
+            start = time.perf_counter()
+            with deadline_scope(0.2):
+                response = service.generate_response('balance', 'en')
+        self.assertEqual(response, service.get_fallback_response('en'))
+        self.assertLess(time.perf_counter() - start, 1)
+
+    async def test_async_deadline_cuts_the_upstream_wait(self):
+        with StubUpstream(delays=[1.5]) as upstream, self.settings(DEEPSEEK_BASE_URL=upstream.url):
+            service = DeepSeekAIService()
+            start = time.perf_counter()
+            with deadline_scope(0.2):
+                response = await service.agenerate_response('balance', 'en')
+            await close_async_sessions()
+        self.assertEqual(response, service.get_fallback_response('en'))
+        self.assertLess(time.perf_counter() - start, 1)
+
+    def test_view_propagates_chat_deadline(self):
+        with StubUpstream(delays=[1.5]) as upstream, self.settings(DEEPSEEK_BASE_URL=upstream.url, CHAT_DEADLINE=0.2):
+            service = DeepSeekAIService()
+            with mock.patch.object(views, 'ai_service', service):
+                start = time.perf_counter()
+                response = self.client.post('/api/chat/', {'message': 'zzz', 'session_id': 'deadline-1'})
+        self.assertLess(time.perf_counter() - start, 1)
+        self.assertEqual(response.data['response'], service.get_fallback_response('en'))
+
+
+class FakeProvider:
+    def __init__(self, name, response=None, delay=0.0):
+        self.name = name
+        self.response = response if response is not None else f'{name} answer'
+        self.delay = delay
+        self.calls = 0
+
+    def generate_response(self, message, language='en'):
+        self.calls += 1
+        time.sleep(self.delay)
+        return self.response
+
+    async def agenerate_response(self, message, language='en'):
+        return self.generate_response(message, language)
+
+    def get_fallback_response(self, language):
+        return 'Please try again later'
+
+
+class ProviderRouterTests(ChatTestCase):
+    def router(self, *providers, policy='failover', **route_options):
+        routes = [
+            ProviderRoute(ResilientAIService(provider, provider.name, failure_threshold=2), **route_options)
+            for provider in providers
+        ]
+        return ProviderRouter(routes, policy)
+
+    def test_fails_over_to_the_next_provider(self):
+        down, up = FakeProvider('down', 'Please try again later'), FakeProvider('up')
+        router = self.router(down, up)
+        self.assertEqual(router.generate_response('zzz', 'en'), 'up answer')
+        self.assertEqual(current_provider.get(), 'up')
+
+        router.generate_response('zzz', 'en')
+        self.assertEqual(router.routes[0].service.circuit_breaker.state, 'open')
+        self.assertEqual(router.generate_response('zzz', 'en'), 'up answer')
+        self.assertEqual(down.calls, 2)    # open circuits are not called
+
+    async def test_async_failover_and_degraded_answer(self):
+        router = self.router(FakeProvider('a', 'Please try again later'), FakeProvider('b', 'Please try again later'))
+        self.assertEqual(await router.agenerate_response('zzz', 'fa'), router.get_fallback_response('fa'))
+        self.assertEqual(current_provider.get(), 'fallback')
+
+    def test_latency_policy_prefers_the_fastest_provider(self):
+        slow, fast = FakeProvider('slow', delay=0.02), FakeProvider('fast')
+        router = self.router(slow, fast, policy='latency')
+        router.generate_response('zzz', 'en')     # unobserved providers are tried first
+        router.routes[1].service.latencies.add(0.001)
+        self.assertEqual([route.name for route in router.candidates()], ['fast', 'slow'])
+        for _ in range(5):
+            router.generate_response('zzz', 'en')
+        self.assertEqual((slow.calls, fast.calls), (1, 5))
+
+    def test_cost_and_weighted_policies(self):
+        cheap, pricey = FakeProvider('cheap'), FakeProvider('pricey')
+        routes = [ProviderRoute(ResilientAIService(pricey, 'pricey'), weight=1, cost=2),
+                  ProviderRoute(ResilientAIService(cheap, 'cheap'), weight=9, cost=1)]
+        self.assertEqual(ProviderRouter(routes, 'cost').candidates()[0].name, 'cheap')
+
+        weighted = ProviderRouter(routes, 'weighted')
+        with mock.patch('ai_agent.services.router.random.random', side_effect=[0.5, 0.5] * 10):
+            firsts = {weighted.candidates()[0].name for _ in range(10)}
+        self.assertEqual(firsts, {'cheap'})
+        with self.assertRaises(ValueError):
+            ProviderRouter(routes, 'fastest')
+
+    @override_settings(
+        DEEPSEEK_API_KEY=None,
+        AI_ROUTING={'PROVIDERS': ['deepseek', 'missing', 'mock'], 'POLICY': 'failover'},
+    )
+    def test_from_settings_skips_unusable_providers(self):
+        router = ProviderRouter.from_settings()
+        # Providers are built on first use, so DeepSeek's missing key only shows up then
+        self.assertEqual([route.name for route in router.routes], ['deepseek', 'mock'])
+        self.assertIsNone(router.routes[0].service.service._provider)
+        self.assertTrue(router.generate_response('hello', 'en'))
+        self.assertEqual(current_provider.get(), 'mock')
+        self.assertEqual([route.name for route in router.candidates()], ['mock'])
+        self.assertEqual(circuit_breaker_states(CachedAIService(router, None)), {'mock': 'closed'})
+        self.assertEqual(router.initialize(), ['mock'])
+
+    def test_lazy_provider_is_built_once_across_threads(self):
+        built = []
+
+        def build():
+            time.sleep(0.01)
+            built.append(threading.get_ident())
+            return FakeProvider('lazy')
+
+        provider = LazyProvider('lazy', 'ai_agent.services.mock_ai_service.MockAIService')
+        with mock.patch('ai_agent.services.router.import_string', return_value=build):
+            threads = [threading.Thread(target=provider.get) for _ in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(len(built), 1)
+        self.assertEqual(provider.generate_response('zzz', 'en'), 'lazy answer')
+
+    def test_response_is_tagged_with_the_provider_used(self):
+        router = self.router(FakeProvider('down', 'Please try again later'), FakeProvider('backup'))
+        cached = CachedAIService(router, ResponseCache(MemoryCacheBackend()))
+        with mock.patch.object(views, 'ai_service', cached):
+            first = self.client.post('/api/chat/', {'message': 'zzz', 'session_id': 'route-1'}).data
+            second = self.client.post('/api/chat/', {'message': 'zzz', 'session_id': 'route-2'}).data
+        self.assertEqual((first['response'], first['ai_provider']), ('backup answer', 'backup'))
+        self.assertEqual(second['ai_provider'], 'cache')
+
+
+class ConversationContextTests(ChatTestCase):
+    def save_turns(self, session_id, count, store=None, start=0):
+        for index in range(start, start + count):
+            (store or chat_store).save_turn(session_id, 'en', f'question {index}', f'answer {index}')
+
+    def test_hot_session_history_comes_from_memory(self):
+        self.save_turns('ctx-1', 1)
+        with self.assertNumQueries(1):
+            conversation_history.messages('ctx-1')     # cold: loaded once
+        self.save_turns('ctx-1', 1, start=1)
+        with self.assertNumQueries(0):
+            messages = conversation_history.messages('ctx-1')
+        self.assertEqual(messages, [
+            {'role': 'user', 'content': 'question 0'},
+            {'role': 'assistant', 'content': 'answer 0'},
+            {'role': 'user', 'content': 'question 1'},
+            {'role': 'assistant', 'content': 'answer 1'},
+        ])
+
+    def test_window_and_token_budget_keep_the_newest_turns(self):
+        history = ConversationHistory(max_turns=3, token_budget=2 * estimate_tokens('question 9'))
+        store = ChatTurnStore(history=history)
+        self.save_turns('ctx-2', 5, store)
+        self.assertEqual(len(history.load('ctx-2').messages), 6)
+        # The budget fits two messages; a lone assistant reply is not kept
+        self.assertEqual(history.messages('ctx-2'), [
+            {'role': 'user', 'content': 'question 4'},
+            {'role': 'assistant', 'content': 'answer 4'},
+        ])
+        self.assertLessEqual(estimate_tokens('کارت سیم من کار نمی کند'), 12)
+
+    def test_older_turns_are_summarized(self):
+        history = ConversationHistory(max_turns=2, summarize=True)
+        history.load('ctx-3')
+        store = ChatTurnStore(history=history)
+        self.save_turns('ctx-3', 4, store)
+        messages = history.messages('ctx-3')
+        self.assertEqual(messages[0], {
+            'role': 'system', 'content': 'Earlier in this conversation the customer asked: question 0; question 1',
+        })
+        self.assertEqual([message['content'] for message in messages[1:]],
+                         ['question 2', 'answer 2', 'question 3', 'answer 3'])
+
+    @override_settings(DEEPSEEK_API_KEY='test-key')
+    def test_deepseek_receives_prior_turns(self):
+        with StubUpstream() as upstream, self.settings(DEEPSEEK_BASE_URL=upstream.url):
+            with mock.patch.object(views, 'ai_service', DeepSeekAIService()):
+                self.client.post('/api/chat/', {'message': 'zzz one', 'session_id': 'ctx-4'})
+                self.client.post('/api/chat/', {'message': 'zzz two', 'session_id': 'ctx-4'})
+        close_sessions()
+        self.assertEqual(
+            [(message['role'], message['content']) for message in upstream.server.last_payload['messages'][1:]],
+            [('user', 'zzz one'), ('assistant', 'Stub answer'), ('user', 'zzz two')],
+        )
+
+    def test_no_history_outside_a_scope(self):
+        self.save_turns('ctx-5', 1)
+        service = DeepSeekAIService.__new__(DeepSeekAIService)
+        self.assertEqual(len(service.build_messages('hi', 'en')), 2)
+        with history_scope('ctx-5'):
+            self.assertEqual(len(service.build_messages('hi', 'en')), 4)
+
+
+class PromptRegistryTests(TestCase):
+    def write_facts(self, path, **changes):
+        facts = {**prompt_registry.facts, **changes}
+        with open(path, 'w', encoding='utf-8') as facts_file:
+            json.dump(facts, facts_file)
+
+    def test_prompts_are_rendered_once(self):
+        service = DeepSeekAIService.__new__(DeepSeekAIService)
+        for language in ('en', 'fa', 'ps'):
+            first = service.build_messages('hi', language)[0]['content']
+            self.assertIs(service.build_messages('other', language)[0]['content'], first)
+            self.assertNotIn('$', first)
+        self.assertIn('*123#', prompt_registry.system_prompt('en'))
+        self.assertIn('Super', prompt_registry.system_prompt('en'))
+        self.assertIn('0799000000', prompt_registry.fallback('fa'))
+
+    def test_reload_bumps_version_and_notifies_listeners(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'facts.json')
+            self.write_facts(path)
+            registry = PromptRegistry(path, check_interval=0)
+            version = registry.version
+            calls = []
+            registry.add_listener(calls.append)
+
+            self.assertEqual(registry.reload(), version)
+            self.write_facts(path, balance_code='*555#')
+            self.assertNotEqual(registry.reload(), version)
+            self.assertEqual(calls, [registry, registry])
+            self.assertIn('*555#', registry.system_prompt('en'))
+            self.assertNotIn('*123#', registry.system_prompt('en'))
+
+    def test_facts_file_change_is_picked_up(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'facts.json')
+            self.write_facts(path)
+            registry = PromptRegistry(path, check_interval=0.01)
+            version = registry.version
+            self.write_facts(path, support_phone='0700111222')
+            os.utime(path, (time.time() + 5, time.time() + 5))
+            time.sleep(0.02)
+            self.assertNotEqual(registry.version, version)
+            self.assertIn('0700111222', registry.fallback('en'))
+
+    def test_mock_answers_follow_the_facts(self):
+        self.addCleanup(mock_ai_service._rerender_responses, prompt_registry)
+        facts = {**prompt_registry.facts, 'balance_code': '*999#'}
+        with mock.patch.object(PromptRegistry, 'facts', facts):
+            mock_ai_service._rerender_responses(prompt_registry)
+        self.assertTrue(all('*999#' in answer for answer in mock_ai_service.RESPONSES['en']['balance']))
+
+    def test_cache_key_includes_prompt_version(self):
+        cache = ResponseCache(MemoryCacheBackend())
+        self.assertIn(prompt_registry.version, cache.make_key('How do I check my balance?', 'en'))
+
+
+class SlowService:
+    def __init__(self, delay=0.2, error=None):
+        self.delay = delay
+        self.error = error
+        self.calls = 0
+
+    def generate_response(self, message, language='en'):
+        self.calls += 1
+        time.sleep(self.delay)
+        if self.error is not None:
+            raise self.error
+        current_provider.set('slow')
+        return f'answer to {message}'
+
+    async def agenerate_response(self, message, language='en'):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        current_provider.set('slow')
+        return f'answer to {message}'
+
+
+class SingleFlightTests(ChatTestCase):
+    def run_threads(self, service, messages):
+        results = [None] * len(messages)
+
+        def ask(index):
+            current_provider.set(None)
+            try:
+                results[index] = (service.generate_response(messages[index], 'en'), current_provider.get())
+            except Exception as e:
+                results[index] = e
+
+        threads = [threading.Thread(target=ask, args=(index,)) for index in range(len(messages))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_identical_threads_share_one_call(self):
+        slow = SlowService()
+        before = coalesced_requests.value('sync')
+        results = self.run_threads(SingleFlightAIService(slow), ['Price?', 'price', 'PRICE ', 'other'])
+        self.assertEqual(slow.calls, 2)
+        self.assertEqual(results[:3], [('answer to Price?', 'slow')] * 3)
+        self.assertEqual(results[3], ('answer to other', 'slow'))
+        self.assertEqual(coalesced_requests.value('sync') - before, 2)
+
+    def test_followers_get_the_leaders_error(self):
+        results = self.run_threads(SingleFlightAIService(SlowService(error=RuntimeError('down'))), ['q', 'q'])
+        self.assertTrue(all(isinstance(result, RuntimeError) for result in results))
+
+    def test_identical_tasks_share_one_call(self):
+        slow = SlowService(delay=0.05)
+        service = SingleFlightAIService(slow)
+        before = coalesced_requests.value('async')
+
+        async def ask():
+            current_provider.set(None)
+            return await service.agenerate_response('packages price', 'en'), current_provider.get()
+
+        async def burst():
+            return await asyncio.gather(*(ask() for _ in range(5)))
+
+        results = asyncio.run(burst())
+        self.assertEqual(slow.calls, 1)
+        self.assertEqual(set(results), {('answer to packages price', 'slow')})
+        self.assertEqual(coalesced_requests.value('async') - before, 4)
+        self.assertEqual(service.stats()['in_flight'], 0)
+
+    def test_sessions_with_history_do_not_share(self):
+        chat_store.save_turn('sf-1', 'en', 'my number is 0799123456', 'Noted')
+        with history_scope('sf-1'):
+            own = SingleFlightAIService.make_key('price', 'en')
+        with history_scope('sf-new'):
+            fresh = SingleFlightAIService.make_key('price', 'en')
+        self.assertNotEqual(own, fresh)
+        self.assertEqual(fresh, SingleFlightAIService.make_key('Price?', 'en'))
+
+
+FAKE_SPEECH_ENGINE = 'ai_agent.services.speech.FakeSpeechEngine'
+
+
+class SpeechToTextTests(ChatTestCase):
+    def post_audio(self, body, content_type='audio/pcm', query='session_id=voice-audio&language=en'):
+        return self.client.post(f'/api/voice-chat/?{query}', body, content_type=content_type)
+
+    def read_events(self, response):
+        body = b''.join(response.streaming_content).decode()
+        events = []
+        for block in filter(None, body.split('\n\n')):
+            event, data = block.split('\n')
+            events.append((event[len('event: '):], json.loads(data[len('data: '):])))
+        return events
+
+    def test_audio_upload_streams_partial_transcripts(self):
+        pool = SpeechWorkerPool(FAKE_SPEECH_ENGINE, processes=0)
+        with mock.patch.object(views, 'speech_pool', pool), \
+                mock.patch.dict(views.speech_options, {'CHUNK_SIZE': 8}), \
+                mock.patch.object(views, 'ai_service', CountingService()):
+            events = self.read_events(self.post_audio('zzz how much is my balance'.encode()))
+
+        kinds = [kind for kind, _ in events]
+        self.assertEqual(kinds[-2:], ['transcript', 'done'])
+        partials = [data['text'] for kind, data in events if kind == 'partial']
+        self.assertEqual(partials[0], 'zzz how')
+        self.assertEqual(len(partials), 4)
+        self.assertEqual(events[-2][1]['text'], 'zzz how much is my balance')
+        self.assertEqual(events[-1][1]['original_text'], 'zzz how much is my balance')
+        self.assertEqual(events[-1][1]['response'], 'Dial *123#')
+        self.assertEqual(
+            list(Message.objects.filter(conversation__session_id='voice-audio').values_list('content', flat=True)),
+            ['zzz how much is my balance', 'Dial *123#'],
+        )
+
+    def test_audio_upload_errors(self):
+        self.assertEqual(self.post_audio(b'hello').status_code, 415)    # no engine configured
+        pool = SpeechWorkerPool(FAKE_SPEECH_ENGINE, processes=0)
+        with mock.patch.object(views, 'speech_pool', pool):
+            self.assertEqual(self.post_audio(b'hello', content_type='audio/ogg').status_code, 400)
+            events = self.read_events(self.post_audio(b'   '))
+        self.assertEqual(events, [('error', {'error': 'No speech recognized'})])
+        self.assertFalse(Message.objects.exists())
+        self.assertIn('ai_speech_streams_total{outcome="empty"}', self.client.get('/api/metrics').content.decode())
+
+    def test_wav_header_is_read_and_checked(self):
+        def wav(width):
+            buffer = io.BytesIO()
+            with wave.open(buffer, 'wb') as writer:
+                writer.setnchannels(1)
+                writer.setsampwidth(width)
+                writer.setframerate(8000)
+                writer.writeframes(b'\x01\x02' * 100)
+            data = buffer.getvalue()
+            return [data[offset:offset + 7] for offset in range(0, len(data), 7)]
+
+        rate, chunks = pcm_audio(iter(wav(2)), 'audio/wav')
+        self.assertEqual((rate, b''.join(chunks)), (8000, b'\x01\x02' * 100))
+        with self.assertRaises(AudioFormatError):
+            pcm_audio(iter(wav(1)), 'audio/wav')
+        with self.assertRaises(AudioFormatError):
+            pcm_audio(iter([b'OggS' + bytes(40)]), 'audio/wav')
+
+    def test_worker_processes_are_reused_and_bounded(self):
+        pool = SpeechWorkerPool(FAKE_SPEECH_ENGINE, processes=1, acquire_timeout=0.05)
+        self.addCleanup(pool.close)
+        with pool.open('fa', 16000) as transcription:
+            self.assertEqual(transcription.feed('سلام '.encode()[:3]), 'س')
+            worker = transcription.worker
+            with self.assertRaises(SpeechBusyError):
+                pool.open('fa', 16000)
+            transcription.feed('سلام '.encode()[3:])
+            self.assertEqual(transcription.finish(), 'سلام')
+        with pool.open('en', 16000) as transcription:
+            self.assertIs(transcription.worker, worker)
+            self.assertEqual(pool.stats()['busy'], 1)
+
+        broken = SpeechWorkerPool('ai_agent.services.speech.NoSuchEngine', processes=1)
+        with self.assertRaises(SpeechRecognitionError):
+            broken.open('en', 16000)
+        self.assertEqual(broken.stats()['busy'], 0)
+
+
+FAKE_SYNTHESIZER = 'ai_agent.services.tts.FakeSynthesizer'
+
+
+class TextToSpeechTests(ChatTestCase):
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.cache = AudioCache(directory.name)
+        patcher = mock.patch.object(views, 'speech_synthesizer', SpeechSynthesizer(
+            FAKE_SYNTHESIZER, self.cache, processes=0
+        ))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def speak(self, text, session_id='tts-1'):
+        with mock.patch.object(views, 'ai_service', CountingService(response=text)):
+            return self.client.post(
+                '/api/voice-chat/', {'text': 'zzz question', 'session_id': session_id, 'speak': True},
+                content_type='application/json',
+            )
+
+    @skipUnless(hasattr(os, 'fork'), 'needs fork()')
+    def test_pool_started_before_a_fork_is_replaced_in_the_child(self):
+        synthesizer = SpeechSynthesizer(FAKE_SYNTHESIZER, self.cache, processes=1, timeout=10)
+        self.addCleanup(synthesizer.close)
+        self.assertIsNotNone(synthesizer.clip('before the fork', 'en'))
+        pid = os.fork()
+        if pid == 0:
+            clip_id = None
+            try:
+                clip_id = synthesizer.clip('after the fork', 'en')
+                synthesizer._executor.shutdown()
+            finally:
+                os._exit(0 if clip_id else 1)
+        _, status = os.waitpid(pid, 0)
+        self.assertEqual(os.waitstatus_to_exitcode(status), 0)
+
+    def test_repeated_answers_come_from_the_cache(self):
+        cached = tts_clips.value('cache')
+        first = self.speak('Dial *123# to check your balance')
+        second = self.speak('Dial *123# to check your balance', session_id='tts-2')
+        self.assertEqual(first.data['audio_url'], second.data['audio_url'])
+        self.assertRegex(first.data['audio_url'], r'^/api/tts/[0-9a-f]{64}\.wav$')
+        self.assertEqual(tts_clips.value('cache') - cached, 1)
+        self.assertIn('ai_tts_clips_total{source="cache"}', self.client.get('/api/metrics').content.decode())
+        self.assertNotEqual(self.speak('Something else').data['audio_url'], first.data['audio_url'])
+        plain = self.client.post('/api/voice-chat/', {'text': 'zzz question'}, content_type='application/json')
+        self.assertNotIn('audio_url', plain.data)
+
+        response = self.client.get(first.data['audio_url'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        with wave.open(io.BytesIO(b''.join(response.streaming_content))) as clip:
+            self.assertEqual(clip.getnframes(), 80 * len('Dial *123# to check your balance'))
+
+    def test_byte_ranges_and_revalidation(self):
+        url = self.speak('Dial *123#').data['audio_url']
+        whole = self.client.get(url)
+        size = len(b''.join(whole.streaming_content))
+
+        response = self.client.get(url, HTTP_RANGE='bytes=0-3')
+        self.assertEqual((response.status_code, response.content), (206, b'RIFF'))
+        self.assertEqual(response['Content-Range'], f'bytes 0-3/{size}')
+        response = self.client.get(url, HTTP_RANGE='bytes=-2')
+        self.assertEqual((response.status_code, response.content), (206, b'\x00\x00'))
+        response = self.client.get(url, HTTP_RANGE=f'bytes={size}-')
+        self.assertEqual((response.status_code, response['Content-Range']), (416, f'bytes */{size}'))
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=whole['ETag']).status_code, 304)
+        self.assertEqual(self.client.get(f"/api/tts/{'0' * 64}.wav").status_code, 404)
+
+    def test_worker_processes_render_each_clip_once(self):
+        synthesizer = SpeechSynthesizer(FAKE_SYNTHESIZER, self.cache, processes=1)
+        self.addCleanup(synthesizer.close)
+        clip_id, future = synthesizer.render('سلام', 'fa')
+        self.assertIs(synthesizer.render('سلام', 'fa')[1], future)
+        self.assertEqual(synthesizer.clip('سلام', 'fa'), clip_id)
+        self.assertTrue(os.path.exists(self.cache.path(clip_id)))
+        self.assertEqual(synthesizer.render('سلام', 'fa'), (clip_id, None))
+        other, future = synthesizer.render('سلام', 'ps')
+        self.assertNotEqual(other, clip_id)
+        future.result()
+
+    def test_cache_is_trimmed_oldest_first(self):
+        cache = AudioCache(self.cache.directory, max_bytes=250)
+        for index, clip_id in enumerate(['a' * 64, 'b' * 64, 'c' * 64]):
+            with open(cache.prepare(clip_id), 'wb') as clip:
+                clip.write(bytes(100))
+            os.utime(cache.path(clip_id), (index, index))
+            cache.added(100)
+        self.assertEqual([cache.hit(clip_id) for clip_id in ('a' * 64, 'b' * 64, 'c' * 64)], [False, True, True])
+
+
+class WarmUpTests(ChatTestCase):
+    fixtures = ['knowledge_base']
+
+    def setUp(self):
+        super().setUp()
+        knowledge_base_index.reset()
+        self.addCleanup(knowledge_base_index.reset)
+
+    def test_builds_shared_state_and_reports(self):
+        with mock.patch.object(warmup.connections, 'close_all') as close_all:
+            report = warmup.warm_up()
+        close_all.assert_called_once_with()
+        self.assertTrue(knowledge_base_index.loaded)
+        self.assertFalse(knowledge_base_index._dirty)
+        self.assertEqual(report['counts']['knowledge_base_entries'], TelecomKnowledgeBase.objects.count())
+        self.assertEqual(
+            set(report['seconds']), {'urls', 'providers', 'knowledge_base', 'intent_model', 'answers', 'total'}
+        )
+        self.assertIn('rss_mb', report['memory_mb'])
+        self.assertIs(warmup.last_report, report)
+        with mock.patch.object(warmup, 'memory_usage', side_effect=AssertionError('measured per request')):
+            worker = self.client.get('/api/health/').data['worker']
+        self.assertEqual(worker['warm_up'], report)
+        self.assertEqual(worker['memory_mb'], report['memory_mb'])
+        self.assertEqual(warmup.record_worker_memory(), warmup.worker_memory)
+
+        entry = TelecomKnowledgeBase.objects.first()
+        answers = warmup.canned_answers()
+        self.assertIn((entry.answer_pashto, 'ps'), answers)
+        self.assertIn((RESPONSES['fa']['sim'][0], 'fa'), answers)
+
+    def test_renders_canned_answers_into_the_speech_cache(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        synthesizer = SpeechSynthesizer(FAKE_SYNTHESIZER, AudioCache(directory.name), processes=0)
+        with mock.patch.object(views, 'speech_synthesizer', synthesizer):
+            answers = warmup.canned_answers()
+            self.assertEqual(warmup.render_speech(answers), (0, len(answers)))
+            self.assertEqual(warmup.render_speech(answers), (len(answers), 0))
+
+    def test_speech_warm_up_stops_its_render_pool(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        synthesizer = SpeechSynthesizer(FAKE_SYNTHESIZER, AudioCache(directory.name), processes=1)
+        self.addCleanup(synthesizer.close)
+        with mock.patch.object(views, 'speech_synthesizer', synthesizer):
+            self.assertEqual(warmup.render_speech([('hello', 'en')]), (0, 1))
+        # Nothing for a forked worker to inherit
+        self.assertIsNone(synthesizer._executor)
+        self.assertIsNotNone(synthesizer.clip('hello again', 'en'))
@@ -1,8 +1,17 @@
-from django.urls import path
+from django.urls import path, re_path
 from . import views
 
 urlpatterns = [
     path('chat/', views.chat_endpoint, name='chat'),
+    path('chat/batch/', views.chat_batch_endpoint, name='chat-batch'),
+    path('chat/stream/', views.chat_stream_endpoint, name='chat-stream'),
     path('voice-chat/', views.voice_chat_endpoint, name='voice-chat'),
+    path('async/chat/', views.chat_async_endpoint, name='chat-async'),
+    path('async/voice-chat/', views.voice_chat_async_endpoint, name='voice-chat-async'),
+    re_path(r'^tts/(?P<clip_id>[0-9a-f]{64})\.wav$', views.tts_audio, name='tts-audio'),
+    path('conversations/<str:session_id>/messages/', views.conversation_messages, name='conversation-messages'),
     path('health/', views.health_check, name='health-check'),
+    path('health/live/', views.liveness, name='health-live'),
+    path('health/ready/', views.readiness, name='health-ready'),
+    path('metrics', views.metrics, name='metrics'),
 ]
\ No newline at end of file
@@ -126,31 +126,128 @@
 
 
 
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, JsonResponse, QueryDict, StreamingHttpResponse
+from django.urls import reverse
+from django.views.decorators.http import require_GET
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework import status
+import functools
+import json
 import logging
+import mmap
+import os
+import re
 import uuid
 
+from asgiref.sync import sync_to_async
+
+from . import warmup
+from .batch import DEFAULT_BATCH_SETTINGS, ChatBatchProcessor
+from .context import conversation_history, history_scope
+from .health import ProviderHealthProber, circuit_breaker_states, database_status
+from .metrics import StageTimer, chat_requests, registry
 from .models import Conversation, Message
-from .serializers import ChatRequestSerializer, VoiceChatRequestSerializer
+from .pagination import KeysetPaginator
+from .persistence import chat_store
+from .serializers import (
+    ChatBatchRequestSerializer, ChatRequestSerializer, MessageSerializer, VoiceChatRequestSerializer,
+)
+from .services.intent_model import aclassify_intent, classify_intent
+from .services.resilience import current_provider, deadline_scope
+from .services.router import ProviderRouter
+from .services.retrieval import aanswer_from_knowledge_base, answer_from_knowledge_base
+from .services.speech import (
+    DEFAULT_SPEECH_SETTINGS, AudioFormatError, SpeechBusyError, SpeechRecognitionError, SpeechWorkerPool,
+    pcm_audio, speech_streams,
+)
+from .services.tts import SpeechSynthesizer
 
 logger = logging.getLogger(__name__)
 
-# Always use Mock Service to avoid API key issues
 try:
-    from .services.mock_ai_service import MockAIService
-    ai_service = MockAIService()
+    from .services.cache import CachedAIService, ResponseCache
+    from .services.singleflight import SingleFlightAIService
+    # Providers from settings.AI_PROVIDERS, each behind its own circuit
+    # breaker, routed per settings.AI_ROUTING; cache hits never reach them
+    ai_router = ProviderRouter.from_settings()
+    ai_service = ai_router
+    # Identical questions asked at the same moment share one provider call
+    single_flight = SingleFlightAIService.from_settings(ai_service)
+    if single_flight is not None:
+        ai_service = single_flight
+    # Repeated FAQ-style questions are answered from the cache instead of the provider
+    response_cache = ResponseCache.from_settings()
+    if response_cache is not None:
+        ai_service = CachedAIService(ai_service, response_cache)
     AI_SERVICE_AVAILABLE = True
-    logger.info("✅ Using Mock AI Service - No API key required")
+    logger.info("✅ AI providers: %s (%s routing)",
+                ', '.join(route.name for route in ai_router.routes), ai_router.policy)
 except Exception as e:
-    logger.error(f"❌ Failed to initialize Mock AI Service: {e}")
+    logger.error(f"❌ Failed to initialize AI providers: {e}")
+    ai_router = None
     ai_service = None
+    single_flight = None
+    response_cache = None
     AI_SERVICE_AVAILABLE = False
 
+provider_prober = ProviderHealthProber.from_settings(ai_service) if AI_SERVICE_AVAILABLE else None
+
+# Audio uploads to /api/voice-chat/ are transcribed by settings.SPEECH_TO_TEXT['ENGINE']
+speech_pool = SpeechWorkerPool.from_settings()
+speech_options = {**DEFAULT_SPEECH_SETTINGS, **getattr(settings, 'SPEECH_TO_TEXT', {})}
+# Spoken answers (``speak``) are rendered by settings.TEXT_TO_SPEECH['ENGINE'] into an on-disk cache
+speech_synthesizer = SpeechSynthesizer.from_settings()
+
+def _deadline():
+    """Bounds the provider calls of one request by ``settings.CHAT_DEADLINE`` seconds"""
+    return deadline_scope(getattr(settings, 'CHAT_DEADLINE', None))
+
+def _provider_used():
+    """Backend that produced the answer: a provider name, 'cache', 'knowledge_base' or 'fallback'"""
+    return current_provider.get() or getattr(ai_service, 'name', 'unknown')
+
+def _generate(session_id, message, language):
+    current_provider.set(None)
+    with _deadline(), history_scope(session_id):
+        response = ai_service.generate_response(message, language)
+    return response, _provider_used()
+
+async def _agenerate(session_id, message, language):
+    current_provider.set(None)
+    if conversation_history is not None:
+        # Cold sessions are read from the database here, off the event loop
+        await conversation_history.aload(session_id)
+    with _deadline(), history_scope(session_id):
+        response = await ai_service.agenerate_response(message, language)
+    return response, _provider_used()
+
+def _count_chat(endpoint, intent, language, ai_provider):
+    chat_requests.inc(endpoint, intent, language, ai_provider)
+
+def _message_id(message):
+    # Write-behind persistence assigns the primary key after the response is sent
+    return str(message.id) if message.id is not None else None
+
+def _audio_url(clip_id):
+    return reverse('tts-audio', args=[clip_id]) if clip_id is not None else None
+
+def _speak(text, language):
+    """URL of the spoken ``text``, or None when speech output is off or the render failed"""
+    if speech_synthesizer is None:
+        return None
+    return _audio_url(speech_synthesizer.clip(text, language))
+
+async def _aspeak(text, language):
+    if speech_synthesizer is None:
+        return None
+    return _audio_url(await speech_synthesizer.aclip(text, language))
+
 @api_view(['POST'])
 @permission_classes([])
 def chat_endpoint(request):
+    timer = StageTimer('chat')
     try:
         if not AI_SERVICE_AVAILABLE:
             return Response({
@@ -165,43 +262,40 @@ def chat_endpoint(request):
         user_message = data['message']
         session_id = data.get('session_id', str(uuid.uuid4()))
         language = data['language']
-        
-        logger.info(f"💬 Processing chat request - Session: {session_id}, Language: {language}, Message: {user_message}")
-        
-        conversation, created = Conversation.objects.get_or_create(
-            session_id=session_id,
-            defaults={'user_language': language}
-        )
-        
-        if conversation.user_language != language:
-            conversation.user_language = language
-            conversation.save()
-        
-        # Save user message
-        user_msg = Message.objects.create(
-            conversation=conversation,
-            content=user_message,
-            is_user=True
-        )
-        
-        # Generate AI response using Mock service
-        ai_response = ai_service.generate_response(user_message, language)
-        
-        # Save AI response
-        ai_msg = Message.objects.create(
-            conversation=conversation,
-            content=ai_response,
-            is_user=False
+        intent = classify_intent(user_message)
+        timer.lap('validate')
+        
+        logger.info("💬 Processing chat request - Session: %s, Language: %s, Message: %s",
+                    session_id, language, user_message, extra={'session_id': session_id, 'language': language})
+        
+        # Answer from the knowledge base when it has a confident match,
+        # otherwise generate an AI response using Mock service
+        ai_response = answer_from_knowledge_base(user_message, language)
+        ai_provider = 'knowledge_base'
+        timer.lap('retrieve')
+        if ai_response is None:
+            ai_response, ai_provider = _generate(session_id, user_message, language)
+            timer.lap('generate')
+        
+        # Both turns are written together in one transaction
+        user_msg, ai_msg = chat_store.save_turn(
+            session_id, language, user_message, ai_response, intent=intent.intent, confidence=intent.confidence
         )
+        timer.lap('persist')
+        _count_chat('chat', intent.intent, language, ai_provider)
         
-        logger.info(f"🤖 AI Response generated: {ai_response[:100]}...")
+        logger.info("🤖 AI Response generated: %.100s...", ai_response, extra={
+            'session_id': session_id,
+            'ai_provider': ai_provider,
+            'latency_ms': round(timer.finish() * 1000, 2),
+        })
         
         return Response({
             'response': ai_response,
             'session_id': session_id,
-            'message_id': str(ai_msg.id),
+            'message_id': _message_id(ai_msg),
             'status': 'success',
-            'ai_provider': 'mock'  # Indicate we're using mock service
+            'ai_provider': ai_provider
         })
         
     except Exception as e:
@@ -211,14 +305,293 @@ def chat_endpoint(request):
             'details': str(e)
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+@api_view(['POST'])
+@permission_classes([])
+def chat_batch_endpoint(request):
+    """Answer a list of ``{message, session_id, language}`` items in one request.
+
+    Identical questions are answered once, provider calls run concurrently up
+    to ``CHAT_BATCH['MAX_CONCURRENCY']`` and all messages are inserted
+    together. Results come back in item order; a failed item carries its own
+    errors and does not fail the batch.
+    """
+    timer = StageTimer('chat_batch')
+    try:
+        if not AI_SERVICE_AVAILABLE:
+            return Response({
+                'error': 'AI service is currently unavailable. Please check configuration.'
+            }, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        
+        options = {**DEFAULT_BATCH_SETTINGS, **getattr(settings, 'CHAT_BATCH', {})}
+        serializer = ChatBatchRequestSerializer(data=request.data, context={'max_items': options['MAX_ITEMS']})
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        
+        results = [None] * len(serializer.validated_data['items'])
+        items, positions = [], []
+        for index, raw_item in enumerate(serializer.validated_data['items']):
+            item_serializer = ChatRequestSerializer(data=raw_item)
+            if item_serializer.is_valid():
+                items.append(item_serializer.validated_data)
+                positions.append(index)
+            else:
+                results[index] = {'index': index, 'status': 'error', 'errors': item_serializer.errors}
+        timer.lap('validate')
+        
+        logger.info("💬 Processing chat batch - %d items", len(results))
+        
+        processor = ChatBatchProcessor.from_settings(ai_service, chat_store)
+        with _deadline():
+            answers, saved = processor.process(items, timer)
+        
+        for position, (index, item, answer) in enumerate(zip(positions, items, answers)):
+            if answer.error is not None:
+                results[index] = {'index': index, 'status': 'error', 'errors': {'detail': answer.error}}
+                continue
+            user_msg, ai_msg = saved[position]
+            _count_chat('chat_batch', answer.intent, item['language'], answer.ai_provider)
+            results[index] = {
+                'index': index,
+                'status': 'success',
+                'response': answer.response,
+                'session_id': item['session_id'],
+                'message_id': _message_id(ai_msg),
+                'intent': answer.intent,
+                'ai_provider': answer.ai_provider
+            }
+        
+        unique_messages = len(set(map(id, answers)))
+        logger.info("🤖 Chat batch answered: %d items, %d distinct questions", len(results), unique_messages,
+                    extra={'latency_ms': round(timer.finish() * 1000, 2)})
+        
+        return Response({
+            'results': results,
+            'count': len(results),
+            'unique_messages': unique_messages,
+            'status': 'success'
+        })
+        
+    except Exception as e:
+        logger.error(f"💥 Chat batch endpoint error: {e}")
+        return Response({
+            'error': 'Internal server error',
+            'details': str(e)
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+def _sse_event(data, event=None):
+    payload = json.dumps(data, ensure_ascii=False)
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {payload}\n\n"
+
+@api_view(['POST'])
+@permission_classes([])
+def chat_stream_endpoint(request):
+    """Chat endpoint that relays the AI response as Server-Sent Events"""
+    timer = StageTimer('chat_stream')
+    if not AI_SERVICE_AVAILABLE:
+        return Response({
+            'error': 'AI service is currently unavailable. Please check configuration.'
+        }, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+    
+    serializer = ChatRequestSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    
+    data = serializer.validated_data
+    user_message = data['message']
+    session_id = data.get('session_id', str(uuid.uuid4()))
+    language = data['language']
+    intent = classify_intent(user_message)
+    timer.lap('validate')
+    
+    logger.info("💬 Processing chat stream request - Session: %s, Language: %s",
+                session_id, language, extra={'session_id': session_id, 'language': language})
+    
+    kb_answer = answer_from_knowledge_base(user_message, language)
+    timer.lap('retrieve')
+    
+    def event_stream():
+        chunks = []
+        current_provider.set(None)
+        tokens = [kb_answer] if kb_answer is not None else ai_service.stream_response(user_message, language)
+        try:
+            with history_scope(session_id):
+                for token in tokens:
+                    if not chunks:
+                        timer.lap('first_token')
+                    chunks.append(token)
+                    yield _sse_event({'token': token})
+        except Exception as e:
+            logger.error(f"💥 Chat stream error: {e}")
+            yield _sse_event({'error': 'Internal server error'}, event='error')
+            return
+        timer.lap('generate')
+        ai_provider = 'knowledge_base' if kb_answer is not None else _provider_used()
+        
+        # Persist both turns once the stream has completed
+        user_msg, ai_msg = chat_store.save_turn(
+            session_id, language, user_message, ''.join(chunks), intent=intent.intent, confidence=intent.confidence
+        )
+        timer.lap('persist')
+        _count_chat('chat_stream', intent.intent, language, ai_provider)
+        timer.finish()
+        
+        yield _sse_event({
+            'session_id': session_id,
+            'message_id': _message_id(ai_msg),
+            'status': 'success',
+            'ai_provider': ai_provider
+        }, event='done')
+    
+    response = StreamingHttpResponse(event_stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Stop nginx-style proxies from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+class _ClosingStream:
+    """Streaming body that runs ``close`` when the response is closed, even if never iterated"""
+
+    def __init__(self, iterator, close):
+        self.iterator = iterator
+        self._close = close
+
+    def __iter__(self):
+        return self.iterator
+
+    def close(self):
+        self.iterator.close()
+        self._close()
+
+def _audio_chunks(request, chunk_size, max_bytes):
+    """The request body as it arrives, ``chunk_size`` bytes at a time"""
+    if request.META.get('CONTENT_LENGTH') or not request.META.get('wsgi.input_terminated'):
+        read = request.read
+    else:
+        # Chunked upload the server has de-chunked (gunicorn); Django would read it as empty
+        read = request.META['wsgi.input'].read
+    total = 0
+    while True:
+        chunk = read(chunk_size)
+        if not chunk:
+            return
+        total += len(chunk)
+        if total > max_bytes:
+            raise AudioFormatError(f"Audio uploads are limited to {max_bytes} bytes")
+        yield chunk
+
+def _is_audio_upload(request):
+    return request.content_type.startswith('audio/') or request.content_type == 'application/octet-stream'
+
+def _voice_audio_response(request, timer):
+    """Transcribe an audio upload while it arrives and answer it, as Server-Sent Events.
+
+    ``session_id``, ``language`` and ``sample_rate`` (raw PCM only) come from
+    the query string. Emits ``partial`` events as the transcript grows, then
+    ``transcript`` and a ``done`` event with the usual voice chat fields.
+    """
+    if speech_pool is None:
+        return Response({
+            'error': 'Server-side speech recognition is not configured; send the transcribed text'
+        }, status=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE)
+    
+    serializer = VoiceChatRequestSerializer(data=request.query_params)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    data = serializer.validated_data
+    session_id = data.get('session_id', str(uuid.uuid4()))
+    language = data['language']
+    
+    try:
+        sample_rate, chunks = pcm_audio(
+            _audio_chunks(request, speech_options['CHUNK_SIZE'], speech_options['MAX_BYTES']),
+            request.content_type,
+            int(request.query_params.get('sample_rate', 16000)),
+        )
+        transcription = speech_pool.open(language, sample_rate)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    except SpeechRecognitionError as e:
+        speech_streams.inc('busy' if isinstance(e, SpeechBusyError) else 'error')
+        logger.error(f"💥 Speech recognition unavailable: {e}")
+        return Response({'error': 'Speech recognition is busy, try again shortly'},
+                        status=status.HTTP_503_SERVICE_UNAVAILABLE, headers={'Retry-After': '1'})
+    timer.lap('validate')
+    
+    def event_stream():
+        # The worker goes back to the pool before the provider is called
+        with transcription:
+            try:
+                for chunk in chunks:
+                    previous = transcription.text
+                    if transcription.feed(chunk) != previous:
+                        yield _sse_event({'text': transcription.text}, event='partial')
+                transcribed_text = transcription.finish()
+            except (AudioFormatError, SpeechRecognitionError) as e:
+                speech_streams.inc('error')
+                logger.error(f"💥 Speech recognition error: {e}")
+                yield _sse_event({'error': 'Voice processing error'}, event='error')
+                return
+        timer.lap('transcribe')
+        if not transcribed_text:
+            speech_streams.inc('empty')
+            yield _sse_event({'error': 'No speech recognized'}, event='error')
+            return
+        speech_streams.inc('transcribed')
+        yield _sse_event({'text': transcribed_text}, event='transcript')
+        
+        try:
+            intent = classify_intent(transcribed_text)
+            ai_response = answer_from_knowledge_base(transcribed_text, language)
+            ai_provider = 'knowledge_base'
+            timer.lap('retrieve')
+            if ai_response is None:
+                ai_response, ai_provider = _generate(session_id, transcribed_text, language)
+                timer.lap('generate')
+            
+            chat_store.save_turn(
+                session_id, language, transcribed_text, ai_response, update_language=False,
+                intent=intent.intent, confidence=intent.confidence
+            )
+            timer.lap('persist')
+        except Exception as e:
+            logger.error(f"💥 Voice chat endpoint error: {e}")
+            yield _sse_event({'error': 'Voice processing error'}, event='error')
+            return
+        _count_chat('voice_chat', intent.intent, language, ai_provider)
+        
+        done = {
+            'response': ai_response,
+            'session_id': session_id,
+            'original_text': transcribed_text,
+            'status': 'success',
+            'ai_provider': ai_provider
+        }
+        if data['speak']:
+            done['audio_url'] = _speak(ai_response, language)
+            timer.lap('synthesize')
+        timer.finish()
+        yield _sse_event(done, event='done')
+    
+    response = StreamingHttpResponse(
+        _ClosingStream(event_stream(), transcription.close), content_type='text/event-stream'
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
 @api_view(['POST'])
 @permission_classes([])
 def voice_chat_endpoint(request):
+    """Voice chat: transcribed ``text`` as JSON, or the audio itself (see ``_voice_audio_response``)"""
+    timer = StageTimer('voice_chat')
     try:
         if not AI_SERVICE_AVAILABLE:
             return Response({
                 'error': 'AI service is currently unavailable'
             }, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        if _is_audio_upload(request):
+            return _voice_audio_response(request, timer)
             
         serializer = VoiceChatRequestSerializer(data=request.data)
         if not serializer.is_valid():
@@ -234,68 +607,346 @@ def voice_chat_endpoint(request):
                 {'error': 'No text provided for voice processing'}, 
                 status=status.HTTP_400_BAD_REQUEST
             )
+        intent = classify_intent(transcribed_text)
+        timer.lap('validate')
+        
+        ai_response = answer_from_knowledge_base(transcribed_text, language)
+        ai_provider = 'knowledge_base'
+        timer.lap('retrieve')
+        if ai_response is None:
+            ai_response, ai_provider = _generate(session_id, transcribed_text, language)
+            timer.lap('generate')
+        
+        user_msg, ai_msg = chat_store.save_turn(
+            session_id, language, transcribed_text, ai_response, update_language=False,
+            intent=intent.intent, confidence=intent.confidence
+        )
+        timer.lap('persist')
+        _count_chat('voice_chat', intent.intent, language, ai_provider)
+        
+        result = {
+            'response': ai_response,
+            'session_id': session_id,
+            'original_text': transcribed_text,
+            'status': 'success',
+            'ai_provider': ai_provider
+        }
+        if data['speak']:
+            result['audio_url'] = _speak(ai_response, language)
+            timer.lap('synthesize')
+        timer.finish()
+        return Response(result)
         
-        conversation, created = Conversation.objects.get_or_create(
-            session_id=session_id,
-            defaults={'user_language': language}
+    except Exception as e:
+        logger.error(f"💥 Voice chat endpoint error: {e}")
+        return Response(
+            {'error': 'Voice processing error'}, 
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
         )
+
+def async_api_view(methods):
+    """Minimal async counterpart of DRF's ``api_view`` (DRF 3.14 views are sync-only).
+
+    Enforces the allowed methods, parses JSON or form bodies into
+    ``request.data`` and exempts the view from CSRF like DRF does.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if request.method not in methods:
+                return JsonResponse(
+                    {'detail': f'Method "{request.method}" not allowed.'},
+                    status=status.HTTP_405_METHOD_NOT_ALLOWED
+                )
+            if request.content_type == 'application/json':
+                try:
+                    request.data = json.loads(request.body or b'{}')
+                except ValueError:
+                    return JsonResponse({'detail': 'JSON parse error'}, status=status.HTTP_400_BAD_REQUEST)
+            else:
+                request.data = request.POST if request.method == 'POST' else QueryDict()
+            return await view(request, *args, **kwargs)
+        wrapper.csrf_exempt = True
+        return wrapper
+    return decorator
+
+@async_api_view(['POST'])
+async def chat_async_endpoint(request):
+    """Async chat endpoint: holds no worker thread while the provider call is in flight"""
+    timer = StageTimer('chat_async')
+    try:
+        if not AI_SERVICE_AVAILABLE:
+            return JsonResponse({
+                'error': 'AI service is currently unavailable. Please check configuration.'
+            }, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        
+        serializer = ChatRequestSerializer(data=request.data)
+        if not serializer.is_valid():
+            return JsonResponse(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
         
-        user_msg = Message.objects.create(
-            conversation=conversation,
-            content=transcribed_text,
-            is_user=True
+        data = serializer.validated_data
+        user_message = data['message']
+        session_id = data.get('session_id', str(uuid.uuid4()))
+        language = data['language']
+        intent = await aclassify_intent(user_message)
+        timer.lap('validate')
+        
+        logger.info("💬 Processing async chat request - Session: %s, Language: %s",
+                    session_id, language, extra={'session_id': session_id, 'language': language})
+        
+        ai_response = await aanswer_from_knowledge_base(user_message, language)
+        ai_provider = 'knowledge_base'
+        timer.lap('retrieve')
+        if ai_response is None:
+            ai_response, ai_provider = await _agenerate(session_id, user_message, language)
+            timer.lap('generate')
+        
+        user_msg, ai_msg = await sync_to_async(chat_store.save_turn)(
+            session_id, language, user_message, ai_response, intent=intent.intent, confidence=intent.confidence
         )
+        timer.lap('persist')
+        _count_chat('chat_async', intent.intent, language, ai_provider)
+        timer.finish()
         
-        ai_response = ai_service.generate_response(transcribed_text, language)
+        return JsonResponse({
+            'response': ai_response,
+            'session_id': session_id,
+            'message_id': _message_id(ai_msg),
+            'status': 'success',
+            'ai_provider': ai_provider
+        })
         
-        ai_msg = Message.objects.create(
-            conversation=conversation,
-            content=ai_response,
-            is_user=False
+    except Exception as e:
+        logger.error(f"💥 Async chat endpoint error: {e}")
+        return JsonResponse({
+            'error': 'Internal server error',
+            'details': str(e)
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+@async_api_view(['POST'])
+async def voice_chat_async_endpoint(request):
+    """Async variant of voice_chat_endpoint"""
+    timer = StageTimer('voice_chat_async')
+    try:
+        if not AI_SERVICE_AVAILABLE:
+            return JsonResponse({
+                'error': 'AI service is currently unavailable'
+            }, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        
+        serializer = VoiceChatRequestSerializer(data=request.data)
+        if not serializer.is_valid():
+            return JsonResponse(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        
+        data = serializer.validated_data
+        session_id = data.get('session_id', str(uuid.uuid4()))
+        language = data['language']
+        transcribed_text = data.get('text', '')
+        
+        if not transcribed_text:
+            return JsonResponse(
+                {'error': 'No text provided for voice processing'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        intent = await aclassify_intent(transcribed_text)
+        timer.lap('validate')
+        
+        ai_response = await aanswer_from_knowledge_base(transcribed_text, language)
+        ai_provider = 'knowledge_base'
+        timer.lap('retrieve')
+        if ai_response is None:
+            ai_response, ai_provider = await _agenerate(session_id, transcribed_text, language)
+            timer.lap('generate')
+        
+        await sync_to_async(chat_store.save_turn)(
+            session_id, language, transcribed_text, ai_response, update_language=False,
+            intent=intent.intent, confidence=intent.confidence
         )
+        timer.lap('persist')
+        _count_chat('voice_chat_async', intent.intent, language, ai_provider)
         
-        return Response({
+        result = {
             'response': ai_response,
             'session_id': session_id,
             'original_text': transcribed_text,
             'status': 'success',
-            'ai_provider': 'mock'
-        })
+            'ai_provider': ai_provider
+        }
+        if data['speak']:
+            result['audio_url'] = await _aspeak(ai_response, language)
+            timer.lap('synthesize')
+        timer.finish()
+        return JsonResponse(result)
         
     except Exception as e:
-        logger.error(f"💥 Voice chat endpoint error: {e}")
-        return Response(
-            {'error': 'Voice processing error'}, 
+        logger.error(f"💥 Async voice chat endpoint error: {e}")
+        return JsonResponse(
+            {'error': 'Voice processing error'},
             status=status.HTTP_500_INTERNAL_SERVER_ERROR
         )
 
+message_paginator = KeysetPaginator()
+
 @api_view(['GET'])
 @permission_classes([])
-def health_check(request):
-    """Health check endpoint"""
+def conversation_messages(request, session_id):
+    """Conversation history, keyset-paginated with ?cursor=&page_size=&order=asc|desc"""
     try:
-        if AI_SERVICE_AVAILABLE:
-            # Test with a simple message
-            test_response = ai_service.generate_response("Hello", "en")
-            ai_status = "healthy"
-            ai_provider = "mock"
-        else:
-            ai_status = "unavailable"
-            ai_provider = "none"
-            
+        descending = request.query_params.get('order', 'asc') == 'desc'
+        cursor = request.query_params.get('cursor')
+        page_size = request.query_params.get('page_size')
+        
+        conversation = Conversation.objects.only('id', 'session_id', 'user_language').filter(
+            session_id=session_id
+        ).first()
+        if conversation is None:
+            return Response({'error': 'Conversation not found'}, status=status.HTTP_404_NOT_FOUND)
+        
+        messages, next_cursor = message_paginator.paginate(
+            Message.objects.filter(conversation_id=conversation.id).only(*MessageSerializer.Meta.fields),
+            cursor=cursor,
+            page_size=page_size,
+            descending=descending,
+        )
+        
+        next_url = None
+        if next_cursor:
+            query = request.query_params.copy()
+            query['cursor'] = next_cursor
+            next_url = request.build_absolute_uri(f"{request.path}?{query.urlencode()}")
+        
         return Response({
-            'status': 'healthy',
-            'service': 'Telecom AI Agent API',
-            'ai_service': ai_status,
-            'ai_provider': ai_provider,
-            'version': '1.0.0',
-            'message': 'Mock AI service is providing realistic telecom responses'
+            'session_id': conversation.session_id,
+            'user_language': conversation.user_language,
+            'results': MessageSerializer(messages, many=True).data,
+            'next_cursor': next_cursor,
+            'next': next_url
         })
-    except Exception as e:
-        return Response({
-            'status': 'degraded',
-            'service': 'Telecom AI Agent API', 
-            'ai_service': 'unavailable',
-            'error': str(e),
-            'version': '1.0.0'
-        }, status=status.HTTP_503_SERVICE_UNAVAILABLE)
\ No newline at end of file
+        
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+def _byte_range(header, size):
+    """``(first, last)`` byte of a single-range ``Range`` header; None serves the whole file, False is a 416"""
+    match = re.fullmatch(r'bytes=(\d*)-(\d*)', header.strip())
+    if match is None or match.groups() == ('', ''):
+        return None    # absent, malformed or multi-range: ignored, as RFC 9110 allows
+    first, last = match.groups()
+    if size == 0:
+        return False
+    if first == '':
+        suffix = int(last)
+        return (max(size - suffix, 0), size - 1) if suffix else False
+    if last and int(last) < int(first):
+        return None
+    if int(first) >= size:
+        return False
+    return int(first), min(int(last), size - 1) if last else size - 1
+
+@require_GET
+def tts_audio(request, clip_id):
+    """A cached spoken answer. Clips are content-addressed, so they never change once written.
+
+    Whole files go out through ``FileResponse`` (sendfile under most
+    servers); byte ranges are sliced from a memory map of the clip.
+    """
+    etag = f'"{clip_id}"'
+    if speech_synthesizer is None:
+        return JsonResponse({'error': 'Speech output is not configured'}, status=status.HTTP_404_NOT_FOUND)
+    if request.headers.get('If-None-Match') == etag:
+        response = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+        response['ETag'] = etag
+        return response
+    try:
+        audio = open(speech_synthesizer.path(clip_id), 'rb')
+    except FileNotFoundError:
+        return JsonResponse({'error': 'Audio clip not found'}, status=status.HTTP_404_NOT_FOUND)
+    
+    size = os.fstat(audio.fileno()).st_size
+    byte_range = _byte_range(request.headers.get('Range', ''), size)
+    if byte_range is None:
+        response = FileResponse(audio, content_type='audio/wav')
+    else:
+        with audio:
+            if byte_range is False:
+                response = HttpResponse(status=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE)
+                response['Content-Range'] = f'bytes */{size}'
+                return response
+            first, last = byte_range
+            with mmap.mmap(audio.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                response = HttpResponse(mapped[first:last + 1], status=status.HTTP_206_PARTIAL_CONTENT,
+                                        content_type='audio/wav')
+            response['Content-Range'] = f'bytes {first}-{last}/{size}'
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
+
+@require_GET
+def metrics(request):
+    """Prometheus text exposition of the in-process metrics"""
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+def _provider_health():
+    if provider_prober is None:
+        return {'status': 'unavailable'}
+    provider_prober.ensure_started()
+    return provider_prober.state()._asdict()
+
+@require_GET
+def liveness(request):
+    """Liveness probe: the process is up and serving requests. Does no I/O."""
+    return JsonResponse({'status': 'alive'})
+
+@require_GET
+def readiness(request):
+    """Readiness probe from cached state: database connectivity, provider health, circuit breakers.
+
+    Only a dead database makes the instance unready; a failing provider is
+    reported as 'degraded' since answers still come from the knowledge base,
+    the cache or the fallback text.
+    """
+    database = database_status()
+    provider = _provider_health()
+    if database != 'ok':
+        overall, http_status = 'unavailable', status.HTTP_503_SERVICE_UNAVAILABLE
+    elif provider['status'] in ('unhealthy', 'stale', 'unavailable'):
+        overall, http_status = 'degraded', status.HTTP_200_OK
+    else:
+        overall, http_status = 'ready', status.HTTP_200_OK
+    return JsonResponse({
+        'status': overall,
+        'database': database,
+        'ai_provider': provider,
+        'circuit_breakers': circuit_breaker_states(ai_service),
+    }, status=http_status)
+
+def _routing_message():
+    if not AI_SERVICE_AVAILABLE:
+        return 'No AI provider could be set up; chat answers are unavailable'
+    names = [route.name for route in ai_router.routes if route.available]
+    if not names:
+        return 'Every AI provider failed to initialize; answering from the knowledge base and fallback text'
+    return f"Answering with {', '.join(names)} ({ai_router.policy} routing)"
+
+@api_view(['GET'])
+@permission_classes([])
+def health_check(request):
+    """Health check endpoint; reports the cached provider state instead of calling it"""
+    provider = _provider_health()
+    ai_status = {'healthy': 'healthy', 'unknown': 'healthy'}.get(provider['status'], provider['status'])
+    return Response({
+        'status': 'healthy' if ai_status == 'healthy' else 'degraded',
+        'service': 'Telecom AI Agent API',
+        'ai_service': ai_status,
+        'ai_provider': ', '.join(route.name for route in ai_router.routes) if AI_SERVICE_AVAILABLE else 'none',
+        'provider_health': provider,
+        'ai_routing': ai_router.stats() if AI_SERVICE_AVAILABLE else None,
+        'version': '1.0.0',
+        'message': _routing_message(),
+        'response_cache': response_cache.stats() if response_cache is not None else None,
+        'request_coalescing': single_flight.stats() if single_flight is not None else None,
+        'speech_to_text': speech_pool.stats() if speech_pool is not None else None,
+        'speech_output': speech_synthesizer.stats() if speech_synthesizer is not None else None,
+        'worker': {'pid': os.getpid(), 'warm_up': warmup.last_report, 'memory_mb': warmup.worker_memory},
+        'chat_persistence': chat_store.stats()
+    })
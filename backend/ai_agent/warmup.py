@@ -0,0 +1,155 @@
+"""Startup warm-up: build what the first requests would otherwise build.
+
+Importing the URLconf builds the provider stack (and renders the system
+prompts and mock response tables of every language); the providers
+themselves are built lazily, so they are initialized next, then the
+knowledge base retrieval arrays and the intent model. With ``speech`` the
+canned answers (knowledge base, mock tables, fallbacks) are also rendered
+into the text-to-speech cache.
+
+Under gunicorn with ``preload_app`` (gunicorn.conf.py) this runs once in
+the master and the workers inherit the result copy-on-write. Database
+connections are closed at the end so no worker inherits a socket.
+"""
+import logging
+import time
+
+from django.db import connections
+from django.urls import get_resolver
+
+from .services import mock_ai_service
+from .services.intent_model import get_intent_classifier
+from .services.prompts import prompt_registry
+from .services.retrieval import get_knowledge_base_index
+
+logger = logging.getLogger(__name__)
+
+LANGUAGES = ('en', 'fa', 'ps')
+
+_SMAPS_FIELDS = {
+    'Rss': 'rss', 'Pss': 'pss',
+    'Shared_Clean': 'shared', 'Shared_Dirty': 'shared',
+    'Private_Clean': 'private', 'Private_Dirty': 'private',
+}
+
+# The report of the warm-up this process ran or inherited
+last_report = None
+
+# This process's memory as last measured (after the warm-up, then once a
+# gunicorn worker is up); /api/health/ reports it without measuring again
+worker_memory = None
+
+
+def memory_usage():
+    """This process's memory in MB.
+
+    On Linux ``shared`` is what the process shares with others (a preloading
+    master and its workers) and ``pss`` charges each shared page to its
+    sharers in proportion; elsewhere only the peak RSS is known.
+    """
+    usage = {}
+    try:
+        with open('/proc/self/smaps_rollup') as smaps:
+            for line in smaps:
+                field, _, value = line.partition(':')
+                if field in _SMAPS_FIELDS:
+                    key = _SMAPS_FIELDS[field] + '_mb'
+                    usage[key] = usage.get(key, 0) + int(value.split()[0]) / 1024
+    except OSError:
+        try:
+            import resource
+        except ImportError:    # Windows
+            return usage
+        # ru_maxrss is in bytes on macOS (kB on Linux, which has smaps_rollup)
+        usage['max_rss_mb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024 / 1024
+    return {key: round(value, 1) for key, value in usage.items()}
+
+
+def record_worker_memory():
+    """Measure this process's memory now and keep it for /api/health/"""
+    global worker_memory
+    worker_memory = memory_usage()
+    return worker_memory
+
+
+def canned_answers():
+    """``(text, language)`` for every answer the service gives word for word"""
+    answers = set()
+    for language in LANGUAGES:
+        answers.add((prompt_registry.fallback(language), language))
+        for options in mock_ai_service.RESPONSES[language].values():
+            answers.update((text, language) for text in options)
+    for entry_answers in get_knowledge_base_index().answers():
+        answers.update((text, language) for language, text in entry_answers.items() if text)
+    return sorted(answers)
+
+
+def render_speech(answers):
+    """Put every answer in the text-to-speech cache; returns ``(already cached, rendered)``"""
+    from . import views
+    if views.speech_synthesizer is None:
+        return 0, 0
+    # Submit everything first so the worker pool renders in parallel
+    futures = [views.speech_synthesizer.render(text, language)[1] for text, language in answers]
+    rendered = 0
+    for future in futures:
+        if future is not None:
+            try:
+                future.result()
+                rendered += 1
+            except Exception as e:
+                logger.warning(f"Speech warm-up failed for one answer: {e}")
+    # Under preload_app this is the gunicorn master: stop the pool before the
+    # workers are forked; each worker starts its own on its first clip
+    views.speech_synthesizer.close()
+    return futures.count(None), rendered
+
+
+def warm_up(speech=False):
+    """Build the shared state now; returns a report of stage timings, counts and memory"""
+    global last_report, worker_memory
+    timings, counts = {}, {}
+    started = last = time.perf_counter()
+
+    def lap(stage):
+        nonlocal last
+        now = time.perf_counter()
+        timings[stage] = round(now - last, 4)
+        last = now
+
+    # Loads the views module: the provider router, its caches and breakers,
+    # and the prompts and mock response tables rendered at import
+    get_resolver().url_patterns
+    lap('urls')
+
+    from . import views
+    if views.ai_router is not None:
+        # Imports the provider SDKs and opens their clients now, not on the first request
+        counts['providers'] = len(views.ai_router.initialize())
+        lap('providers')
+
+    index = get_knowledge_base_index()
+    index.materialize()
+    counts['knowledge_base_entries'] = len(index)
+    lap('knowledge_base')
+
+    classifier = get_intent_classifier()
+    classifier.classify_batch(['hello', 'سلام'])
+    lap('intent_model')
+
+    answers = canned_answers()
+    counts['canned_answers'] = len(answers)
+    lap('answers')
+    if speech:
+        counts['speech_cached'], counts['speech_rendered'] = render_speech(answers)
+        lap('speech')
+
+    connections.close_all()
+    last_report = {
+        'seconds': {**timings, 'total': round(time.perf_counter() - started, 4)},
+        'counts': counts,
+        'memory_mb': memory_usage(),
+    }
+    worker_memory = last_report['memory_mb']
+    logger.info("🔥 Warm-up done in %.2fs: %s", last_report['seconds']['total'], counts)
+    return last_report
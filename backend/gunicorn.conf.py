@@ -0,0 +1,27 @@
+"""Gunicorn settings (read from the working directory: ``gunicorn telecom_ai.wsgi``).
+
+The application is loaded once in the master, where telecom_ai/wsgi.py runs
+the warm-up, and the workers are forked from it sharing those pages
+copy-on-write. Each worker measures its memory once it is up, logs it and
+reports that reading on /api/health/.
+"""
+import gc
+import os
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.getenv('GUNICORN_WORKERS', '4'))
+threads = int(os.getenv('GUNICORN_THREADS', '4'))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '60'))
+preload_app = True
+raw_env = [f"WARM_UP_ON_STARTUP={os.getenv('WARM_UP_ON_STARTUP', 'True')}"]
+
+
+def when_ready(server):
+    # Move everything built so far out of the collector's reach: a collection
+    # in a worker would otherwise write to (and so un-share) those pages
+    gc.freeze()
+
+
+def post_worker_init(worker):
+    from ai_agent.warmup import record_worker_memory
+    worker.log.info("Worker %s memory (MB): %s", worker.pid, record_worker_memory())
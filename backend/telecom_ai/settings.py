@@ -96,7 +96,13 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 
 SECRET_KEY = os.getenv('SECRET_KEY', 'django-insecure-default-key')
 
-DEBUG = True
+# Deployment profile. 'dev' keeps the zero-configuration SQLite setup; 'prod'
+# turns off DEBUG (which records every query in memory), reuses database
+# connections and tunes SQLite for concurrent writers.
+DJANGO_PROFILE = os.getenv('DJANGO_PROFILE', 'dev')
+PRODUCTION = DJANGO_PROFILE == 'prod'
+
+DEBUG = os.getenv('DEBUG', 'False' if PRODUCTION else 'True') == 'True'
 
 ALLOWED_HOSTS = ['localhost', '127.0.0.1', '0.0.0.0']
 
@@ -141,12 +147,40 @@ TEMPLATES = [
     },
 ]
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# DATABASE_ENGINE=postgresql switches to Postgres (needs psycopg or psycopg2)
+if os.getenv('DATABASE_ENGINE', 'sqlite3') == 'postgresql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.getenv('POSTGRES_DB', 'telecom_ai'),
+            'USER': os.getenv('POSTGRES_USER', 'postgres'),
+            'PASSWORD': os.getenv('POSTGRES_PASSWORD', ''),
+            'HOST': os.getenv('POSTGRES_HOST', 'localhost'),
+            'PORT': os.getenv('POSTGRES_PORT', '5432'),
+        }
+    }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.getenv('SQLITE_PATH', BASE_DIR / 'db.sqlite3'),
+        }
     }
-}
+
+if PRODUCTION:
+    # Keep connections open across requests and ping them before reuse
+    DATABASES['default']['CONN_MAX_AGE'] = int(os.getenv('DB_CONN_MAX_AGE', '600'))
+    DATABASES['default']['CONN_HEALTH_CHECKS'] = True
+
+# PRAGMAs applied to every new SQLite connection (ai_agent.db.configure_sqlite).
+# WAL lets readers run alongside the writer, busy_timeout makes a writer wait
+# for the lock instead of failing with "database is locked", and
+# synchronous=NORMAL only fsyncs at WAL checkpoints.
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'busy_timeout': int(os.getenv('SQLITE_BUSY_TIMEOUT', '20000')),
+    'synchronous': 'NORMAL',
+} if PRODUCTION else {}
 
 REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
@@ -171,33 +205,251 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # DeepSeek API Configuration
 DEEPSEEK_API_KEY = os.getenv('DEEPSEEK_API_KEY')
+DEEPSEEK_BASE_URL = os.getenv('DEEPSEEK_BASE_URL', 'https://api.deepseek.com/v1/chat/completions')
+DEEPSEEK_POOL_SIZE = int(os.getenv('DEEPSEEK_POOL_SIZE', '10'))
+DEEPSEEK_ASYNC_POOL_SIZE = int(os.getenv('DEEPSEEK_ASYNC_POOL_SIZE', '1000'))
+DEEPSEEK_CONNECT_TIMEOUT = float(os.getenv('DEEPSEEK_CONNECT_TIMEOUT', '3.05'))
+DEEPSEEK_READ_TIMEOUT = float(os.getenv('DEEPSEEK_READ_TIMEOUT', '30'))
+DEEPSEEK_MAX_RETRIES = int(os.getenv('DEEPSEEK_MAX_RETRIES', '2'))
+DEEPSEEK_BACKOFF_FACTOR = float(os.getenv('DEEPSEEK_BACKOFF_FACTOR', '0.5'))
+DEEPSEEK_HEALTH_URL = os.getenv('DEEPSEEK_HEALTH_URL')  # defaults to the /models endpoint next to DEEPSEEK_BASE_URL
+
+# OpenAI API Configuration (TelecomAIService)
+OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
+OPENAI_TIMEOUT = float(os.getenv('OPENAI_TIMEOUT', '60'))
+
+# Response cache in front of the AI provider (see ai_agent/services/cache.py).
+# BACKEND 'django' stores entries in CACHES[CACHE_ALIAS], e.g. a local Redis.
+AI_RESPONSE_CACHE = {
+    'ENABLED': os.getenv('AI_RESPONSE_CACHE_ENABLED', 'True') == 'True',
+    'BACKEND': os.getenv('AI_RESPONSE_CACHE_BACKEND', 'memory'),
+    'CACHE_ALIAS': 'default',
+    'TTL': int(os.getenv('AI_RESPONSE_CACHE_TTL', '3600')),
+    'MAX_ENTRIES': int(os.getenv('AI_RESPONSE_CACHE_MAX_ENTRIES', '2048')),
+    'EXCLUDE_INTENTS': [],
+}
 
-LOGGING = {
-    'version': 1,
-    'disable_existing_loggers': False,
-    'handlers': {
-        'console': {
-            'class': 'logging.StreamHandler',
-        },
-        'file': {
-            'class': 'logging.FileHandler',
-            'filename': 'debug.log',
-        },
+# Identical questions in flight at the same time share one provider call
+# (ai_agent/services/singleflight.py)
+AI_SINGLE_FLIGHT = {
+    'ENABLED': os.getenv('AI_SINGLE_FLIGHT_ENABLED', 'True') == 'True',
+}
+
+# Answer directly from TelecomKnowledgeBase when the retrieval score clears MIN_SCORE
+KNOWLEDGE_BASE_RETRIEVAL = {
+    'ENABLED': os.getenv('KB_RETRIEVAL_ENABLED', 'True') == 'True',
+    'MIN_SCORE': float(os.getenv('KB_RETRIEVAL_MIN_SCORE', '0.6')),
+}
+
+# Local intent model stored on every user message (ai_agent/services/intent_model.py).
+# Train it with `python manage.py train_intent_classifier`; without MODEL_FILE
+# it is trained from the knowledge base on first use.
+INTENT_CLASSIFIER = {
+    'MODEL_FILE': os.getenv('INTENT_MODEL_FILE', str(BASE_DIR / 'ai_agent' / 'data' / 'intent_model.npz')),
+    'N_FEATURES': int(os.getenv('INTENT_MODEL_FEATURES', str(2 ** 14))),
+    'MIN_SIMILARITY': float(os.getenv('INTENT_MODEL_MIN_SIMILARITY', '0.1')),
+}
+
+# /api/health/ready/ reports provider health cached by a background prober
+HEALTH_CHECK = {
+    'PROBE_INTERVAL': int(os.getenv('HEALTH_PROBE_INTERVAL', '30')),
+    'STALE_AFTER': int(os.getenv('HEALTH_STALE_AFTER', '90')),
+}
+
+# AI provider registry. COST is relative (per request) and only used by the
+# 'cost' routing policy; WEIGHT only by 'weighted'.
+AI_PROVIDERS = {
+    'mock': {
+        'CLASS': 'ai_agent.services.mock_ai_service.MockAIService',
+        'WEIGHT': float(os.getenv('AI_MOCK_WEIGHT', '1')),
+        'COST': 0,
     },
-    'root': {
-        'handlers': ['console', 'file'],
-        'level': 'INFO',
+    'deepseek': {
+        'CLASS': 'ai_agent.services.deepseek_service.DeepSeekAIService',
+        'WEIGHT': float(os.getenv('AI_DEEPSEEK_WEIGHT', '1')),
+        'COST': float(os.getenv('AI_DEEPSEEK_COST', '1')),
     },
-    'loggers': {
-        'django': {
-            'handlers': ['console', 'file'],
+    'openai': {
+        'CLASS': 'ai_agent.services.ai_service.TelecomAIService',
+        'WEIGHT': float(os.getenv('AI_OPENAI_WEIGHT', '1')),
+        'COST': float(os.getenv('AI_OPENAI_COST', '2')),
+    },
+}
+
+# Enabled providers, in failover order, and how requests are spread over them:
+# 'failover' (listed order), 'weighted' (random by WEIGHT), 'latency' (lowest
+# EWMA of observed latency first) or 'cost' (cheapest first). A provider that
+# fails is skipped for the next one; open circuits are tried last.
+AI_ROUTING = {
+    'PROVIDERS': [name.strip() for name in os.getenv('AI_PROVIDERS', 'mock').split(',') if name.strip()],
+    'POLICY': os.getenv('AI_ROUTING_POLICY', 'failover'),
+    'EWMA_ALPHA': float(os.getenv('AI_ROUTING_EWMA_ALPHA', '0.3')),
+}
+
+# Circuit breaker and hedging around each AI provider (ai_agent/services/resilience.py).
+# While the circuit is open requests are answered from the knowledge base at
+# DEGRADED_KB_MIN_SCORE, or with the fallback text. With HEDGE on, a second
+# attempt is fired once the first has run past the recent HEDGE_QUANTILE latency.
+AI_RESILIENCE = {
+    'FAILURE_THRESHOLD': int(os.getenv('AI_CIRCUIT_FAILURE_THRESHOLD', '5')),
+    'RECOVERY_TIMEOUT': float(os.getenv('AI_CIRCUIT_RECOVERY_TIMEOUT', '30')),
+    'HEDGE': os.getenv('AI_HEDGE_ENABLED', 'False') == 'True',
+    'HEDGE_QUANTILE': float(os.getenv('AI_HEDGE_QUANTILE', '0.95')),
+    'HEDGE_MIN_DELAY': float(os.getenv('AI_HEDGE_MIN_DELAY', '0.05')),
+    'HEDGE_DEFAULT_DELAY': float(os.getenv('AI_HEDGE_DEFAULT_DELAY', '1.0')),
+    'HEDGE_MAX_WORKERS': int(os.getenv('AI_HEDGE_MAX_WORKERS', '32')),
+    'DEGRADED_KB_MIN_SCORE': float(os.getenv('AI_DEGRADED_KB_MIN_SCORE', '0.35')),
+}
+
+# Seconds a chat request may spend waiting on the AI provider in total;
+# provider timeouts are shortened to whatever is left of it
+CHAT_DEADLINE = float(os.getenv('CHAT_DEADLINE', '25'))
+
+# System prompts are rendered once per language from this facts file
+# (ai_agent/services/prompts.py); edits are picked up within CHECK_INTERVAL seconds.
+PROMPT_REGISTRY = {
+    'FACTS_FILE': os.getenv('PROMPT_FACTS_FILE', str(BASE_DIR / 'ai_agent' / 'data' / 'telecom_facts.json')),
+    'CHECK_INTERVAL': int(os.getenv('PROMPT_CHECK_INTERVAL', '30')),
+}
+
+# Prior turns sent to the LLM providers with each message (ai_agent/context.py).
+# Recent sessions are served from memory; TOKEN_BUDGET caps the history part of
+# the prompt. SUMMARIZE keeps a short note of what was asked before the window.
+CHAT_CONTEXT = {
+    'ENABLED': os.getenv('CHAT_CONTEXT_ENABLED', 'True') == 'True',
+    'MAX_TURNS': int(os.getenv('CHAT_CONTEXT_MAX_TURNS', '6')),
+    'TOKEN_BUDGET': int(os.getenv('CHAT_CONTEXT_TOKEN_BUDGET', '1500')),
+    'MAX_SESSIONS': int(os.getenv('CHAT_CONTEXT_MAX_SESSIONS', '10000')),
+    'SUMMARIZE': os.getenv('CHAT_CONTEXT_SUMMARIZE', 'False') == 'True',
+    'SUMMARY_TOKENS': int(os.getenv('CHAT_CONTEXT_SUMMARY_TOKENS', '120')),
+}
+
+# Chat message persistence. 'sync' writes both turns before the response is
+# returned; 'write_behind' queues them for a background writer that batches
+# inserts. QUEUE_SIZE counts turns; when the queue stays full for PUT_TIMEOUT
+# seconds the request writes its own turn.
+CHAT_PERSISTENCE = {
+    'MODE': os.getenv('CHAT_PERSISTENCE_MODE', 'sync'),
+    'QUEUE_SIZE': int(os.getenv('CHAT_PERSISTENCE_QUEUE_SIZE', '10000')),
+    'BATCH_SIZE': int(os.getenv('CHAT_PERSISTENCE_BATCH_SIZE', '500')),
+    'FLUSH_INTERVAL': float(os.getenv('CHAT_PERSISTENCE_FLUSH_INTERVAL', '0.05')),
+    'PUT_TIMEOUT': float(os.getenv('CHAT_PERSISTENCE_PUT_TIMEOUT', '1.0')),
+}
+
+# /api/chat/batch/: items per request, and provider calls in flight per batch
+CHAT_BATCH = {
+    'MAX_ITEMS': int(os.getenv('CHAT_BATCH_MAX_ITEMS', '500')),
+    'MAX_CONCURRENCY': int(os.getenv('CHAT_BATCH_MAX_CONCURRENCY', '8')),
+}
+
+# Server-side transcription of audio uploads to /api/voice-chat/
+# (ai_agent/services/speech.py). STT_ENGINE is a dotted path, e.g.
+# ai_agent.services.speech.VoskSpeechEngine with STT_MODELS=fa=/models/vosk-fa,en=/models/vosk-en;
+# unset, only pre-transcribed text is accepted. Each worker process holds
+# one stream at a time.
+SPEECH_TO_TEXT = {
+    'ENGINE': os.getenv('STT_ENGINE', ''),
+    'OPTIONS': {
+        'models': dict(
+            item.split('=', 1) for item in os.getenv('STT_MODELS', '').split(',') if '=' in item
+        ),
+    },
+    'PROCESSES': int(os.getenv('STT_PROCESSES', '2')),
+    'ACQUIRE_TIMEOUT': float(os.getenv('STT_ACQUIRE_TIMEOUT', '5')),
+    'CHUNK_TIMEOUT': float(os.getenv('STT_CHUNK_TIMEOUT', '10')),
+    'MAX_BYTES': int(os.getenv('STT_MAX_BYTES', str(16000 * 2 * 120))),
+}
+
+# Spoken answers for voice chat requests with "speak": true
+# (ai_agent/services/tts.py), e.g. TTS_ENGINE=ai_agent.services.tts.EspeakSynthesizer
+# TTS_VOICES=en=en-us,fa=fa. Clips are cached on disk by (engine, language,
+# voice, text hash) and served from /api/tts/<id>.wav.
+TEXT_TO_SPEECH = {
+    'ENGINE': os.getenv('TTS_ENGINE', ''),
+    'VOICES': dict(item.split('=', 1) for item in os.getenv('TTS_VOICES', '').split(',') if '=' in item),
+    'PROCESSES': int(os.getenv('TTS_PROCESSES', '2')),
+    'TIMEOUT': float(os.getenv('TTS_TIMEOUT', '10')),
+    'CACHE_DIR': os.getenv('TTS_CACHE_DIR', str(BASE_DIR / 'ai_agent' / 'data' / 'tts_cache')),
+    'MAX_CACHE_BYTES': int(os.getenv('TTS_MAX_CACHE_BYTES', str(512 * 1024 * 1024))),
+}
+
+# Build the knowledge base index, intent model and provider stack when the
+# WSGI/ASGI application is loaded instead of on the first requests
+# (ai_agent/warmup.py). With gunicorn.conf.py's preload_app that happens once
+# in the master and the workers share it copy-on-write. SPEECH also renders
+# the canned answers into the text-to-speech cache.
+WARM_UP = {
+    'ON_STARTUP': os.getenv('WARM_UP_ON_STARTUP', str(PRODUCTION)) == 'True',
+    'SPEECH': os.getenv('WARM_UP_SPEECH', 'False') == 'True',
+}
+
+# LOG_MODE=async (the prod default) moves logging off the request thread:
+# records are queued and written by a background thread as JSON lines to a
+# rotating file, with message bodies cut to LOG_MAX_CHARS (ai_agent/log.py).
+# Workers forked from a preloaded gunicorn master each write their own file
+# next to it (app.<pid>.log for app.log).
+LOG_MODE = os.getenv('LOG_MODE', 'async' if PRODUCTION else 'sync')
+
+if LOG_MODE == 'async':
+    LOGGING = {
+        'version': 1,
+        'disable_existing_loggers': False,
+        'handlers': {
+            'async_file': {
+                '()': 'ai_agent.log.AsyncQueueHandler',
+                'filename': os.getenv('LOG_FILE', str(BASE_DIR / 'app.log')),
+                'max_bytes': int(os.getenv('LOG_MAX_BYTES', str(10 * 1024 * 1024))),
+                'backup_count': int(os.getenv('LOG_BACKUP_COUNT', '5')),
+                'max_chars': int(os.getenv('LOG_MAX_CHARS', '200')),
+                'sample_rate': float(os.getenv('LOG_SAMPLE_RATE', '1.0')),
+                # Process-wide: drops funcName/lineno/thread/process from every record
+                'lean_records': os.getenv('LOG_LEAN_RECORDS', 'False') == 'True',
+            },
+        },
+        'root': {
+            'handlers': ['async_file'],
             'level': 'INFO',
-            'propagate': False,
         },
-        'ai_agent': {
+        'loggers': {
+            'django': {
+                'handlers': ['async_file'],
+                'level': 'INFO',
+                'propagate': False,
+            },
+            'ai_agent': {
+                'handlers': ['async_file'],
+                'level': os.getenv('AI_AGENT_LOG_LEVEL', 'INFO'),
+                'propagate': False,
+            },
+        },
+    }
+else:
+    LOGGING = {
+        'version': 1,
+        'disable_existing_loggers': False,
+        'handlers': {
+            'console': {
+                'class': 'logging.StreamHandler',
+            },
+            'file': {
+                'class': 'logging.FileHandler',
+                'filename': 'debug.log',
+            },
+        },
+        'root': {
             'handlers': ['console', 'file'],
-            'level': 'DEBUG',
-            'propagate': False,
+            'level': 'INFO',
         },
-    },
-}
\ No newline at end of file
+        'loggers': {
+            'django': {
+                'handlers': ['console', 'file'],
+                'level': 'INFO',
+                'propagate': False,
+            },
+            'ai_agent': {
+                'handlers': ['console', 'file'],
+                'level': 'DEBUG',
+                'propagate': False,
+            },
+        },
+    }
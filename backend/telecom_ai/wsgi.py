@@ -14,3 +14,10 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'telecom_ai.settings')
 
 application = get_wsgi_application()
+
+from django.conf import settings  # noqa: E402
+
+if settings.WARM_UP['ON_STARTUP']:
+    # Under gunicorn's preload_app this runs once, in the master, before the fork
+    from ai_agent.warmup import warm_up  # noqa: E402
+    warm_up(speech=settings.WARM_UP['SPEECH'])